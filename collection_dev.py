@@ -10,8 +10,8 @@ parser.add_argument('-p', '--platform', choices=['vscode', 'circleci'], default=
 
 arguments = parser.parse_args()
 
-collections_path = "from ansible_collections.rubrikinc.cdm.plugins.module_utils.rubrik_cdm import credentials, load_provider_variables, rubrik_argument_spec"
-standard_path = "from ansible.module_utils.rubrik_cdm import credentials, load_provider_variables, rubrik_argument_spec"
+collections_path = "from ansible_collections.rubrikinc.cdm.plugins.module_utils.rubrik_cdm import "
+standard_path = "from ansible.module_utils.rubrik_cdm import "
 
 
 
@@ -41,7 +41,7 @@ version:
 
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.rubrik_cdm import credentials, load_provider_variables, rubrik_argument_spec
+from ansible.module_utils.rubrik_cdm import collect_items, connect, load_provider_variables, paginate, rubrik_argument_spec
 
 try:
     import rubrik_cdm
@@ -70,19 +70,17 @@ def main():
     if not HAS_RUBRIK_SDK:
         module.fail_json(msg='The Rubrik Python SDK is required for this module (pip install rubrik_cdm).')
 
-    node_ip, username, password = credentials(module)
-
     try:
-        rubrik = rubrik_cdm.Connect(node_ip, username, password)
-    except SystemExit as error:
+        rubrik = connect(module)
+    except Exception as error:
         module.fail_json(msg=str(error))
 
     try:
-        api_request = rubrik.get_all_hosts()
-    except SystemExit as error:
+        hosts, total = collect_items(module, paginate(rubrik, "v1", "/host"))
+    except Exception as error:
         module.fail_json(msg=str(error))
 
-    module.exit_json(**api_request)
+    module.exit_json(data=hosts, hasMore=False, total=total)
 
 
 if __name__ == '__main__':
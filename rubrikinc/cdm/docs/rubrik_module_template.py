@@ -3,7 +3,7 @@
 # GNU General Public License v3.0+ (see COPYING or
 # https://www.gnu.org/licenses/gpl-3.0.txt)
 
-from ansible.module_utils.rubrik_cdm import credentials, load_provider_variables, rubrik_argument_spec
+from ansible.module_utils.rubrik_cdm import connect, load_provider_variables, rubrik_argument_spec
 from ansible.module_utils.basic import AnsibleModule
 from __future__ import absolute_import, division, print_function
 __metaclass__ = type
@@ -73,18 +73,11 @@ def main():
     if not HAS_RUBRIK_SDK:
         module.fail_json(msg='The Rubrik Python SDK is required for this module (pip install rubrik_cdm).')
 
-    node_ip, username, password, api_token = credentials(module)
-
     try:
-        rubrik = rubrik_cdm.Connect(node_ip, username, password, api_token)
+        rubrik = connect(module)
     except Exception as error:
         module.fail_json(msg=str(error))
 
-    try:
-        rubrik = rubrik_cdm.Connect(node_ip, username, password)
-    except SystemExit as error:
-        module.fail_json(msg=str(error))
-
     # Code Block 
  
 
@@ -0,0 +1,125 @@
+# (c) 2018 Rubrik, Inc
+# GNU General Public License v3.0+ (see COPYING or
+# https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import importlib
+import json
+import os
+import sys
+import traceback
+
+from ansible.module_utils import basic
+from ansible.module_utils._text import to_bytes, to_native, to_text
+from ansible.module_utils.common import warnings
+from ansible.module_utils.six import StringIO
+from ansible.plugins.action import ActionBase
+from ansible.utils.vars import merge_hash
+
+
+MODULE_UTILS = 'ansible_collections.rubrikinc.cdm.plugins.module_utils.rubrik_cdm'
+MODULES = 'ansible_collections.rubrikinc.cdm.plugins.modules'
+
+LOCAL_CONNECTIONS = ('local', 'ansible.builtin.local', 'ansible.legacy.local')
+
+
+class ActionModule(ActionBase):
+    """Runs the Rubrik modules in the Ansible worker process instead of packaging each of them with AnsiballZ and
+    starting a new Python interpreter for every task. The modules only talk to the Rubrik REST API, so this is the same as
+    running them on the controller through the local connection. The TLS sessions to the Rubrik nodes are kept in the
+    worker process and resumed by the loop items of the task. The module is run as usual when the task runs on
+    another host, becomes another user, runs asynchronously, runs against several clusters, uses another Python
+    interpreter, or when the rubrik_cdm_in_process environment variable of the controller is set to false.
+    """
+
+    _supports_check_mode = True
+    _supports_async = True
+
+    def _module_name(self):
+        return self._task.action.rpartition('.')[2]
+
+    def _in_process(self, task_vars):
+        """Return whether the module can run in the worker process."""
+
+        if os.environ.get('rubrik_cdm_in_process', 'true').lower() in ('0', 'false', 'no', 'off'):
+            return False
+
+        if getattr(self._connection, 'transport', None) not in LOCAL_CONNECTIONS:
+            return False
+
+        if self._task.async_val or self._play_context.become:
+            return False
+
+        # The clusters option forks the module process for every cluster, which must not be the worker process
+        if self._task.args.get('clusters'):
+            return False
+
+        # Interpreter discovery would find the Python of the controller for the local connection as well
+        interpreter = self._templar.template(task_vars.get('ansible_python_interpreter') or 'auto')
+        if not interpreter.startswith('auto') and interpreter != sys.executable:
+            return False
+
+        return self._module_name().startswith('rubrik_')
+
+    def _environment(self):
+        """Return the environment the task sets for the module, such as the rubrik_cdm_* variables."""
+
+        environment = {}
+        try:
+            self._compute_environment_string(environment)
+        except AttributeError:
+            pass
+
+        return dict((to_native(key), to_native(value)) for key, value in environment.items())
+
+    def _run_in_process(self, task_vars):
+        module_args = dict(self._task.args)
+        self._update_module_args(self._module_name(), module_args, task_vars)
+
+        # The modules import their module_utils the way AnsiballZ lays them out
+        module_utils = sys.modules.setdefault('ansible.module_utils.rubrik_cdm', importlib.import_module(MODULE_UTILS))
+        if module_utils.SHARED_TRANSPORTS is None:
+            module_utils.SHARED_TRANSPORTS = {}
+        module = importlib.import_module('{0}.{1}'.format(MODULES, self._module_name()))
+
+        environment = self._environment()
+        saved_environment = dict((key, os.environ.get(key)) for key in environment)
+        stdout = sys.stdout
+        sys.stdout = output = StringIO()
+        os.environ.update(environment)
+        basic._ANSIBLE_ARGS = to_bytes(json.dumps({'ANSIBLE_MODULE_ARGS': module_args}))
+        try:
+            module.main()
+        except SystemExit:
+            pass
+        except Exception as error:
+            return {'failed': True, 'msg': to_text(error), 'exception': traceback.format_exc()}
+        finally:
+            module_utils.close_shared_transports()
+            basic._ANSIBLE_ARGS = None
+            sys.stdout = stdout
+            for key, value in saved_environment.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+            # Warnings are collected in globals of the worker process, which runs every loop item of the task
+            for name in ('_global_warnings', '_global_deprecations'):
+                del getattr(warnings, name, [])[:]
+
+        return self._parse_returned_data({'rc': 0, 'stdout': output.getvalue(), 'stderr': ''})
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp  # tmp no longer has any effect
+
+        if self._in_process(task_vars or {}):
+            return merge_hash(result, self._run_in_process(task_vars or {}))
+
+        wrap_async = self._task.async_val and not self._connection.has_native_async
+        result = merge_hash(result, self._execute_module(task_vars=task_vars, wrap_async=wrap_async))
+        if not wrap_async:
+            self._remove_tmp_path(self._connection._shell.tmpdir)
+
+        return result
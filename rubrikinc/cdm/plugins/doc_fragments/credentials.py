@@ -48,8 +48,10 @@ options:
           - The DNS hostname or IP address of the Rubrik cluster. By defeault, the module will attempt to
             read this value from the rubrik_cdm_node_ip environment variable. If this environment variable is
             not present it will need to be manually specified here or in the I(node_ip) parameter.
+          - A list, or a comma separated string, of the addresses of several nodes of the Rubrik cluster spreads the module
+            runs across those nodes. Add C(auto) to the list to also discover the other nodes of the cluster through the API.
         required: False
-        type: str
+        type: raw
       api_token:
         description:
           - The API Token used for authentication in place of a I(username) or I(password) variable. By defeault, the module
@@ -71,14 +73,164 @@ options:
             not present it will need to be manually specified here or in the I(password) parameter.
         required: False
         type: str
+      cache_dir:
+        description:
+          - The controller side directory used to share state, such as cached session tokens, between module invocations. By default, the module
+            will attempt to read this value from the rubrik_cdm_cache_dir environment variable and will otherwise use ~/.ansible/rubrik_cdm.
+        required: False
+        type: path
+      session_cache:
+        description:
+          - Flag that specifies whether the session token minted from the I(username) and I(password) should be cached in I(cache_dir)
+            and reused by later module invocations instead of logging in to the Rubrik cluster on every task. Defaults to True.
+        required: False
+        type: bool
+      session_ttl:
+        description:
+          - The number of seconds a cached session token is reused before a new one is minted. A token the Rubrik cluster
+            rejects before then is replaced automatically. Defaults to 1800.
+        required: False
+        type: int
+      resolution_cache_ttl:
+        description:
+          - The number of seconds the ID of an SLA Domain, VM, host, fileset or database resolved from its name is cached in
+            I(cache_dir) and reused by later module invocations. The cached IDs of an object type are discarded when an object of
+            that type is created or deleted, or when a request made with a cached ID fails. Set to 0 to disable. Defaults to 300.
+        required: False
+        type: int
+      capability_cache_ttl:
+        description:
+          - The number of seconds the software version of the Rubrik cluster is cached in I(cache_dir) and reused by later
+            module invocations to choose the endpoints the Rubrik cluster supports, instead of fetching it before every
+            version dependent request. Set to 0 to only reuse the version within a module invocation. Defaults to 3600.
+        required: False
+        type: int
+      retries:
+        description:
+          - The number of times a request is sent again when the Rubrik cluster is busy (429, 502, 503 or 504) or can not be
+            reached. Only GET, PUT and DELETE requests are retried after a server error or a timeout, any request is retried after a
+            429. Defaults to 3.
+        required: False
+        type: int
+      backoff_max:
+        description:
+          - The maximum number of seconds to wait before a retry. The wait doubles with each attempt, with jitter, and a
+            Retry-After header sent by the Rubrik cluster takes precedence. Defaults to 30.
+        required: False
+        type: int
+      circuit_breaker_threshold:
+        description:
+          - The number of consecutive requests that must fail to reach the Rubrik cluster before every module fails immediately
+            for the next 60 seconds instead of waiting on a cluster that is down. Set to 0 to disable. Defaults to 5.
+        required: False
+        type: int
+      collect_metrics:
+        description:
+          - Flag that specifies whether the module result should include a rubrik_metrics dictionary with the method, endpoint,
+            status, latency, request and response size, and retry count of every request sent to the Rubrik cluster, along with
+            totals and the time spent logging in and resolving object names. Defaults to False.
+        required: False
+        type: bool
+      node_selection:
+        description:
+          - How a node is assigned to each module run when I(node_ip) lists several nodes. C(round_robin) takes the nodes in turn
+            and C(least_latency) picks the node with the lowest measured response time. A node that can not be reached is skipped
+            for I(node_cooldown) seconds and the request moves on to the next node. Defaults to round_robin.
+        required: False
+        type: str
+        choices: ['round_robin', 'least_latency']
+      node_cooldown:
+        description:
+          - The number of seconds a node that can not be reached is skipped for when I(node_ip) lists several nodes. Defaults to 60.
+        required: False
+        type: int
+      return_fields:
+        description:
+          - Reduce the response returned by the module to these fields. Each field is a dotted path of keys where C([]) selects
+            every element of a list and C([n]) a single one, for example C(data[].id) or C(links[0].href).
+          - A response that is not a dictionary, such as a message or a list, is returned in full.
+          - Ignored when I(response=none).
+        required: False
+        type: list
+        elements: str
+      response:
+        description:
+          - Set to C(none) to only return whether the module changed anything along with the IDs found in the response
+            (C(id) and C(data[].id)). A response that is not a dictionary is returned in full. Defaults to full.
+        required: False
+        type: str
+        choices: ['full', 'none']
+      max_concurrent_requests:
+        description:
+          - The maximum number of requests sent to the Rubrik cluster at the same time by all of the Rubrik modules running on the
+            controller, whatever the number of forks. The other requests wait for one of them to complete. Set to 0 to not limit
+            the number of concurrent requests. Defaults to 0.
+        required: False
+        type: int
+      rate_limit_rps:
+        description:
+          - The sustained number of requests per second sent to the Rubrik cluster by all of the Rubrik modules running on the
+            controller. Requests over the rate wait for their turn. Set to 0 to not limit the rate of requests. Defaults to 0.
+        required: False
+        type: float
+      rate_limit_burst:
+        description:
+          - The number of requests that can be sent at once above I(rate_limit_rps) after the cluster has been idle.
+            Defaults to I(rate_limit_rps) rounded up.
+        required: False
+        type: int
+      coalesce_ttl:
+        description:
+          - The number of seconds the response to a GET request is shared with the identical GET requests sent by the other
+            Rubrik modules running on the controller. Only one of the concurrent identical requests is sent to the Rubrik
+            cluster and the others wait for its response. A module stops sharing responses once it has changed anything on the
+            Rubrik cluster. Set to 0 to not share responses. Defaults to 0.
+        required: False
+        type: float
+      prometheus_textfile_dir:
+        description:
+          - The directory read by the node_exporter textfile collector. The requests sent to the Rubrik cluster are counted,
+            by cluster, module and endpoint, in the rubrik_cdm.prom file of the directory, along with their latency, retries,
+            failures and logins. The file is shared by all of the Rubrik modules run on the controller.
+        required: False
+        type: path
+      trace_file:
+        description:
+          - The file a JSON line is appended to for every request sent to the Rubrik cluster, login and retry, with its
+            timestamp, module, task ID, endpoint, status, latency and payload sizes. Request and response bodies, headers
+            and secrets are never written. The file can be shared by all of the Rubrik modules run on the controller.
+        required: False
+        type: path
+      compression:
+        description:
+          - Request the responses of the Rubrik cluster gzip encoded, which makes large lists of objects many times smaller
+            on the wire. Defaults to true.
+        required: False
+        type: bool
+      request_compression_threshold:
+        description:
+          - The size in bytes from which request bodies, such as long lists of objects to assign an SLA Domain to, are sent
+            gzip encoded. Only set it for Rubrik clusters that accept gzip encoded requests. Request bodies are not
+            compressed by default.
+        required: False
+        type: int
+      pool_size:
+        description:
+          - The maximum number of keep-alive connections the module opens to a Rubrik node at the same time. Requests
+            reuse an idle connection of the pool, and new connections resume the TLS session of the previous one so
+            that the node only goes through an abbreviated handshake. Defaults to 4.
+        required: False
+        type: int
     type: dict
   node_ip:
     description:
       - The DNS hostname or IP address of the Rubrik cluster. By defeault, the module will attempt to
         read this value from the rubrik_cdm_node_ip environment variable. If this environment variable is
         not present it will need to be manually specified here or in the I(provider) parameter.
+      - A list, or a comma separated string, of the addresses of several nodes of the Rubrik cluster spreads the module
+        runs across those nodes. Add C(auto) to the list to also discover the other nodes of the cluster through the API.
     required: False
-    type: str
+    type: raw
   api_token:
     description:
       - The API Token used for authentication in place of a I(username) or I(password) variable. By defeault, the module
@@ -100,4 +252,199 @@ options:
         not present it will need to be manually specified here or in the I(provider) parameter.
     required: False
     type: str
+  cache_dir:
+    description:
+      - The controller side directory used to share state, such as cached session tokens, between module invocations. By default, the module
+        will attempt to read this value from the rubrik_cdm_cache_dir environment variable and will otherwise use ~/.ansible/rubrik_cdm.
+    required: False
+    type: path
+  session_cache:
+    description:
+      - Flag that specifies whether the session token minted from the I(username) and I(password) should be cached in I(cache_dir)
+        and reused by later module invocations instead of logging in to the Rubrik cluster on every task. Defaults to True.
+    required: False
+    type: bool
+  session_ttl:
+    description:
+      - The number of seconds a cached session token is reused before a new one is minted. A token the Rubrik cluster
+        rejects before then is replaced automatically. Defaults to 1800.
+    required: False
+    type: int
+  resolution_cache_ttl:
+    description:
+      - The number of seconds the ID of an SLA Domain, VM, host, fileset or database resolved from its name is cached in
+        I(cache_dir) and reused by later module invocations. The cached IDs of an object type are discarded when an object of
+        that type is created or deleted, or when a request made with a cached ID fails. Set to 0 to disable. Defaults to 300.
+    required: False
+    type: int
+  capability_cache_ttl:
+    description:
+      - The number of seconds the software version of the Rubrik cluster is cached in I(cache_dir) and reused by later
+        module invocations to choose the endpoints the Rubrik cluster supports, instead of fetching it before every
+        version dependent request. Set to 0 to only reuse the version within a module invocation. Defaults to 3600.
+    required: False
+    type: int
+  retries:
+    description:
+      - The number of times a request is sent again when the Rubrik cluster is busy (429, 502, 503 or 504) or can not be
+        reached. Only GET, PUT and DELETE requests are retried after a server error or a timeout, any request is retried after a
+        429. Defaults to 3.
+    required: False
+    type: int
+  backoff_max:
+    description:
+      - The maximum number of seconds to wait before a retry. The wait doubles with each attempt, with jitter, and a
+        Retry-After header sent by the Rubrik cluster takes precedence. Defaults to 30.
+    required: False
+    type: int
+  circuit_breaker_threshold:
+    description:
+      - The number of consecutive requests that must fail to reach the Rubrik cluster before every module fails immediately
+        for the next 60 seconds instead of waiting on a cluster that is down. Set to 0 to disable. Defaults to 5.
+    required: False
+    type: int
+  collect_metrics:
+    description:
+      - Flag that specifies whether the module result should include a rubrik_metrics dictionary with the method, endpoint,
+        status, latency, request and response size, and retry count of every request sent to the Rubrik cluster, along with
+        totals and the time spent logging in and resolving object names. Defaults to False.
+    required: False
+    type: bool
+  node_selection:
+    description:
+      - How a node is assigned to each module run when I(node_ip) lists several nodes. C(round_robin) takes the nodes in turn
+        and C(least_latency) picks the node with the lowest measured response time. A node that can not be reached is skipped
+        for I(node_cooldown) seconds and the request moves on to the next node. Defaults to round_robin.
+    required: False
+    type: str
+    choices: ['round_robin', 'least_latency']
+  node_cooldown:
+    description:
+      - The number of seconds a node that can not be reached is skipped for when I(node_ip) lists several nodes. Defaults to 60.
+    required: False
+    type: int
+  return_fields:
+    description:
+      - Reduce the response returned by the module to these fields. Each field is a dotted path of keys where C([]) selects
+        every element of a list and C([n]) a single one, for example C(data[].id) or C(links[0].href).
+      - A response that is not a dictionary, such as a message or a list, is returned in full.
+      - Ignored when I(response=none).
+    required: False
+    type: list
+    elements: str
+  response:
+    description:
+      - Set to C(none) to only return whether the module changed anything along with the IDs found in the response
+        (C(id) and C(data[].id)). A response that is not a dictionary is returned in full. Defaults to full.
+    required: False
+    type: str
+    choices: ['full', 'none']
+  max_concurrent_requests:
+    description:
+      - The maximum number of requests sent to the Rubrik cluster at the same time by all of the Rubrik modules running on the
+        controller, whatever the number of forks. The other requests wait for one of them to complete. Set to 0 to not limit
+        the number of concurrent requests. Defaults to 0.
+    required: False
+    type: int
+  rate_limit_rps:
+    description:
+      - The sustained number of requests per second sent to the Rubrik cluster by all of the Rubrik modules running on the
+        controller. Requests over the rate wait for their turn. Set to 0 to not limit the rate of requests. Defaults to 0.
+    required: False
+    type: float
+  rate_limit_burst:
+    description:
+      - The number of requests that can be sent at once above I(rate_limit_rps) after the cluster has been idle.
+        Defaults to I(rate_limit_rps) rounded up.
+    required: False
+    type: int
+  coalesce_ttl:
+    description:
+      - The number of seconds the response to a GET request is shared with the identical GET requests sent by the other
+        Rubrik modules running on the controller. Only one of the concurrent identical requests is sent to the Rubrik
+        cluster and the others wait for its response. A module stops sharing responses once it has changed anything on the
+        Rubrik cluster. Set to 0 to not share responses. Defaults to 0.
+    required: False
+    type: float
+  prometheus_textfile_dir:
+    description:
+      - The directory read by the node_exporter textfile collector. The requests sent to the Rubrik cluster are counted,
+        by cluster, module and endpoint, in the rubrik_cdm.prom file of the directory, along with their latency, retries,
+        failures and logins. The file is shared by all of the Rubrik modules run on the controller.
+    required: False
+    type: path
+  trace_file:
+    description:
+      - The file a JSON line is appended to for every request sent to the Rubrik cluster, login and retry, with its
+        timestamp, module, task ID, endpoint, status, latency and payload sizes. Request and response bodies, headers
+        and secrets are never written. The file can be shared by all of the Rubrik modules run on the controller.
+    required: False
+    type: path
+  compression:
+    description:
+      - Request the responses of the Rubrik cluster gzip encoded, which makes large lists of objects many times smaller
+        on the wire. Defaults to true.
+    required: False
+    type: bool
+  request_compression_threshold:
+    description:
+      - The size in bytes from which request bodies, such as long lists of objects to assign an SLA Domain to, are sent
+        gzip encoded. Only set it for Rubrik clusters that accept gzip encoded requests. Request bodies are not
+        compressed by default.
+    required: False
+    type: int
+  pool_size:
+    description:
+      - The maximum number of keep-alive connections the module opens to a Rubrik node at the same time. Requests
+        reuse an idle connection of the pool, and new connections resume the TLS session of the previous one so
+        that the node only goes through an abbreviated handshake. Defaults to 4.
+    required: False
+    type: int
+"""
+
+    # Options of the modules that can run against several Rubrik clusters at the same time
+    CLUSTERS = """
+options:
+  clusters:
+    description:
+      - Run the task against each of these Rubrik clusters at the same time instead of the one of the provider. Each
+        entry takes the same options as the provider, which override the provider for that cluster, along with a name.
+      - The options an entry leaves out, such as the credentials, are taken from the provider and then from the top level
+        options and their environment variables.
+      - The module returns the result of every cluster in clusters, keyed by name or node_ip, and reports changed when
+        any of the clusters changed. The task fails when it failed on any of the clusters.
+    required: False
+    type: list
+    elements: dict
+    suboptions:
+      name:
+        description:
+          - The name the result of the cluster is returned under. Defaults to the node_ip.
+        required: False
+        type: str
+      node_ip:
+        description:
+          - The DNS hostname or IP address of the Rubrik cluster, or a list of the addresses of its nodes.
+        required: False
+        type: raw
+      username:
+        description:
+          - The username used to authenticate the connection to the Rubrik cluster.
+        required: False
+        type: str
+      password:
+        description:
+          - The password used to authenticate the connection to the Rubrik cluster.
+        required: False
+        type: str
+      api_token:
+        description:
+          - The API token used to authenticate the connection to the Rubrik cluster.
+        required: False
+        type: str
+  cluster_forks:
+    description:
+      - The number of clusters the task runs against at the same time. Defaults to 10.
+    required: False
+    type: int
 """
@@ -0,0 +1,84 @@
+# (c) 2018 Rubrik, Inc
+# GNU General Public License v3.0+ (see COPYING or
+# https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = '''
+author: Rubrik Build Team (@drew-russell) <build@rubrik.com>
+name: rubrik
+short_description: HttpApi plugin for the Rubrik CDM REST API.
+description:
+    - Logs in to the Rubrik cluster once and keeps the session in the persistent connection so that every Rubrik task in the
+      play reuses it instead of opening and authenticating its own connection.
+    - Set C(ansible_connection=ansible.netcommon.httpapi) and C(ansible_network_os=rubrikinc.cdm.rubrik) on the host that
+      represents the Rubrik cluster. The session token is minted from C(ansible_user) and C(ansible_password) through
+      POST /api/v1/session, or an API token can be supplied with
+      C(ansible_httpapi_session_key={"Authorization": "Bearer <api_token>"}).
+version_added: '2.9'
+'''
+
+import json
+
+from ansible.module_utils._text import to_text
+from ansible.plugins.httpapi import HttpApiBase
+
+
+BASE_HEADERS = {
+    'Content-Type': 'application/json',
+    'Accept': 'application/json',
+}
+
+
+class HttpApi(HttpApiBase):
+
+    def __init__(self, connection):
+        super(HttpApi, self).__init__(connection)
+        self._minted_session = False
+
+    def login(self, username, password):
+        """Exchange the username and password, sent as basic authentication by the connection, for a session token."""
+
+        response, response_data = self.connection.send('/api/v1/session', '{}', method='POST', headers=BASE_HEADERS, retries=0)
+
+        token = json.loads(to_text(response_data.getvalue()))['token']
+
+        self.connection._auth = {'Authorization': 'Bearer {0}'.format(token)}
+        self._minted_session = True
+
+    def logout(self):
+        """Delete the session minted by login(). Sessions built from a user provided API token are left untouched."""
+
+        if not self._minted_session:
+            return
+
+        try:
+            self.connection.send('/api/v1/session/me', None, method='DELETE', headers=BASE_HEADERS, retries=0)
+        except Exception:
+            pass
+
+        self._minted_session = False
+
+    def send_request(self, method, path, data=None, timeout=None):
+        """Send a request to the Rubrik cluster over the persistent connection.
+
+        Arguments:
+            method {str} -- The HTTP method of the request.
+            path {str} -- The path of the request, including the query string (ex. /api/v1/cluster/me).
+
+        Keyword Arguments:
+            data {str} -- The JSON encoded body of the request. (default: {None})
+            timeout {int} -- The number of seconds to wait for the Rubrik cluster to respond. (default: {None})
+
+        Returns:
+            list -- The HTTP status code and the response body.
+        """
+
+        kwargs = {}
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+
+        # handle_httperror() logs in again on a 401, allow a single retry of the request once it has done so
+        response, response_data = self.connection.send(path, data, method=method, headers=BASE_HEADERS, retries=1, **kwargs)
+
+        return response.getcode(), to_text(response_data.getvalue())
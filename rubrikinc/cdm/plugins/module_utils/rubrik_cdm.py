@@ -31,17 +31,122 @@
 from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
+import base64
+import binascii
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import select
+import socket
+import ssl
+import sys
+import threading
+import time
+import traceback
+import uuid
+import zlib
+
+from email.utils import mktime_tz, parsedate_tz
+
 from ansible.module_utils.six import iteritems
+from ansible.module_utils.six.moves import http_client
+from ansible.module_utils.six.moves.urllib.parse import quote, urlparse
 from ansible.module_utils.basic import env_fallback
+from ansible.module_utils.connection import Connection
+from ansible.module_utils._text import to_bytes, to_text
 
+try:
+    from ansible.module_utils.common import warnings
+except ImportError:
+    # Ansible 2.9 keeps the warnings and deprecations of a module run on the AnsibleModule
+    warnings = None
 
 try:
-    import urllib3
-    urllib3.disable_warnings()
+    import fcntl
+    HAS_FCNTL = True
 except ImportError:
+    HAS_FCNTL = False
+
+
+DEFAULT_CACHE_DIR = os.path.join('~', '.ansible', 'rubrik_cdm')
+DEFAULT_SESSION_TTL = 1800
+DEFAULT_RESOLUTION_TTL = 300
+DEFAULT_CAPABILITY_TTL = 3600
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_MAX = 30
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_COOLDOWN = 60
+DEFAULT_NODE_COOLDOWN = 60
+DEFAULT_POOL_SIZE = 4
+DEFAULT_DISCOVERY_TTL = 600
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_SLOT_WAIT = 600
+DEFAULT_FANOUT_WINDOW = 32
+DEFAULT_CLUSTER_FORKS = 10
+# The size of the chunks a gzip encoded response body is read and decompressed in
+COMPRESSED_CHUNK_SIZE = 64 * 1024
+
+# The upper bounds in seconds of the buckets of the request latency histogram exported to Prometheus
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Set to a dict by the rubrikinc.cdm.rubrik action plugin, which runs the modules in the Ansible worker process, so that
+# the loop items that process runs resume the TLS sessions to a Rubrik node
+SHARED_TRANSPORTS = None
+
+# The fields kept from the response of a module when response is set to none
+ID_FIELDS = ["id", "data[].id"]
+
+# Requests that can safely be sent more than once. Any request rejected with 429 Too Many Requests is retried as well,
+# since the Rubrik cluster did not act on it.
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE")
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+# Responses that count as a failure of the Rubrik cluster for the circuit breaker, along with connection errors.
+BREAKER_STATUS_CODES = (502, 503, 504)
+
+USER_AGENT = "RubrikAnsibleModules"
+
+# The SDK refuses to build a connection without a credential. When the requests are sent through the httpapi plugin the
+# real session is held by the persistent connection, so this placeholder is never sent to the Rubrik cluster.
+HTTPAPI_SESSION = "httpapi"
+
+# Collections whose objects are resolved by name through object_id(). Creating or deleting an object in one of them
+# invalidates the cached IDs of that object type.
+RESOLUTION_ENDPOINTS = {
+    "sla": "/sla_domain",
+    "physical_host": "/host",
+    "fileset_template": "/fileset_template",
+    "managed_volume": "/managed_volume",
+    "vcenter": "/vmware/vcenter",
+    "organization": "/organization",
+    "organization_role_id": "/organization",
+}
+
+# The first CDM release that supports each of the features the modules choose an endpoint or payload for
+FEATURES = {
+    # The NTP servers are configured as objects that can carry a symmetric key
+    "ntp_server_objects": (5, 0),
+}
+
+JOB_IN_PROGRESS_STATUS = ["QUEUED", "RUNNING", "FINISHING", "TO_FINISH", "TO_RETRY", "ACQUIRING", "TO_YIELDING", "YIELDING",
+                          "TO_YIELDED", "YIELDED", "CANCELING", "TO_CANCEL", "TO_UNDO", "UNDOING"]
+
+
+class RubrikSessionError(Exception):
+    """Raised when a session token can not be obtained from the Rubrik cluster."""
     pass
 
 
+class ApiCallError(Exception):
+    """Raised when a request can not be sent to the Rubrik cluster or the Rubrik cluster returns an error."""
+
+    def __init__(self, message, status_code=None):
+        super(ApiCallError, self).__init__(message)
+        self.status_code = status_code
+
+
 def credentials(module):
     """Helper function to provider the node ip, username, and password to the Rubrik module. If a "provider" variable is present in the Ansible task, those
     variables will be used to establish connectivity to the Rubrik cluster. If a "provider" variable is not present, attempt to read the cluster details
@@ -83,22 +188,2782 @@ def credentials(module):
     return node_ip, username, password, api_token
 
 
+def node_addresses(node_ip):
+    """Split the node_ip setting into the addresses of the Rubrik nodes. node_ip is a single address, a list of addresses or
+    a comma separated string of addresses, and may include "auto" to discover the other nodes of the cluster.
+    Arguments:
+        node_ip {str or list} -- The node_ip setting.
+    Returns:
+        [addresses] -- The addresses of the Rubrik nodes.
+        [discover] -- Flag that specifies whether the other nodes of the cluster should be discovered.
+    """
+
+    if not isinstance(node_ip, (list, tuple)):
+        node_ip = to_text(node_ip).split(",")
+
+    entries = [to_text(entry).strip() for entry in node_ip]
+    addresses = [entry for entry in entries if entry and entry != "auto"]
+
+    return addresses, "auto" in entries
+
+
+def provider_option(module, key, default=None):
+    """Read an optional connection setting, giving the "provider" variable precedence over the top level module parameter.
+    Arguments:
+        module {class} -- Ansible module helper class.
+        key {str} -- The name of the setting.
+    Keyword Arguments:
+        default -- The value to return when the setting has not been provided. (default: {None})
+    Returns:
+        The value of the setting.
+    """
+
+    provider = module.params.get("provider") or dict()
+
+    value = provider.get(key)
+    if value is None:
+        value = module.params.get(key)
+
+    return default if value is None else value
+
+
+def cache_dir(module):
+    """Return the controller side directory used to share state between module invocations, creating it if necessary."""
+
+    path = os.path.expanduser(provider_option(module, "cache_dir", DEFAULT_CACHE_DIR))
+
+    try:
+        os.makedirs(path, 0o700)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+
+    return path
+
+
+class FileLock(object):
+    """Exclusive advisory lock on a file. Used to serialize access to the shared cache files across all of the module
+    processes forked by Ansible.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if HAS_FCNTL:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        if HAS_FCNTL:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+
+def read_json(path):
+    """Return the contents of a JSON cache file or None when it is missing or unreadable."""
+
+    try:
+        with open(path) as cache_file:
+            return json.load(cache_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def write_json(path, data):
+    """Atomically replace the contents of a JSON cache file so that concurrent readers never see a partial write."""
+
+    tmp_path = "{}.{}.{}.tmp".format(path, os.getpid(), threading.current_thread().ident)
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as cache_file:
+        json.dump(data, cache_file)
+    os.rename(tmp_path, path)
+
+
+def session_login(node_ip, username, password, timeout=15, transport=None):
+    """Exchange a username and password for a session token through POST /api/v1/session.
+    Arguments:
+        node_ip {str} -- The node ip or hostname of the Rubrik cluster.
+        username {str} -- The username used to login into the Rubrik cluster.
+        password {str} -- The password used to login into the Rubrik cluster.
+    Keyword Arguments:
+        timeout {int} -- The number of seconds to wait for the Rubrik cluster to respond. (default: {15})
+        transport {class} -- The transport used to send the request instead of a new connection to node_ip. (default: {None})
+    Returns:
+        str -- The session token.
+    """
+
+    client = RubrikClient(transport or HttpTransport(node_ip), username, password)
+    try:
+        status_code, body = client.request("POST", "/api/v1/session", "{}", timeout)
+        if status_code >= 400:
+            raise ApiCallError("HTTP Error {}: {}".format(status_code, body), status_code)
+        return json.loads(body)["token"]
+    except ApiCallError as error:
+        raise RubrikSessionError("Unable to login to the Rubrik cluster: {}".format(error))
+    except (KeyError, TypeError, ValueError):
+        raise RubrikSessionError("Unable to login to the Rubrik cluster: the session response did not include a token.")
+    finally:
+        if transport is None:
+            client.close()
+
+
+class TokenCache(object):
+    """On-disk cache of Rubrik session tokens keyed by node_ip and username. Each entry lives in its own file, guarded by a
+    file lock, so that only one module process logs in when many forks start at the same time. Entries expire after the
+    TTL and store a salted fingerprint of the password so a changed password never reuses an existing token.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+
+    def _entry_path(self, node_ip, username):
+        key = hashlib.sha256("{}\0{}".format(node_ip, username).encode("utf-8")).hexdigest()
+        return os.path.join(self.path, "session-{}.json".format(key))
+
+    @staticmethod
+    def _fingerprint(salt, password):
+        return hashlib.sha256("{}{}".format(salt, password).encode("utf-8")).hexdigest()
+
+    def get(self, node_ip, username, password):
+        """Return the cached token or None when it is missing, expired, or was minted with a different password."""
+
+        entry = read_json(self._entry_path(node_ip, username))
+
+        if not entry or entry.get("expires", 0) <= time.time():
+            return None
+
+        if entry.get("fingerprint") != self._fingerprint(entry.get("salt"), password):
+            return None
+
+        return entry.get("token")
+
+    def put(self, node_ip, username, password, token):
+        """Store a newly minted token."""
+
+        salt = to_text(binascii.hexlify(os.urandom(8)))
+
+        write_json(self._entry_path(node_ip, username), {
+            "token": token,
+            "expires": time.time() + self.ttl,
+            "salt": salt,
+            "fingerprint": self._fingerprint(salt, password),
+        })
+
+    def invalidate(self, node_ip, username, token=None):
+        """Remove the cached token. When a token is provided the entry is only removed if it still holds that token, which
+        prevents a process from discarding a token another process has just minted.
+        """
+
+        entry_path = self._entry_path(node_ip, username)
+
+        with FileLock(entry_path + ".lock"):
+            entry = read_json(entry_path)
+            if entry is None or (token is not None and entry.get("token") != token):
+                return
+            try:
+                os.remove(entry_path)
+            except OSError:
+                pass
+
+    def token(self, node_ip, username, password, timeout=15, transport=None, metrics=None):
+        """Return a cached token, logging in to the Rubrik cluster to mint one when the cache does not hold a valid entry.
+        The login request is sent through the transport when one is provided, and recorded in the metrics along with the
+        tokens served from the cache.
+        """
+
+        token = self.get(node_ip, username, password)
+
+        if token is None:
+            with FileLock(self._entry_path(node_ip, username) + ".lock"):
+                # Another process may have logged in while we were waiting for the lock
+                token = self.get(node_ip, username, password)
+                if token is None:
+                    start = time.time()
+                    token = session_login(node_ip, username, password, timeout, transport)
+                    if metrics is not None:
+                        metrics.record_auth(time.time() - start)
+                    self.put(node_ip, username, password, token)
+                    return token
+
+        if metrics is not None:
+            metrics.record_cached_token()
+
+        return token
+
+
+class ResolutionCache(object):
+    """On-disk cache of the Rubrik object IDs resolved from their names, keyed by Rubrik cluster and object type. It lets
+    every module invocation in a play reuse a lookup instead of listing the same SLA Domains, VMs or hosts again. Entries
+    expire after the TTL and the entries of an object type can be invalidated explicitly.
+    """
+
+    def __init__(self, path, node_ip, ttl=DEFAULT_RESOLUTION_TTL):
+        self.path = path
+        self.node_ip = node_ip
+        self.ttl = ttl
+
+    def _entry_path(self, object_type):
+        key = hashlib.sha256("{}\0{}".format(self.node_ip, object_type).encode("utf-8")).hexdigest()
+        return os.path.join(self.path, "objects-{}.json".format(key))
+
+    @staticmethod
+    def _key(object_name, qualifiers):
+        qualifiers = list(qualifiers)
+        while qualifiers and qualifiers[-1] is None:
+            qualifiers.pop()
+        return json.dumps([object_name] + qualifiers)
+
+    def get(self, object_type, object_name, *qualifiers):
+        """Return the cached ID of the object or None when it is missing or expired."""
+
+        entries = read_json(self._entry_path(object_type)) or {}
+        entry = entries.get(self._key(object_name, qualifiers))
+
+        if not entry or entry.get("expires", 0) <= time.time():
+            return None
+
+        return entry.get("id")
+
+    def put(self, object_type, object_name, object_id, *qualifiers):
+        """Store a resolved object ID."""
+
+        entry_path = self._entry_path(object_type)
+        now = time.time()
+
+        with FileLock(entry_path + ".lock"):
+            entries = read_json(entry_path) or {}
+            # Drop the expired entries so the file does not keep growing over the lifetime of the cache
+            entries = dict((key, entry) for key, entry in iteritems(entries) if entry.get("expires", 0) > now)
+            entries[self._key(object_name, qualifiers)] = {"id": object_id, "expires": now + self.ttl}
+            write_json(entry_path, entries)
+
+    def invalidate(self, object_type):
+        """Remove all of the cached IDs of an object type."""
+
+        entry_path = self._entry_path(object_type)
+
+        with FileLock(entry_path + ".lock"):
+            try:
+                os.remove(entry_path)
+            except OSError:
+                pass
+
+
+class ClusterCapabilities(object):
+    """The software version of a Rubrik cluster and the features it supports."""
+
+    def __init__(self, version):
+        self.version = version
+        self.release = self.parse(version)
+
+    @staticmethod
+    def parse(version):
+        """Return the release of a CDM version string (ex. 5.0.1-1280) or number (ex. 5.0) as a tuple of integers."""
+
+        return tuple(int(number) for number in re.findall(r"\d+", str(version).split("-")[0])[:3])
+
+    def minimum_version(self, version):
+        """Return True when the Rubrik cluster runs the provided CDM version (ex. 5.0) or a later release."""
+
+        return self.release >= self.parse(version)
+
+    def supports(self, feature):
+        """Return True when the Rubrik cluster supports one of the FEATURES."""
+
+        return self.minimum_version(".".join(str(number) for number in FEATURES[feature]))
+
+
+class CapabilityCache(object):
+    """On-disk cache of the software version of the Rubrik clusters, keyed by node_ip. The SDK checks the version before
+    most of the requests whose endpoint or payload changed between releases, so every module invocation in a play would
+    otherwise fetch it at least once, and often several times.
+    """
+
+    def __init__(self, path, node_ip, ttl=DEFAULT_CAPABILITY_TTL):
+        self.path = path
+        self.node_ip = node_ip
+        self.ttl = ttl
+        self._capabilities = None
+
+    def _entry_path(self):
+        key = hashlib.sha256(self.node_ip.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, "capabilities-{}.json".format(key))
+
+    def get(self):
+        """Return the cached capabilities of the Rubrik cluster or None when they are missing or expired."""
+
+        entry = read_json(self._entry_path())
+        if not entry or entry.get("expires", 0) <= time.time():
+            return None
+
+        return ClusterCapabilities(entry["version"])
+
+    def capabilities(self, cluster_version, timeout=15):
+        """Return the capabilities of the Rubrik cluster, fetching its version when the cache does not hold a valid entry.
+        Arguments:
+            cluster_version {function} -- Fetches the version of the Rubrik cluster, called with the timeout.
+        Keyword Arguments:
+            timeout {int} -- The number of seconds to wait for the Rubrik cluster to respond. (default: {15})
+        Returns:
+            ClusterCapabilities -- The capabilities of the Rubrik cluster.
+        """
+
+        if self._capabilities is not None:
+            return self._capabilities
+
+        if self.ttl > 0:
+            self._capabilities = self.get()
+        if self._capabilities is None:
+            self._capabilities = ClusterCapabilities(cluster_version(timeout))
+            if self.ttl > 0:
+                entry_path = self._entry_path()
+                with FileLock(entry_path + ".lock"):
+                    write_json(entry_path, {"version": self._capabilities.version, "expires": time.time() + self.ttl})
+
+        return self._capabilities
+
+    def invalidate(self):
+        """Remove the cached capabilities, after the Rubrik cluster has been upgraded."""
+
+        self._capabilities = None
+        try:
+            os.remove(self._entry_path())
+        except OSError:
+            pass
+
+
+def _request_for(call_type, api_version, api_endpoint, config=None, job_status_url=None, params=None, gql_operation_name=None,
+                 gql_query=None, gql_variables=None):
+    """Translate the arguments of the SDK _common_api() method into the HTTP request it describes.
+    Returns:
+        [method] -- The HTTP method of the request.
+        [path] -- The path of the request, including the query string.
+        [data] -- The JSON encoded body of the request or None.
+    """
+
+    if call_type == "JOB_STATUS":
+        job_status_url = urlparse(job_status_url)
+        path = job_status_url.path
+        if job_status_url.query:
+            path = "{}?{}".format(path, job_status_url.query)
+        return "GET", path, None
+
+    if call_type == "QUERY":
+        query = {"operationName": gql_operation_name, "variables": gql_variables, "query": "query {}".format(gql_query)}
+        return "POST", "/api/internal/graphql", json.dumps(query)
+
+    # Quote the characters that are not allowed in a URL, such as the spaces of object names, like requests does
+    path = quote(to_bytes("/api/{}{}".format(api_version, api_endpoint)), safe="!#$%&'()*+,/:;=?@[]~")
+    if params and call_type in ("GET", "DELETE"):
+        path = "{}{}{}".format(path, "&" if "?" in path else "?",
+                               "&".join("{}={}".format(key, quote(str(value))) for key, value in params.items()))
+
+    if call_type == "GET" or config is None:
+        return call_type, path, None
+
+    return call_type, path, json.dumps(config)
+
+
+def _parse_response(call_type, status_code, body):
+    """Translate an HTTP response into the value the SDK _common_api() method returns, raising ApiCallError when the
+    Rubrik cluster returned an error.
+    """
+
+    try:
+        response = json.loads(body) if body else None
+    except ValueError:
+        response = None
+
+    if status_code >= 400:
+        error_message = response.get("message") if isinstance(response, dict) else None
+        raise ApiCallError(error_message or body or "HTTP Error {}".format(status_code), status_code)
+
+    if call_type == "QUERY" and isinstance(response, dict):
+        if "error" in response:
+            raise ApiCallError(response["error"], status_code)
+        if "data" in response:
+            return response["data"]
+
+    if status_code == 204 or response is None:
+        return {"status_code": status_code}
+
+    return response
+
+
+def gzip_compress(data):
+    """Return the data compressed in the gzip format."""
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class HttpTransport(object):
+    """Pool of keep-alive HTTPS connections to a Rubrik node. A connection is opened when a request finds none idle, up to
+    pool_size connections, and is returned to the pool for the following requests of the module run once its response
+    has been read. Every connection after the first resumes the TLS session of the previous one so that the Rubrik node
+    only goes through an abbreviated handshake. Responses are requested gzip encoded and decompressed as they are read,
+    and request bodies over the compression threshold are sent gzip encoded. The bytes sent and received on the wire are
+    counted in sent_bytes and received_bytes.
+    """
+
+    def __init__(self, node_ip, validate_certs=False, compression=True, compress_threshold=None, pool_size=DEFAULT_POOL_SIZE,
+                 metrics=None):
+        """
+        Arguments:
+            node_ip {str} -- The address of the Rubrik node.
+        Keyword Arguments:
+            validate_certs {bool} -- Flag that specifies whether the certificate of the Rubrik node is validated. (default: {False})
+            compression {bool} -- Flag that specifies whether gzip encoded responses are accepted. (default: {True})
+            compress_threshold {int} -- The size in bytes from which request bodies are gzip encoded. Request bodies are
+                                        never compressed when not provided. (default: {None})
+            pool_size {int} -- The maximum number of connections opened to the Rubrik node at the same time. (default: {4})
+            metrics {ApiMetrics} -- Counts the connections opened, reused and resumed when provided. (default: {None})
+        """
+
+        self.node_ip = node_ip
+        self.validate_certs = validate_certs
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self.pool_size = max(pool_size, 1)
+        self.metrics = metrics
+        self.sent_bytes = 0
+        self.received_bytes = 0
+        self._context = None
+        self._session = None
+        self._idle = []
+        self._open = 0
+        self._available = threading.Condition()
+
+    def _create_context(self):
+        context = ssl.create_default_context()
+        if not self.validate_certs:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+
+        return context
+
+    def _connect(self, timeout):
+        connection = http_client.HTTPSConnection(self.node_ip, timeout=timeout, context=self._context)
+        if self._session is not None:
+            # The socket is wrapped here, rather than in connect, to offer the session ticket of the previous connection
+            sock = socket.create_connection((connection.host, connection.port), timeout)
+            try:
+                connection.sock = self._context.wrap_socket(sock, server_hostname=connection.host, session=self._session)
+            except Exception:
+                sock.close()
+                raise
+
+        return connection
+
+    def _acquire(self, timeout, wait=None):
+        """Return an idle connection, or a new one when the pool is not full, along with whether it was reused. When the
+        pool is full, wait up to wait seconds, or until a connection is released when wait is None. Every request
+        releases its connection once its response has been read, so the requests queued behind a full pool are not
+        failed by the timeout of the requests in front of them.
+        """
+
+        deadline = None if wait is None else time.time() + wait
+        with self._available:
+            while not self._idle and self._open >= self.pool_size:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise socket.timeout("No connection to {} became available in the pool.".format(self.node_ip))
+                self._available.wait(remaining)
+
+            if self._idle:
+                return self._idle.pop(), True
+            self._open += 1
+            # TLS sessions can only be resumed through the context that established them, so it is shared by the connections
+            if self._context is None:
+                self._context = self._create_context()
+
+        try:
+            return self._connect(timeout), False
+        except Exception:
+            self._discard(None)
+            raise
+
+    def _release(self, connection):
+        with self._available:
+            if self._open <= self.pool_size:
+                self._idle.append(connection)
+                self._available.notify()
+                return
+
+        # The pool was shrunk while the connection was in use
+        self._discard(connection)
+
+    def _discard(self, connection, idle=False):
+        """Close a connection that failed, along with the idle connections when they are likely to have failed too."""
+
+        with self._available:
+            closing = self._idle if idle else []
+            if idle:
+                self._idle = []
+            self._open -= len(closing) + 1
+            self._available.notify_all()
+
+        if connection is not None:
+            connection.close()
+        for closed in closing:
+            closed.close()
+
+    def _record(self, connection, reused, metrics):
+        sock = connection.sock
+        if not reused and sock is not None and getattr(sock, "session", None) is not None:
+            self._session = sock.session
+        if metrics is not None:
+            metrics.record_connection(reused, not reused and bool(getattr(sock, "session_reused", False)))
+
+    def _read(self, response, headers):
+        if headers.get("content-encoding") != "gzip":
+            body = response.read()
+            self.received_bytes += len(body)
+            return body
+
+        # Decompress the body as it arrives so that the compressed copy is never held in memory as a whole
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunks = []
+        while True:
+            chunk = response.read(COMPRESSED_CHUNK_SIZE)
+            if not chunk:
+                break
+            self.received_bytes += len(chunk)
+            chunks.append(decompressor.decompress(chunk))
+        chunks.append(decompressor.flush())
+        del headers["content-encoding"]
+
+        return b"".join(chunks)
+
+    def _send(self, connection, method, path, body, headers, timeout):
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+
+        headers = dict(headers)
+        if self.compression:
+            headers["Accept-Encoding"] = "gzip"
+        if body is not None:
+            body = to_bytes(body)
+            if self.compress_threshold is not None and len(body) >= self.compress_threshold:
+                body = gzip_compress(body)
+                headers["Content-Encoding"] = "gzip"
+            self.sent_bytes += len(body)
+
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        response_headers = dict((key.lower(), value) for key, value in response.getheaders())
+
+        return response.status, response_headers, self._read(response, response_headers)
+
+    def send(self, method, path, body=None, headers=None, timeout=15, metrics=None):
+        """Send a request to the Rubrik node.
+        Keyword Arguments:
+            metrics {ApiMetrics} -- Counts the connection used by the request, in place of the metrics of the transport. (default: {None})
+        Returns:
+            [status_code] -- The HTTP status code of the response.
+            [headers] -- The response headers with lower case names.
+            [body] -- The raw response body.
+        """
+
+        connection, reused = self._acquire(timeout)
+        try:
+            response = self._send(connection, method, path, body, headers or {}, timeout)
+        except (http_client.HTTPException, socket.error) as error:
+            # The Rubrik node may have closed the idle connections between two requests, which only surfaces when a
+            # connection is reused. Open a new connection and send the request once more in that case.
+            self._discard(connection, idle=reused)
+            if not reused or isinstance(error, socket.timeout):
+                raise
+            connection, reused = self._acquire(timeout)
+            try:
+                response = self._send(connection, method, path, body, headers or {}, timeout)
+            except Exception:
+                self._discard(connection)
+                raise
+        except Exception:
+            self._discard(connection)
+            raise
+
+        self._record(connection, reused, self.metrics if metrics is None else metrics)
+        self._release(connection)
+
+        return response
+
+    def close(self):
+        with self._available:
+            closing, self._idle = self._idle, []
+            self._open -= len(closing)
+
+        for connection in closing:
+            connection.close()
+
+
+class SharedTransport(object):
+    """The view a module run has of an HttpTransport in SHARED_TRANSPORTS. The connections used by the requests of the
+    module run are counted in its own metrics, and closing it leaves the connections to close_shared_transports().
+    """
+
+    def __init__(self, transport, metrics=None):
+        self.transport = transport
+        self.node_ip = transport.node_ip
+        self.metrics = metrics
+
+    @property
+    def pool_size(self):
+        return self.transport.pool_size
+
+    @pool_size.setter
+    def pool_size(self, pool_size):
+        self.transport.pool_size = pool_size
+
+    def send(self, method, path, body=None, headers=None, timeout=15):
+        return self.transport.send(method, path, body, headers, timeout, metrics=self.metrics)
+
+    def close(self):
+        pass
+
+
+def close_shared_transports():
+    """Close the connections of the transports in SHARED_TRANSPORTS once a module run in the Ansible worker process has
+    completed. The TLS sessions are kept, so that the next module run to the same Rubrik node only goes through an
+    abbreviated handshake.
+    """
+
+    for transport in (SHARED_TRANSPORTS or {}).values():
+        transport.close()
+
+
+class NodePool(object):
+    """Health and load of the nodes of a Rubrik cluster, shared by all of the module processes through a file in the cache
+    directory. Each module run is assigned a node, in turn or by the lowest measured latency, and a node that can not be
+    reached is marked down for the cooldown period so that no other module process tries it in the meantime.
+    """
+
+    def __init__(self, path, cluster, nodes, strategy="round_robin", cooldown=DEFAULT_NODE_COOLDOWN):
+        """
+        Arguments:
+            path {str} -- The cache directory.
+            cluster {str} -- The node_ip setting the state is stored under.
+            nodes {list} -- The addresses of the Rubrik nodes.
+        Keyword Arguments:
+            strategy {str} -- How a node is assigned to a module run. (default: {round_robin}) (choices: {round_robin, least_latency})
+            cooldown {int} -- The number of seconds a node that can not be reached is skipped for. (default: {60})
+        """
+
+        self.path = path
+        self.cluster = cluster
+        self.nodes = nodes
+        self.strategy = strategy
+        self.cooldown = cooldown
+
+    def _entry_path(self):
+        key = hashlib.sha256(self.cluster.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, "nodes-{}.json".format(key))
+
+    def _update(self, update):
+        entry_path = self._entry_path()
+        with FileLock(entry_path + ".lock"):
+            state = read_json(entry_path) or {}
+            result = update(state)
+            write_json(entry_path, state)
+
+        return result
+
+    def discovered(self):
+        """Return the addresses discovered through the API or None when they are missing or expired."""
+
+        state = read_json(self._entry_path()) or {}
+        if state.get("discovered_until", 0) <= time.time():
+            return None
+
+        return state.get("discovered")
+
+    def discover(self, client, ttl=DEFAULT_DISCOVERY_TTL):
+        """Discover the addresses of the healthy nodes of the cluster through GET /internal/cluster/me/node."""
+
+        try:
+            nodes = client.get("internal", "/cluster/me/node").get("data", [])
+        except ApiCallError:
+            return
+
+        addresses = [node["ipAddress"] for node in nodes if node.get("ipAddress") and node.get("status", "OK") == "OK"]
+
+        def update(state):
+            state["discovered"] = addresses
+            state["discovered_until"] = time.time() + ttl
+
+        self._update(update)
+
+    def candidates(self):
+        """Return the addresses of the nodes in the order they should be tried for the next module run. Nodes that are
+        down come last, in case every node has been marked down.
+        """
+
+        def update(state):
+            now = time.time()
+            nodes = list(self.nodes)
+            if state.get("discovered_until", 0) > now:
+                nodes.extend(node for node in state.get("discovered", []) if node not in nodes)
+
+            down = state.get("down", {})
+            healthy = [node for node in nodes if down.get(node, 0) <= now]
+            unhealthy = sorted((node for node in nodes if down.get(node, 0) > now), key=lambda node: down[node])
+
+            if self.strategy == "least_latency":
+                latency = state.get("latency", {})
+                # Nodes without a measurement yet are tried first so that every node gets measured
+                healthy.sort(key=lambda node: latency.get(node, 0))
+            elif healthy:
+                start = state.get("next", 0) % len(healthy)
+                healthy = healthy[start:] + healthy[:start]
+                state["next"] = state.get("next", 0) + 1
+
+            return healthy + unhealthy
+
+        return self._update(update)
+
+    def mark_down(self, node):
+        def update(state):
+            state.setdefault("down", {})[node] = time.time() + self.cooldown
+
+        self._update(update)
+
+    def record_latency(self, samples):
+        """Fold the average latency, in seconds, measured for each node during the module run into the shared state."""
+
+        def update(state):
+            latency = state.setdefault("latency", {})
+            for node, sample in iteritems(samples):
+                latency[node] = sample if node not in latency else 0.7 * latency[node] + 0.3 * sample
+            down = state.get("down", {})
+            for node in samples:
+                down.pop(node, None)
+
+        self._update(update)
+
+
+class MultiNodeTransport(object):
+    """Spread the module runs across the nodes of a Rubrik cluster. A run sticks to the node the NodePool assigns it so
+    that the keep-alive connection is reused, and moves on to the next node when that node can not be reached. The
+    threads of a run share the node it sticks to and the transport of each node.
+    """
+
+    def __init__(self, pool, validate_certs=False, compression=True, compress_threshold=None, pool_size=DEFAULT_POOL_SIZE,
+                 metrics=None):
+        self.pool = pool
+        self.node_ip = pool.cluster
+        self.validate_certs = validate_certs
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self._pool_size = pool_size
+        self.metrics = metrics
+        self._transports = {}
+        self._latency = {}
+        self._current = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool_size(self):
+        return self._pool_size
+
+    @pool_size.setter
+    def pool_size(self, pool_size):
+        with self._lock:
+            self._pool_size = pool_size
+            for transport in self._transports.values():
+                transport.pool_size = pool_size
+
+    def _send(self, node, method, path, body, headers, timeout):
+        with self._lock:
+            if node not in self._transports:
+                self._transports[node] = HttpTransport(node, self.validate_certs, self.compression, self.compress_threshold,
+                                                       self._pool_size, self.metrics)
+            transport = self._transports[node]
+
+        start = time.time()
+        response = transport.send(method, path, body, headers, timeout)
+        with self._lock:
+            self._latency.setdefault(node, []).append(time.time() - start)
+
+        return response
+
+    def send(self, method, path, body=None, headers=None, timeout=15):
+        with self._lock:
+            failed = self._current
+
+        if failed is not None:
+            try:
+                return self._send(failed, method, path, body, headers, timeout)
+            except socket.timeout:
+                raise
+            except (http_client.HTTPException, socket.error):
+                with self._lock:
+                    # Another thread may already have moved the run to the next node
+                    moved = self._current != failed
+                    if not moved:
+                        self._current = None
+                if not moved:
+                    self.pool.mark_down(failed)
+
+        error = socket.error("None of the Rubrik nodes could be reached.")
+        for node in self.pool.candidates():
+            if node == failed:
+                continue
+            try:
+                response = self._send(node, method, path, body, headers, timeout)
+            except socket.timeout:
+                raise
+            except (http_client.HTTPException, socket.error) as node_error:
+                self.pool.mark_down(node)
+                error = node_error
+                continue
+            with self._lock:
+                self._current = node
+            return response
+
+        raise error
+
+    def close(self):
+        with self._lock:
+            latency, self._latency = self._latency, {}
+            transports, self._transports = self._transports, {}
+
+        if latency:
+            self.pool.record_latency(dict((node, sum(samples) / len(samples)) for node, samples in iteritems(latency)))
+
+        for transport in transports.values():
+            transport.close()
+
+
+class HttpApiTransport(object):
+    """Send the requests through the rubrikinc.cdm.rubrik httpapi plugin, which holds the authenticated session to the Rubrik
+    cluster in the persistent connection for the rest of the play.
+    """
+
+    def __init__(self, socket_path):
+        self._connection = Connection(socket_path)
+        self.node_ip = self._connection.get_option("host")
+
+    def send(self, method, path, body=None, headers=None, timeout=15):
+        status_code, response_body = self._connection.send_request(method, path, to_text(body) if body is not None else None, timeout)
+        return status_code, {}, to_bytes(response_body)
+
+    def close(self):
+        pass
+
+
+class CassetteError(Exception):
+    pass
+
+
+class CassetteTransport(object):
+    """Records the requests sent through another transport, along with their responses and latency, to a cassette file
+    and replays them without any Rubrik cluster. In replay mode every request must match a recorded one by method,
+    path and body. The requests that were recorded more than once, such as job status polls, get their responses in
+    the recorded order, the last one being repeated once they run out. Authorization headers are never recorded and
+    session tokens are replaced in the cassette. A login missing from the cassette is answered with a placeholder token.
+    """
+
+    def __init__(self, path, mode="replay", transport=None, latency=None, node_ip=None):
+        """
+        Arguments:
+            path {str} -- The path of the cassette file.
+        Keyword Arguments:
+            mode {str} -- Record the requests sent through the transport or replay them from the cassette. (choices: {record, replay}) (default: {replay})
+            transport {class} -- The transport the requests are sent through when recording. (default: {None})
+            latency {str or float} -- The time taken by every replayed response. Either a number of seconds or recorded to
+                                      wait as long as the Rubrik cluster took when the request was recorded. (default: {None})
+            node_ip {str} -- The node ip reported when replaying without a transport. (default: {None})
+        """
+
+        if mode not in ("record", "replay"):
+            raise CassetteError("The cassette mode must be record or replay.")
+        if mode == "record" and transport is None:
+            raise CassetteError("A transport is required to record a cassette.")
+
+        self.path = path
+        self.mode = mode
+        self.transport = transport
+        self.latency = latency
+        self.node_ip = transport.node_ip if transport is not None else node_ip
+        self._replayed = {}
+
+        if mode == "replay":
+            cassette = read_json(path)
+            if cassette is None:
+                raise CassetteError("Unable to read the cassette {}.".format(path))
+            self._interactions = cassette.get("interactions", [])
+
+    @staticmethod
+    def _body_key(body):
+        if body is None:
+            return None
+
+        body = to_text(body)
+        try:
+            return json.dumps(json.loads(body), sort_keys=True)
+        except ValueError:
+            return body
+
+    def _record(self, method, path, body, status_code, headers, response_body, latency):
+        response_text = to_text(response_body)
+        if path == "/api/v1/session" and status_code == 200:
+            response_text = json.dumps(dict(json.loads(response_text), token="cassette-token"))
+
+        with FileLock(self.path + ".lock"):
+            cassette = read_json(self.path) or {"interactions": []}
+            cassette["interactions"].append({
+                "request": {"method": method, "path": path, "body": None if body is None else to_text(body)},
+                "response": {"status": status_code, "headers": headers, "body": response_text},
+                "latency": round(latency, 4),
+            })
+            write_json(self.path, cassette)
+
+    def _replay(self, method, path, body):
+        key = (method, path, self._body_key(body))
+        matches = [interaction for interaction in self._interactions
+                   if (interaction["request"]["method"], interaction["request"]["path"],
+                       self._body_key(interaction["request"]["body"])) == key]
+        if not matches and key[:2] == ("POST", "/api/v1/session"):
+            # The recording may have used a cached session token, in which case the login was never recorded
+            return 200, {}, to_bytes(json.dumps({"token": "cassette-token"}))
+        if not matches:
+            raise CassetteError("The cassette {} has no response recorded for {} {}.".format(self.path, method, path))
+
+        index = self._replayed.get(key, 0)
+        self._replayed[key] = index + 1
+        interaction = matches[min(index, len(matches) - 1)]
+
+        if self.latency == "recorded":
+            time.sleep(interaction.get("latency", 0))
+        elif self.latency:
+            time.sleep(float(self.latency))
+
+        response = interaction["response"]
+        return response["status"], response.get("headers") or {}, to_bytes(response["body"])
+
+    def send(self, method, path, body=None, headers=None, timeout=15):
+        if self.mode == "replay":
+            return self._replay(method, path, body)
+
+        start = time.time()
+        status_code, response_headers, response_body = self.transport.send(method, path, body, headers, timeout)
+        self._record(method, path, body, status_code, response_headers, response_body, time.time() - start)
+
+        return status_code, response_headers, response_body
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+
+class RetryPolicy(object):
+    """Decides which failed requests are sent again and how long to wait before each new attempt. The wait grows
+    exponentially with each attempt, with jitter so that the module processes of a large play do not retry in lockstep,
+    and is capped at backoff_max seconds. A Retry-After header sent by the Rubrik cluster takes precedence.
+    """
+
+    def __init__(self, retries=DEFAULT_RETRIES, backoff_max=DEFAULT_BACKOFF_MAX, backoff_base=1):
+        self.retries = retries
+        self.backoff_max = backoff_max
+        self.backoff_base = backoff_base
+
+    def retryable(self, idempotent, status_code=None):
+        """Return True when a request that failed with the status code, or with a connection error when the status code
+        is None, can be sent again.
+        """
+
+        if status_code == 429:
+            return True
+
+        return idempotent and (status_code is None or status_code in RETRY_STATUS_CODES)
+
+    def delay(self, attempt, retry_after=None):
+        """Return the number of seconds to wait before sending the request again."""
+
+        if retry_after:
+            try:
+                seconds = float(retry_after)
+            except ValueError:
+                date = parsedate_tz(retry_after)
+                seconds = mktime_tz(date) - time.time() if date else None
+            if seconds is not None:
+                return min(max(seconds, 0), self.backoff_max)
+
+        backoff = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+
+        return backoff / 2.0 + random.uniform(0, backoff / 2.0)
+
+
+class CircuitBreaker(object):
+    """Per-cluster circuit breaker shared by all of the module processes through a file in the cache directory. Once
+    threshold consecutive requests have failed to reach the Rubrik cluster, every request fails immediately for the next
+    cooldown seconds instead of waiting on a cluster that is down. The first request after the cooldown is sent as
+    usual and either closes the breaker or opens it again.
+    """
+
+    def __init__(self, path, node_ip, threshold=DEFAULT_BREAKER_THRESHOLD, cooldown=DEFAULT_BREAKER_COOLDOWN):
+        self.path = path
+        self.node_ip = node_ip
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failing = False
+
+    def _entry_path(self):
+        key = hashlib.sha256(self.node_ip.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, "breaker-{}.json".format(key))
+
+    def check(self):
+        """Raise ApiCallError when the breaker is open."""
+
+        state = read_json(self._entry_path()) or {}
+        self._failing = state.get("failures", 0) > 0
+
+        if state.get("opened_until", 0) > time.time():
+            raise ApiCallError(
+                "The Rubrik cluster {} failed {} consecutive requests. Not sending any more requests to it for {} seconds.".format(
+                    self.node_ip, state["failures"], int(state["opened_until"] - time.time()) + 1))
+
+    def record_success(self):
+        if not self._failing:
+            return
+
+        entry_path = self._entry_path()
+        with FileLock(entry_path + ".lock"):
+            try:
+                os.remove(entry_path)
+            except OSError:
+                pass
+
+        self._failing = False
+
+    def record_failure(self):
+        entry_path = self._entry_path()
+        with FileLock(entry_path + ".lock"):
+            state = read_json(entry_path) or {}
+            state["failures"] = state.get("failures", 0) + 1
+            if state["failures"] >= self.threshold:
+                state["opened_until"] = time.time() + self.cooldown
+            write_json(entry_path, state)
+
+        self._failing = True
+
+
+class SingleFlight(object):
+    """Coalesces the identical GET requests sent to the Rubrik cluster at the same time by many module processes. The
+    first process to send a request holds a file lock while it waits for the response, and stores the response in the
+    cache directory for ttl seconds. The processes that send the same request in the meantime wait for the lock and
+    reuse that response instead of sending the request again. The expired responses, and their lock files, are removed
+    from the cache directory by the first request of every module run.
+    """
+
+    def __init__(self, path, node_ip, ttl):
+        self.path = path
+        self.node_ip = node_ip
+        self.ttl = ttl
+        self._pruned = False
+
+    def _entry_path(self, identity, request_path):
+        key = hashlib.sha256("{}\0{}\0{}".format(self.node_ip, identity, request_path).encode("utf-8")).hexdigest()
+        return os.path.join(self.path, "flight-{}.json".format(key))
+
+    @staticmethod
+    def _get(entry_path):
+        entry = read_json(entry_path)
+
+        if not entry or entry.get("expires", 0) <= time.time():
+            return None
+
+        return entry["status"], entry["body"]
+
+    def _prune(self):
+        """Remove the responses that expired, so that the response bodies are not kept on disk, and the lock files that
+        are no longer used.
+        """
+
+        now = time.time()
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return
+
+        for name in names:
+            if not name.startswith("flight-"):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                if name.endswith(".json"):
+                    entry = read_json(path)
+                    if entry is not None and entry.get("expires", 0) > now:
+                        continue
+                    with FileLock(path + ".lock"):
+                        # The response may have been received again while we were waiting for the lock
+                        entry = read_json(path)
+                        if entry is None or entry.get("expires", 0) <= now:
+                            os.remove(path)
+                            os.remove(path + ".lock")
+                elif name.endswith(".json.lock") and name[:-len(".lock")] not in names and os.path.getmtime(path) <= now - self.ttl:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def request(self, identity, request_path, send):
+        """Return the status code and body of the response to the GET request, only calling send when no other process
+        has just received it.
+        Arguments:
+            identity {str} -- The user the request is sent as. Responses are only shared between requests of the same user.
+            request_path {str} -- The path of the request, including the query string.
+            send {function} -- Sends the request and returns the status code and body of the response.
+        Returns:
+            [status_code] -- The HTTP status code of the response.
+            [body] -- The response body.
+        """
+
+        if not self._pruned:
+            self._pruned = True
+            self._prune()
+
+        entry_path = self._entry_path(identity, request_path)
+
+        response = self._get(entry_path)
+        if response is not None:
+            return response
+
+        with FileLock(entry_path + ".lock"):
+            # Another process may have received the response while we were waiting for the lock
+            response = self._get(entry_path)
+            if response is None:
+                response = send()
+                if response[0] == 200:
+                    write_json(entry_path, {"expires": time.time() + self.ttl, "status": response[0], "body": response[1]})
+
+        return response
+
+
+class RateLimiter(object):
+    """Token bucket shared by all of the module processes through a file in the cache directory. The bucket holds up to
+    burst tokens and refills at rate tokens per second, and every request sent to the Rubrik cluster takes one. When the
+    bucket is empty the token is reserved ahead of time and the request waits until it would have been refilled, so the
+    waiting requests are spread out at the sustained rate instead of all being sent as soon as a token comes back.
+    """
+
+    def __init__(self, path, node_ip, rate, burst=None):
+        self.path = path
+        self.node_ip = node_ip
+        self.rate = float(rate)
+        self.burst = max(burst or int(math.ceil(self.rate)), 1)
+
+    def _entry_path(self):
+        key = hashlib.sha256(self.node_ip.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, "bucket-{}.json".format(key))
+
+    def reserve(self):
+        """Take a token from the bucket and return the number of seconds to wait before it can be used."""
+
+        entry_path = self._entry_path()
+        with FileLock(entry_path + ".lock"):
+            now = time.time()
+            state = read_json(entry_path) or {"tokens": self.burst, "updated": now}
+            tokens = min(self.burst, state["tokens"] + max(now - state["updated"], 0) * self.rate) - 1
+            write_json(entry_path, {"tokens": tokens, "updated": now})
+
+        return max(-tokens / self.rate, 0)
+
+    def acquire(self):
+        """Wait until the request is allowed to be sent."""
+
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ConcurrencyLimiter(object):
+    """Counting semaphore shared by all of the module processes through lock files in the cache directory, one per slot.
+    At most slots requests are in flight to the Rubrik cluster at once, no matter how many forks Ansible runs, and the
+    other requests wait for a slot to be released. The operating system releases the slot of a module process that dies.
+    """
+
+    def __init__(self, path, node_ip, slots, wait=DEFAULT_SLOT_WAIT):
+        self.path = path
+        self.node_ip = node_ip
+        self.slots = slots
+        self.wait = wait
+        # The threads of a module fanning out requests each hold a slot of their own
+        self._held = threading.local()
+
+    def _slot_path(self, slot):
+        key = hashlib.sha256(self.node_ip.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, "slot-{}-{}.lock".format(key, slot))
+
+    def _try_acquire(self, slot):
+        fd = os.open(self._slot_path(slot), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            os.close(fd)
+            return None
+        return fd
+
+    def __enter__(self):
+        if not HAS_FCNTL:
+            return self
+
+        deadline = time.time() + self.wait
+        interval = 0.01
+        while True:
+            # Start from a random slot so that the waiting processes do not all contend for the first one
+            first = random.randrange(self.slots)
+            for slot in range(first, first + self.slots):
+                self._held.fd = self._try_acquire(slot % self.slots)
+                if self._held.fd is not None:
+                    return self
+
+            if time.time() >= deadline:
+                raise ApiCallError(
+                    "Timed out after {} seconds waiting for one of the {} concurrent request slots of the Rubrik cluster {}.".format(
+                        self.wait, self.slots, self.node_ip))
+
+            time.sleep(random.uniform(interval / 2, interval))
+            interval = min(interval * 2, 0.5)
+
+    def __exit__(self, *args):
+        fd = getattr(self._held, "fd", None)
+        if fd is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+            self._held.fd = None
+
+
+class ApiMetrics(object):
+    """Collects the timing of every request a module sends to the Rubrik cluster, along with the time spent logging in
+    and resolving object names, so that it can be returned in the module result as rubrik_metrics.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.auth = {"count": 0, "cached": 0, "latency_ms": 0.0}
+        self.lookups = {"count": 0, "cache_hits": 0, "latency_ms": 0.0}
+        self.connections = {"opened": 0, "reused": 0, "resumed": 0}
+
+    @staticmethod
+    def endpoint_template(path):
+        """Replace the object IDs in a request path with {id} so that calls to the same endpoint can be grouped."""
+
+        segments = path.split("?")[0].split("/")
+
+        return "/".join(
+            "{id}" if re.search(r"\d", segment) and not re.match(r"^v\d+$", segment) else segment for segment in segments)
+
+    def record_call(self, method, path, status_code, latency, request_bytes, response_bytes, retries):
+        self.calls.append({
+            "method": method,
+            "endpoint": self.endpoint_template(path),
+            "status": status_code,
+            "latency_ms": round(latency * 1000, 1),
+            "request_bytes": request_bytes,
+            "response_bytes": response_bytes,
+            "retries": retries,
+        })
+
+    def record_auth(self, latency):
+        self.auth["count"] += 1
+        self.auth["latency_ms"] = round(self.auth["latency_ms"] + latency * 1000, 1)
+
+    def record_cached_token(self):
+        """Count a session token reused from the TokenCache instead of logging in."""
+
+        self.auth["cached"] += 1
+
+    def record_lookup(self, latency, cache_hit):
+        self.lookups["count"] += 1
+        self.lookups["cache_hits"] += 1 if cache_hit else 0
+        self.lookups["latency_ms"] = round(self.lookups["latency_ms"] + latency * 1000, 1)
+
+    def record_connection(self, reused, resumed=False):
+        """Count a request sent on a connection reused from the pool, or on a new connection and whether it resumed the
+        TLS session of a previous one."""
+
+        self.connections["reused" if reused else "opened"] += 1
+        self.connections["resumed"] += 1 if resumed else 0
+
+    def report(self):
+        """Return the rubrik_metrics dictionary added to the module result."""
+
+        return {
+            "calls": self.calls,
+            "totals": {
+                "requests": len(self.calls),
+                "latency_ms": round(sum(call["latency_ms"] for call in self.calls), 1),
+                "request_bytes": sum(call["request_bytes"] for call in self.calls),
+                "response_bytes": sum(call["response_bytes"] for call in self.calls),
+                "retries": sum(call["retries"] for call in self.calls),
+                "auth": self.auth,
+                "lookups": self.lookups,
+                "connections": self.connections,
+            },
+        }
+
+
+class PrometheusTextfile(object):
+    """Exports the requests sent by the modules to the Rubrik clusters as a rubrik_cdm.prom file in the directory read by
+    the node_exporter textfile collector. The counters of every module run are merged, under a file lock, into a state
+    file kept in the cache directory, and the textfile is then rewritten from it and atomically renamed into place so
+    that the collector never reads a partial file.
+    """
+
+    METRICS = (
+        ("rubrik_cdm_api_requests_total", "counter", "Requests sent to the Rubrik cluster."),
+        ("rubrik_cdm_api_request_duration_seconds", "histogram", "Time taken by the Rubrik cluster to answer a request, including retries."),
+        ("rubrik_cdm_api_retries_total", "counter", "Requests sent again after the Rubrik cluster was busy or could not be reached."),
+        ("rubrik_cdm_api_failures_total", "counter", "Requests that failed to reach the Rubrik cluster or returned an error status."),
+        ("rubrik_cdm_auth_total", "counter", "Logins to the Rubrik cluster to mint a session token."),
+        ("rubrik_cdm_auth_duration_seconds_total", "counter", "Time spent logging in to the Rubrik cluster."),
+        ("rubrik_cdm_auth_cached_total", "counter", "Session tokens reused from the cache instead of logging in to the Rubrik cluster."),
+        ("rubrik_cdm_object_lookups_total", "counter", "Object IDs resolved from names, by whether they were served from the cache."),
+        ("rubrik_cdm_connections_total", "counter", "Requests by whether they opened a connection, resumed a TLS session or reused a connection."),
+    )
+
+    def __init__(self, path, state_dir):
+        self.path = path
+        key = hashlib.sha256(os.path.abspath(path).encode("utf-8")).hexdigest()
+        self.state_path = os.path.join(state_dir, "prometheus-{}.json".format(key))
+
+    @staticmethod
+    def _labels(**labels):
+        return json.dumps(sorted(iteritems(labels)))
+
+    @staticmethod
+    def _increment(state, metric, labels, value=1):
+        samples = state.setdefault(metric, {})
+        samples[labels] = samples.get(labels, 0) + value
+
+    def _observe(self, state, labels, latency):
+        histogram = state.setdefault("rubrik_cdm_api_request_duration_seconds", {}).setdefault(
+            labels, {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0, "count": 0})
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                histogram["buckets"][index] += 1
+        histogram["sum"] += latency
+        histogram["count"] += 1
+
+    def merge(self, state, metrics, cluster, module_name):
+        """Add the requests recorded by the module run to the state of the exported metrics."""
+
+        for call in metrics.calls:
+            endpoint = self._labels(cluster=cluster, module=module_name, method=call["method"], endpoint=call["endpoint"])
+            self._increment(state, "rubrik_cdm_api_requests_total", self._labels(
+                cluster=cluster, module=module_name, method=call["method"], endpoint=call["endpoint"], status=str(call["status"])))
+            self._observe(state, endpoint, call["latency_ms"] / 1000.0)
+            if call["status"] is None or call["status"] >= 400:
+                self._increment(state, "rubrik_cdm_api_failures_total", endpoint)
+            if call["retries"]:
+                self._increment(state, "rubrik_cdm_api_retries_total", endpoint, call["retries"])
+
+        module_labels = self._labels(cluster=cluster, module=module_name)
+        if metrics.auth["count"]:
+            self._increment(state, "rubrik_cdm_auth_total", module_labels, metrics.auth["count"])
+            self._increment(state, "rubrik_cdm_auth_duration_seconds_total", module_labels, metrics.auth["latency_ms"] / 1000.0)
+        if metrics.auth["cached"]:
+            self._increment(state, "rubrik_cdm_auth_cached_total", module_labels, metrics.auth["cached"])
+        if metrics.lookups["count"]:
+            hits = metrics.lookups["cache_hits"]
+            for cache, count in (("hit", hits), ("miss", metrics.lookups["count"] - hits)):
+                if count:
+                    self._increment(state, "rubrik_cdm_object_lookups_total",
+                                    self._labels(cluster=cluster, module=module_name, cache=cache), count)
+        for connection, count in iteritems(metrics.connections):
+            if count:
+                self._increment(state, "rubrik_cdm_connections_total",
+                                self._labels(cluster=cluster, module=module_name, connection=connection), count)
+
+    @staticmethod
+    def _format_labels(labels, **extra):
+        labels = json.loads(labels) + sorted(iteritems(extra))
+        return "{{{}}}".format(",".join('{}="{}"'.format(
+            name, to_text(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in labels))
+
+    def render(self, state):
+        """Return the contents of the textfile in the Prometheus text exposition format."""
+
+        lines = []
+        for metric, metric_type, description in self.METRICS:
+            samples = state.get(metric)
+            if not samples:
+                continue
+            lines.append("# HELP {} {}".format(metric, description))
+            lines.append("# TYPE {} {}".format(metric, metric_type))
+            for labels in sorted(samples):
+                value = samples[labels]
+                if metric_type != "histogram":
+                    lines.append("{}{} {}".format(metric, self._format_labels(labels), value))
+                    continue
+                for bound, count in zip(LATENCY_BUCKETS, value["buckets"]):
+                    lines.append("{}_bucket{} {}".format(metric, self._format_labels(labels, le=str(bound)), count))
+                lines.append("{}_bucket{} {}".format(metric, self._format_labels(labels, le="+Inf"), value["count"]))
+                lines.append("{}_sum{} {}".format(metric, self._format_labels(labels), round(value["sum"], 4)))
+                lines.append("{}_count{} {}".format(metric, self._format_labels(labels), value["count"]))
+
+        return "\n".join(lines) + "\n"
+
+    def export(self, metrics, cluster, module_name):
+        """Merge the requests recorded by the module run into the textfile."""
+
+        with FileLock(self.state_path + ".lock"):
+            state = read_json(self.state_path) or {}
+            self.merge(state, metrics, cluster, module_name)
+            write_json(self.state_path, state)
+
+            # The collector only reads the files ending in .prom, so the temporary file is never picked up
+            tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+            with open(tmp_path, "w") as textfile:
+                textfile.write(self.render(state))
+            os.rename(tmp_path, self.path)
+
+
+class HttpTrace(object):
+    """Appends a JSON line to the trace file for every HTTP exchange with the Rubrik cluster, login and retry of a module
+    run, so that the trace of a whole play can be loaded and searched for where the time was spent. Each line is written
+    with a single append so that the lines of concurrent module processes never interleave. Request bodies, response
+    bodies and headers are never written, and the values of the query parameters that look like secrets are redacted.
+    """
+
+    SECRET_PARAMS = re.compile(r"([?&][^=&]*(?:password|secret|token|key)[^=&]*=)[^&]*", re.IGNORECASE)
+
+    def __init__(self, path, module_name, task_id=None):
+        self.path = path
+        self.module_name = module_name
+        self.task_id = task_id or uuid.uuid4().hex
+
+    def redact(self, path):
+        return self.SECRET_PARAMS.sub(r"\1REDACTED", path)
+
+    def record(self, event, start, **fields):
+        """Append an event to the trace file.
+        Arguments:
+            event {str} -- The type of the event (request, retry or login).
+            start {float} -- The time the event started at, in seconds since the epoch.
+        Keyword Arguments:
+            fields -- The details of the event. A path is redacted and grouped into an endpoint.
+        """
+
+        entry = {
+            "timestamp": "{}.{:03d}Z".format(time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(start)), int(start % 1 * 1000)),
+            "event": event,
+            "module": self.module_name,
+            "task_id": self.task_id,
+            "pid": os.getpid(),
+        }
+        if fields.get("path") is not None:
+            fields["path"] = self.redact(fields["path"])
+            fields["endpoint"] = ApiMetrics.endpoint_template(fields["path"])
+        entry.update(fields)
+
+        descriptor = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(descriptor, to_bytes(json.dumps(entry, sort_keys=True) + "\n"))
+        finally:
+            os.close(descriptor)
+
+
+class RubrikClient(object):
+    """Lightweight client for the Rubrik CDM REST API. It exposes the same get, post, patch, put, delete and job_status
+    methods as the Rubrik SDK without depending on the SDK or requests, and sends all of the requests made by the module
+    through the keep-alive connection pool of its transport.
+    """
+
+    def __init__(self, transport, username=None, password=None, api_token=None, token_cache=None, retry_policy=None,
+                 circuit_breaker=None, metrics=None, concurrency_limiter=None, rate_limiter=None, single_flight=None, trace=None):
+        """
+        Arguments:
+            transport {class} -- The transport used to send the requests (HttpTransport or HttpApiTransport).
+        Keyword Arguments:
+            username {str} -- The username used to login into the Rubrik cluster. (default: {None})
+            password {str} -- The password used to login into the Rubrik cluster. (default: {None})
+            api_token {str} -- The API token used to login into the Rubrik cluster. (default: {None})
+            token_cache {TokenCache} -- Cache used to mint and reuse a session token from the username and password. (default: {None})
+            retry_policy {RetryPolicy} -- Policy used to send failed requests again. Requests are not retried when not provided. (default: {None})
+            circuit_breaker {CircuitBreaker} -- Circuit breaker used to fail fast while the Rubrik cluster is down. (default: {None})
+            metrics {ApiMetrics} -- Collector the timing of every request is recorded in. (default: {None})
+            concurrency_limiter {ConcurrencyLimiter} -- Semaphore that caps the requests in flight to the Rubrik cluster across all
+                                                        module processes. (default: {None})
+            rate_limiter {RateLimiter} -- Token bucket that caps the rate of the requests sent to the Rubrik cluster across all module
+                                          processes. (default: {None})
+            single_flight {SingleFlight} -- Shares the response of identical GET requests sent by concurrent module processes. (default: {None})
+            trace {HttpTrace} -- Trace every request, login and retry is written to. (default: {None})
+        """
+
+        self.transport = transport
+        self.node_ip = transport.node_ip
+        self.username = username
+        self.password = password
+        self.api_token = api_token
+        self.token_cache = token_cache
+        self.retry_policy = retry_policy or RetryPolicy(retries=0)
+        self.circuit_breaker = circuit_breaker
+        self.metrics = metrics
+        self.concurrency_limiter = concurrency_limiter
+        self.rate_limiter = rate_limiter
+        self.single_flight = single_flight
+        self.trace = trace
+        # Set by connect() so that the version of the Rubrik cluster is shared by the module invocations
+        self.capability_cache = None
+        self._modified = False
+
+        if token_cache is not None and api_token is None:
+            self._login()
+
+    def _login(self):
+        start = time.time()
+        if self.trace is None:
+            self.api_token = self.token_cache.token(self.node_ip, self.username, self.password, transport=self.transport,
+                                                    metrics=self.metrics)
+        else:
+            cached = self.token_cache.get(self.node_ip, self.username, self.password) is not None
+            try:
+                self.api_token = self.token_cache.token(self.node_ip, self.username, self.password, transport=self.transport,
+                                                        metrics=self.metrics)
+            except RubrikSessionError as error:
+                self.trace.record("login", start, cluster=self.node_ip, cached=cached, latency_ms=round((time.time() - start) * 1000, 1),
+                                  error=str(error))
+                raise
+            self.trace.record("login", start, cluster=self.node_ip, cached=cached, latency_ms=round((time.time() - start) * 1000, 1))
+
+    def _headers(self, authentication):
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "User-Agent": USER_AGENT,
+        }
+
+        if authentication:
+            if self.api_token is not None:
+                headers["Authorization"] = "Bearer {}".format(self.api_token)
+            elif self.username is not None:
+                user_password = to_bytes("{}:{}".format(self.username, self.password))
+                headers["Authorization"] = "Basic {}".format(to_text(base64.b64encode(user_password)))
+
+        return headers
+
+    def _trace_exchange(self, method, path, data, start, status_code=None, body="", error=None):
+        if self.trace is not None:
+            self.trace.record("request", start, cluster=self.node_ip, method=method, path=path, status=status_code,
+                              latency_ms=round((time.time() - start) * 1000, 1), request_bytes=len(to_bytes(data or "")),
+                              response_bytes=len(to_bytes(body)), error=error)
+
+    def _send(self, method, path, data, timeout, authentication):
+        start = time.time()
+        try:
+            status_code, headers, body = self.transport.send(method, path, data, self._headers(authentication), timeout)
+        except socket.timeout:
+            self._trace_exchange(method, path, data, start, error="timeout")
+            raise ApiCallError(
+                "The Rubrik cluster did not respond to the API request in the allotted amount of time. To fix this issue, increase the timeout value.")
+        except (http_client.HTTPException, socket.error) as error:
+            self._trace_exchange(method, path, data, start, error=str(error) or type(error).__name__)
+            raise ApiCallError("Unable to establish a connection to the Rubrik cluster.")
+
+        self._trace_exchange(method, path, data, start, status_code, body)
+
+        return status_code, headers, to_text(body)
+
+    def _limited_send(self, method, path, data, timeout, authentication):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+        if self.concurrency_limiter is None:
+            return self._authenticated_send(method, path, data, timeout, authentication)
+
+        with self.concurrency_limiter:
+            return self._authenticated_send(method, path, data, timeout, authentication)
+
+    def _authenticated_send(self, method, path, data, timeout, authentication):
+        response = self._send(method, path, data, timeout, authentication)
+
+        if response[0] == 401 and authentication and self.token_cache is not None:
+            self.token_cache.invalidate(self.node_ip, self.username, self.api_token)
+            self._login()
+            response = self._send(method, path, data, timeout, authentication)
+
+        return response
+
+    def request(self, method, path, data=None, timeout=15, authentication=True, idempotent=None):
+        """Send a request to the Rubrik cluster. A cached session token the Rubrik cluster no longer accepts is replaced
+        with a new one and the request is sent again. Requests that fail because the Rubrik cluster is busy or can not be
+        reached are retried according to the retry policy. A request waits for a token of the rate limiter and a free
+        slot of the concurrency limiter before it is sent, and releases the slot while it waits to be retried. GET requests
+        share the response other module processes have just received, until the module changes anything on the Rubrik
+        cluster so that it always reads its own changes.
+        Arguments:
+            method {str} -- The HTTP method of the request.
+            path {str} -- The path of the request, including the query string (ex. /api/v1/cluster/me).
+        Keyword Arguments:
+            data {str} -- The JSON encoded body of the request. (default: {None})
+            timeout {int} -- The number of seconds to wait for the Rubrik cluster to respond. (default: {15})
+            authentication {bool} -- Flag that specifies whether or not to utilize authentication. (default: {True})
+            idempotent {bool} -- Flag that specifies whether the request can safely be sent more than once. Defaults to
+                                 True for GET, HEAD, PUT and DELETE requests. (default: {None})
+        Returns:
+            [status_code] -- The HTTP status code of the response.
+            [body] -- The response body.
+        """
+
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+
+        if method not in ("GET", "HEAD"):
+            self._modified = True
+        elif method == "GET" and self.single_flight is not None and not self._modified:
+            return self.single_flight.request(
+                self.username or self.api_token or "", path, lambda: self._request(method, path, data, timeout, authentication, idempotent))
+
+        return self._request(method, path, data, timeout, authentication, idempotent)
+
+    def _backoff(self, method, path, attempt, delay, status_code=None, error=None):
+        if self.trace is not None:
+            self.trace.record("retry", time.time(), cluster=self.node_ip, method=method, path=path, attempt=attempt + 1,
+                              delay_s=round(delay, 3), status=status_code, error=error)
+        time.sleep(delay)
+
+    def _request(self, method, path, data, timeout, authentication, idempotent):
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.check()
+
+        start = time.time()
+        attempt = 0
+        while True:
+            try:
+                status_code, headers, body = self._limited_send(method, path, data, timeout, authentication)
+            except ApiCallError as error:
+                if attempt < self.retry_policy.retries and self.retry_policy.retryable(idempotent):
+                    self._backoff(method, path, attempt, self.retry_policy.delay(attempt), error=str(error))
+                    attempt += 1
+                    continue
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_failure()
+                if self.metrics is not None:
+                    self.metrics.record_call(method, path, None, time.time() - start, len(to_bytes(data or "")), 0, attempt)
+                raise
+
+            if attempt < self.retry_policy.retries and self.retry_policy.retryable(idempotent, status_code):
+                self._backoff(method, path, attempt, self.retry_policy.delay(attempt, headers.get("retry-after")), status_code)
+                attempt += 1
+                continue
+
+            break
+
+        if self.circuit_breaker is not None:
+            if status_code in BREAKER_STATUS_CODES:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+
+        if self.metrics is not None:
+            self.metrics.record_call(method, path, status_code, time.time() - start, len(to_bytes(data or "")), len(to_bytes(body)),
+                                     attempt)
+
+        return status_code, body
+
+    def _common_api(self, call_type, api_version, api_endpoint, config=None, job_status_url=None, timeout=15, authentication=True,
+                    params=None, gql_operation_name=None, gql_query=None, gql_variables=None):
+        """Drop-in replacement for the SDK _common_api() method."""
+
+        method, path, data = _request_for(call_type, api_version, api_endpoint, config, job_status_url, params,
+                                          gql_operation_name, gql_query, gql_variables)
+        # GraphQL queries are sent as a POST but only read data
+        idempotent = True if call_type in ("QUERY", "JOB_STATUS") else None
+        if call_type == "JOB_STATUS":
+            # Every poll must see the latest status of the job, never a response coalesced with an earlier poll
+            status_code, body = self._request(method, path, data, timeout, authentication, idempotent)
+        else:
+            status_code, body = self.request(method, path, data, timeout, authentication, idempotent)
+
+        return _parse_response(call_type, status_code, body)
+
+    def get(self, api_version, api_endpoint, timeout=15, authentication=True, params=None):
+        """Send a GET request to the provided Rubrik API endpoint."""
+
+        return self._common_api("GET", api_version, api_endpoint, timeout=timeout, authentication=authentication, params=params)
+
+    def post(self, api_version, api_endpoint, config, timeout=15, authentication=True):
+        """Send a POST request to the provided Rubrik API endpoint."""
+
+        return self._common_api("POST", api_version, api_endpoint, config=config, timeout=timeout, authentication=authentication)
+
+    def patch(self, api_version, api_endpoint, config, timeout=15, authentication=True):
+        """Send a PATCH request to the provided Rubrik API endpoint."""
+
+        return self._common_api("PATCH", api_version, api_endpoint, config=config, timeout=timeout, authentication=authentication)
+
+    def put(self, api_version, api_endpoint, config, timeout=15, authentication=True):
+        """Send a PUT request to the provided Rubrik API endpoint."""
+
+        return self._common_api("PUT", api_version, api_endpoint, config=config, timeout=timeout, authentication=authentication)
+
+    def delete(self, api_version, api_endpoint, timeout=15, authentication=True, config=None, params=None):
+        """Send a DELETE request to the provided Rubrik API endpoint."""
+
+        return self._common_api("DELETE", api_version, api_endpoint, config=config, timeout=timeout, authentication=authentication,
+                                params=params)
+
+    def job_status(self, url, wait_for_completion=True, timeout=15):
+        """Return the status of the job behind a job status url, optionally waiting for the job to complete."""
+
+        if not isinstance(wait_for_completion, bool):
+            raise ApiCallError("The job_status() wait_for_completion argument must be True or False.")
+
+        while True:
+            api_request = self._common_api("JOB_STATUS", None, None, job_status_url=url, timeout=timeout)
+
+            if not wait_for_completion or api_request["status"] in ("SUCCEEDED", "CANCELED"):
+                return api_request
+
+            if api_request["status"] not in JOB_IN_PROGRESS_STATUS:
+                raise ApiCallError(str(api_request))
+
+            time.sleep(10)
+
+    def _fetch_cluster_version(self, timeout=15):
+        return self.get("v1", "/cluster/me/version", timeout=timeout)["version"]
+
+    def cluster_version(self, timeout=15):
+        """Retrieves the software version of the Rubrik cluster, from the capability cache when one is set."""
+
+        return self.capabilities(timeout).version
+
+    def capabilities(self, timeout=15):
+        """Return the ClusterCapabilities of the Rubrik cluster, from the capability cache when one is set."""
+
+        if self.capability_cache is None:
+            return ClusterCapabilities(self._fetch_cluster_version(timeout))
+
+        return self.capability_cache.capabilities(self._fetch_cluster_version, timeout)
+
+    def close(self):
+        self.transport.close()
+
+
+def _resilience(module, node_ip):
+    """Return the retry policy, circuit breaker, concurrency limiter, rate limiter and single flight configured for the module."""
+
+    retry_policy = RetryPolicy(provider_option(module, "retries", DEFAULT_RETRIES),
+                               provider_option(module, "backoff_max", DEFAULT_BACKOFF_MAX))
+
+    circuit_breaker = None
+    threshold = provider_option(module, "circuit_breaker_threshold", DEFAULT_BREAKER_THRESHOLD)
+    if threshold > 0:
+        circuit_breaker = CircuitBreaker(cache_dir(module), node_ip, threshold)
+
+    concurrency_limiter = None
+    max_concurrent_requests = provider_option(module, "max_concurrent_requests", 0)
+    if max_concurrent_requests > 0:
+        concurrency_limiter = ConcurrencyLimiter(cache_dir(module), node_ip, max_concurrent_requests)
+
+    rate_limiter = None
+    rate_limit_rps = provider_option(module, "rate_limit_rps", 0)
+    if rate_limit_rps > 0:
+        rate_limiter = RateLimiter(cache_dir(module), node_ip, rate_limit_rps, provider_option(module, "rate_limit_burst"))
+
+    single_flight = None
+    coalesce_ttl = provider_option(module, "coalesce_ttl", 0)
+    if coalesce_ttl > 0:
+        single_flight = SingleFlight(cache_dir(module), node_ip, coalesce_ttl)
+
+    return retry_policy, circuit_breaker, concurrency_limiter, rate_limiter, single_flight
+
+
+def _page_request(fetch, params, prefetch):
+    """Return a function that returns the page requested with params. With prefetch the request is sent right away from
+    a background thread so that it overlaps with the processing of the current page.
+    """
+
+    if not prefetch:
+        return lambda: fetch(params)
+
+    result = {}
+
+    def run():
+        try:
+            result["page"] = fetch(params)
+        except Exception as error:
+            result["error"] = error
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+
+    def wait():
+        thread.join()
+        if "error" in result:
+            raise result["error"]
+        return result["page"]
+
+    return wait
+
+
+def paginate(rubrik, api_version, api_endpoint, params=None, page_size=DEFAULT_PAGE_SIZE, prefetch=False, timeout=15):
+    """Iterate lazily over every object returned by a Rubrik list endpoint, requesting one page of page_size objects at a
+    time so that memory use stays flat no matter how many objects the cluster holds. The next page is requested while
+    hasMore is set, from the nextCursor of the response when the endpoint returns one and by offset otherwise.
+    Arguments:
+        rubrik {class} -- The RubrikClient or Rubrik SDK connection used to send the requests.
+        api_version {str} -- The version of the Rubrik CDM API to call. (choices: {v1, v2, internal})
+        api_endpoint {str} -- The endpoint of the Rubrik CDM API to call (ex. /host).
+    Keyword Arguments:
+        params {dict} -- Query parameters sent with every page request. (default: {None})
+        page_size {int} -- The number of objects requested per page. (default: {500})
+        prefetch {bool} -- Flag that specifies whether the next page is requested while the current one is consumed. It is
+                           sent on a connection of its own from the pool, so the caller may send other requests while it
+                           iterates. (default: {False})
+        timeout {int} -- The number of seconds to wait for the Rubrik cluster to respond. (default: {15})
+    Yields:
+        dict -- Each object of the list.
+    """
+
+    params = dict(params or {})
+    params["limit"] = page_size
+    offset = params.get("offset", 0)
+
+    def fetch(page_params):
+        return rubrik.get(api_version, api_endpoint, timeout=timeout, params=page_params)
+
+    pending = _page_request(fetch, params, prefetch)
+    while pending is not None:
+        page = pending()
+        pending = None
+
+        if isinstance(page, list):
+            for item in page:
+                yield item
+            return
+
+        data = page.get("data", [])
+        offset += len(data)
+
+        if data and page.get("hasMore"):
+            next_params = dict(params)
+            if page.get("nextCursor"):
+                next_params.pop("offset", None)
+                next_params["cursor"] = page["nextCursor"]
+            else:
+                next_params["offset"] = offset
+            params = next_params
+            pending = _page_request(fetch, params, prefetch)
+
+        for item in data:
+            yield item
+
+
+def collect_items(module, items, key="data"):
+    """Collect the objects of a list, as yielded by paginate(), that the module returns under key. When the module only
+    returns some fields of its response, through return_fields or response=none, each object is reduced to those fields
+    as it is read, so that a large inventory is never held in memory as a whole.
+    Arguments:
+        module {class} -- Ansible module helper class.
+        items {iterable} -- The objects of the list.
+    Keyword Arguments:
+        key {str} -- The key of the response the objects are returned under. (default: {data})
+    Returns:
+        list -- The objects, reduced to the fields the module returns.
+        int -- The number of objects in the list.
+    """
+
+    if provider_option(module, "response", "full") == "none":
+        fields = ID_FIELDS
+    else:
+        fields = provider_option(module, "return_fields")
+
+    paths = None
+    if fields:
+        paths = []
+        for field in fields:
+            path = _field_path(field)
+            if path[:1] != [key]:
+                continue
+            if len(path) < 3 or path[1] not in ("[]", "[*]"):
+                # The whole objects, or some of them by position, are returned
+                paths = None
+                break
+            paths.append(path[2:])
+
+    objects = []
+    total = 0
+    for item in items:
+        total += 1
+        if paths is None:
+            objects.append(item)
+        elif paths:
+            projected = None
+            for path in paths:
+                projected = _merge(projected, _project(item, path))
+            objects.append(projected)
+
+    return objects, total
+
+
+def state_diff(current, desired):
+    """Return the part of the desired state of a Rubrik configuration object that differs from its current state. Nested
+    dictionaries are compared field by field, any other value, including lists, as a whole.
+    Arguments:
+        current {dict} -- The normalized current state.
+        desired {dict} -- The desired state.
+    Returns:
+        dict -- The fields of the desired state whose value differs from the current state, empty when none do.
+    """
+
+    changes = {}
+    for key, value in iteritems(desired):
+        if isinstance(value, dict) and isinstance(current.get(key), dict):
+            nested = state_diff(current[key], value)
+            if nested:
+                changes[key] = nested
+        elif current.get(key) != value:
+            changes[key] = value
+
+    return changes
+
+
+class DesiredState(object):
+    """Brings a configuration object of the Rubrik cluster, such as its NTP servers or login banner, to a desired state.
+    The current state is fetched once, normalized into the shape of the desired state and compared to it, and a request
+    is only sent when a field differs, with just the fields that changed. Nothing is written in check mode, and the
+    current and desired states are returned as the diff of the task when it runs with --diff.
+    """
+
+    def __init__(self, rubrik, api_version, api_endpoint, timeout=15):
+        """
+        Arguments:
+            rubrik {class} -- The RubrikClient or Rubrik SDK connection used to send the requests.
+            api_version {str} -- The version of the Rubrik CDM API of the object. (choices: {v1, v2, internal})
+            api_endpoint {str} -- The endpoint that returns the current state of the object (ex. /cluster/me).
+        Keyword Arguments:
+            timeout {int} -- The number of seconds to wait for the Rubrik cluster to respond. (default: {15})
+        """
+
+        self.rubrik = rubrik
+        self.api_version = api_version
+        self.api_endpoint = api_endpoint
+        self.timeout = timeout
+        self._current = None
+
+    def current(self):
+        """Return the current state of the object as returned by the Rubrik cluster, fetching it on the first call."""
+
+        if self._current is None:
+            self._current = self.rubrik.get(self.api_version, self.api_endpoint, timeout=self.timeout)
+
+        return self._current
+
+    def apply(self, module, desired, normalize, write, unchanged="No change required."):
+        """Compare the current state of the object to the desired state and write the changes.
+        Arguments:
+            module {class} -- Ansible module helper class, for its check and diff modes.
+            desired {dict} -- The desired state.
+            normalize {function} -- Turns the current state returned by the Rubrik cluster into the shape of the desired state.
+            write {function} -- Sends the request that applies the changes, called with the fields that differ and the
+                                current state returned by the Rubrik cluster. Returns the response.
+        Keyword Arguments:
+            unchanged {str} -- The response of the module when the object is already in the desired state. (default: {"No change required."})
+        Returns:
+            dict -- The changed, response and, in diff mode, diff results of the module.
+        """
+
+        current = self.current()
+        before = normalize(current)
+        changes = state_diff(before, desired)
+
+        results = {"changed": bool(changes)}
+        if module._diff:
+            results["diff"] = {"before": before, "after": desired}
+
+        if not changes:
+            results["response"] = unchanged
+        elif module.check_mode:
+            results["response"] = changes
+        else:
+            results["response"] = write(changes, current)
+
+        return results
+
+
+def _fan_out(function, items, workers):
+    """Call function with each of the items from at most workers threads and return the results in the order of items."""
+
+    items = list(items)
+    if not items:
+        return []
+    workers = max(min(workers, len(items)), 1)
+
+    # Imported here so that the modules which never fan out do not pay for it at startup
+    from multiprocessing.pool import ThreadPool
+
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(function, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def run_parallel(tasks, max_workers=DEFAULT_FANOUT_WINDOW):
+    """Run the tasks at the same time from a thread pool, so that a module can call a Rubrik SDK method such as
+    assign_sla, on_demand_snapshot or vsphere_live_unmount for every item of a list. A task that fails does not stop the
+    others. The requests of the tasks share the keep-alive connections of the module, so no more than pool_size of
+    them are in flight at once.
+    Arguments:
+        tasks {list} -- The functions to call, without arguments (ex. functools.partial(rubrik.assign_sla, name, sla)).
+    Keyword Arguments:
+        max_workers {int} -- The maximum number of tasks running at the same time. (default: {32})
+    Returns:
+        list -- The outcome of every task, in the order of tasks. Each is a dict with the result of the task or, when
+                it failed, failed set to True and the error in msg, along with the time the task took in elapsed_ms.
+    """
+
+    def run(task):
+        start = time.time()
+        try:
+            outcome = {"failed": False, "result": task()}
+        except Exception as error:
+            outcome = {"failed": True, "msg": str(error) or type(error).__name__}
+        outcome["elapsed_ms"] = round((time.time() - start) * 1000, 1)
+        return outcome
+
+    return _fan_out(run, tasks, max_workers)
+
+
+class AsyncRubrikClient(object):
+    """Sends many requests to the Rubrik cluster at the same time, for the modules that touch many objects in one task.
+    The requests are sent from the thread pool of run_parallel with at most window of them in flight, and each one goes
+    through the RubrikClient so that it is authenticated, retried, rate limited and counted in the metrics like any other
+    request. Unlike run_parallel, the calls are named RubrikClient methods and their errors are raised or returned as is.
+    """
+
+    def __init__(self, rubrik, window=DEFAULT_FANOUT_WINDOW):
+        """
+        Arguments:
+            rubrik {RubrikClient} -- The client the requests are sent through.
+        Keyword Arguments:
+            window {int} -- The maximum number of requests in flight at the same time. (default: {32})
+        """
+
+        self.rubrik = rubrik
+        self.window = max(window, 1)
+
+    def _outcome(self, call):
+        method, args = call[0], call[1] if len(call) > 1 else ()
+        kwargs = call[2] if len(call) > 2 else {}
+        try:
+            return getattr(self.rubrik, method)(*args, **kwargs), None
+        except Exception as error:
+            return None, error
+
+    def gather(self, calls, return_exceptions=False):
+        """Send the calls to the Rubrik cluster at the same time and wait for all of them to complete.
+        Arguments:
+            calls {list} -- The calls to send, each a tuple of the name of a RubrikClient method (ex. get, post or
+                            job_status), a tuple of its arguments and optionally a dict of its keyword arguments.
+        Keyword Arguments:
+            return_exceptions {bool} -- Flag that specifies whether the error of a failed call is returned in place of
+                                        its result. The first error is raised once every call completed otherwise. (default: {False})
+        Returns:
+            list -- The result of every call, in the order of calls.
+        """
+
+        # Every request in flight needs a keep-alive connection of its own, but only while the calls are sent, as the
+        # transport can be shared with the following tasks
+        transport = self.rubrik.transport
+        pool_size = getattr(transport, "pool_size", self.window)
+        if pool_size < self.window:
+            transport.pool_size = self.window
+        try:
+            outcomes = _fan_out(self._outcome, calls, self.window)
+        finally:
+            if pool_size < self.window:
+                transport.pool_size = pool_size
+
+        if not return_exceptions:
+            for _, error in outcomes:
+                if error is not None:
+                    raise error
+
+        return [error if error is not None else result for result, error in outcomes]
+
+
+def _cassette(transport):
+    """Wrap the transport in a CassetteTransport when the rubrik_cdm_cassette environment variable is set, so that whole
+    module runs can be recorded against a Rubrik cluster and replayed offline by the tests and benchmarks.
+    """
+
+    path = os.environ.get("rubrik_cdm_cassette")
+    if not path:
+        return transport
+
+    return CassetteTransport(path, os.environ.get("rubrik_cdm_cassette_mode", "replay"), transport,
+                             os.environ.get("rubrik_cdm_cassette_latency"))
+
+
+class ModuleProfiler(object):
+    """Profiles the CPU time or the memory allocations of a module run and writes the results to a directory when the
+    module exits. A cpu profile is written as a <module>-<pid>.prof file that pstats, snakeviz or gprof2dot can load. A
+    mem profile is written as a <module>-<pid>.tracemalloc snapshot, which tracemalloc.Snapshot.load() can load, along
+    with a <module>-<pid>.txt summary of the peak memory and the lines that allocated the most. Later runs in the same
+    process add a -<run> suffix to the name.
+    """
+
+    def __init__(self, mode, path, name):
+        self.mode = mode
+        self.path = path
+        self.name = name
+        self.profiler = None
+
+    def start(self):
+        if self.mode == "cpu":
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            import tracemalloc
+            tracemalloc.start(25)
+
+    def stop(self):
+        """Stop profiling and write the results. Returns the path of the main file written."""
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        prefix = os.path.join(self.path, "{}-{}".format(self.name, os.getpid()))
+        # The loop items of a task run in the same Ansible worker process when the module runs in-process
+        run = 1
+        while os.path.exists(prefix + (".prof" if self.mode == "cpu" else ".tracemalloc")):
+            run += 1
+            prefix = os.path.join(self.path, "{}-{}-{}".format(self.name, os.getpid(), run))
+
+        if self.mode == "cpu":
+            self.profiler.disable()
+            self.profiler.dump_stats(prefix + ".prof")
+            return prefix + ".prof"
+
+        import tracemalloc
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        snapshot.dump(prefix + ".tracemalloc")
+
+        with open(prefix + ".txt", "w") as summary:
+            summary.write("Traced memory: {:.1f} MiB current, {:.1f} MiB peak\n".format(current / 1048576.0, peak / 1048576.0))
+            try:
+                import resource
+                # ru_maxrss is in kilobytes on Linux and bytes on macOS
+                maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                summary.write("Maximum resident set size: {:.1f} MiB\n".format(
+                    maxrss / (1048576.0 if sys.platform == "darwin" else 1024.0)))
+            except ImportError:
+                pass
+            summary.write("\nTop allocations by line:\n")
+            for statistic in snapshot.statistics("lineno")[:25]:
+                summary.write("{}\n".format(statistic))
+
+        return prefix + ".tracemalloc"
+
+
+def _profile(module):
+    """Profile the rest of the module run when the rubrik_cdm_profile environment variable is set to cpu or mem, and write
+    the results to the directory set by rubrik_cdm_profile_dir, the profiles directory of the default cache_dir otherwise,
+    when the module exits or fails. The environment is read on every module run, so that a task can turn profiling on
+    through its environment when the module runs in the Ansible worker process.
+    """
+
+    mode = os.environ.get("rubrik_cdm_profile")
+    if mode not in ("cpu", "mem"):
+        return None
+
+    path = os.path.expanduser(os.environ.get("rubrik_cdm_profile_dir", os.path.join(DEFAULT_CACHE_DIR, "profiles")))
+    profiler = ModuleProfiler(mode, path, _module_name(module) or "module")
+    try:
+        profiler.start()
+    except ImportError:
+        # tracemalloc is only available on Python 3
+        return None
+
+    exit_json = module.exit_json
+    fail_json = module.fail_json
+
+    def _stop():
+        try:
+            profiler.stop()
+        except (IOError, OSError) as error:
+            module.warn("Unable to write the {} profile to {}: {}".format(mode, path, error))
+
+    def _exit_json(*args, **kwargs):
+        _stop()
+        exit_json(*args, **kwargs)
+
+    def _fail_json(*args, **kwargs):
+        _stop()
+        fail_json(*args, **kwargs)
+
+    module.exit_json = _exit_json
+    module.fail_json = _fail_json
+    return profiler
+
+
+def _client(module, metrics=None, trace=None):
+    """Create the RubrikClient for the module from the connection parameters or the httpapi persistent connection."""
+
+    if module._socket_path:
+        transport = _cassette(HttpApiTransport(module._socket_path))
+        retry_policy, circuit_breaker, concurrency_limiter, rate_limiter, single_flight = _resilience(module, transport.node_ip)
+        return RubrikClient(transport, retry_policy=retry_policy, circuit_breaker=circuit_breaker, metrics=metrics,
+                            concurrency_limiter=concurrency_limiter, rate_limiter=rate_limiter, single_flight=single_flight,
+                            trace=trace)
+
+    node_ip, username, password, api_token = credentials(module)
+
+    compression = provider_option(module, "compression", True)
+    compress_threshold = provider_option(module, "request_compression_threshold")
+    pool_size = provider_option(module, "pool_size", DEFAULT_POOL_SIZE)
+
+    pool = None
+    addresses, discover = node_addresses(node_ip)
+    if not addresses:
+        module.fail_json(msg="The node_ip must include the address of at least one node of the Rubrik cluster.")
+    if len(addresses) > 1 or discover:
+        pool = NodePool(cache_dir(module), ",".join(addresses + (["auto"] if discover else [])), addresses,
+                        provider_option(module, "node_selection", "round_robin"), provider_option(module, "node_cooldown", DEFAULT_NODE_COOLDOWN))
+        transport = MultiNodeTransport(pool, compression=compression, compress_threshold=compress_threshold,
+                                       pool_size=pool_size, metrics=metrics)
+    elif SHARED_TRANSPORTS is None:
+        transport = HttpTransport(addresses[0], compression=compression, compress_threshold=compress_threshold,
+                                  pool_size=pool_size, metrics=metrics)
+    else:
+        key = (addresses[0], compression, compress_threshold, pool_size)
+        if key not in SHARED_TRANSPORTS:
+            SHARED_TRANSPORTS[key] = HttpTransport(addresses[0], compression=compression, compress_threshold=compress_threshold,
+                                                   pool_size=pool_size)
+        transport = SharedTransport(SHARED_TRANSPORTS[key], metrics)
+    transport = _cassette(transport)
+
+    token_cache = None
+    if api_token is None and provider_option(module, "session_cache", True):
+        token_cache = TokenCache(cache_dir(module), provider_option(module, "session_ttl", DEFAULT_SESSION_TTL))
+
+    retry_policy, circuit_breaker, concurrency_limiter, rate_limiter, single_flight = _resilience(module, transport.node_ip)
+
+    client = RubrikClient(transport, username, password, api_token, token_cache, retry_policy, circuit_breaker, metrics,
+                          concurrency_limiter, rate_limiter, single_flight, trace)
+
+    if discover and pool.discovered() is None:
+        pool.discover(client)
+
+    return client
+
+
+def _sdk_connect(client, enable_logging=False):
+    """Create a Rubrik SDK connection whose requests are sent through the RubrikClient."""
+
+    import rubrik_cdm
+
+    if client.api_token is not None:
+        rubrik = rubrik_cdm.Connect(client.node_ip, api_token=client.api_token, enable_logging=enable_logging)
+    elif client.username is not None:
+        rubrik = rubrik_cdm.Connect(client.node_ip, client.username, client.password, enable_logging=enable_logging)
+    else:
+        # The SDK needs a credential to build the connection, the actual authentication is handled by the client
+        rubrik = rubrik_cdm.Connect(client.node_ip, api_token=HTTPAPI_SESSION, enable_logging=enable_logging)
+
+    def _common_api(*args, **kwargs):
+        try:
+            return client._common_api(*args, **kwargs)
+        except ApiCallError as error:
+            raise rubrik_cdm.exceptions.APICallException(str(error))
+
+    rubrik._common_api = _common_api
+
+    return rubrik
+
+
+def _cache_object_ids(rubrik, cache):
+    """Resolve the names of Rubrik objects through the ResolutionCache. object_id() is used by every SDK method that
+    accepts an object name, so all of them reuse the cached IDs. Creating or deleting an object through the connection
+    invalidates the cached IDs of its object type, and so does a failed request made after an ID was served from the
+    cache, in case the ID belonged to an object that has since been deleted.
+    """
+
+    object_id = rubrik.object_id
+    common_api = rubrik._common_api
+    served_types = set()
+
+    def _object_id(object_name, object_type, host_os=None, hostname=None, share_type=None, mssql_host=None, mssql_instance=None,
+                   timeout=15):
+        qualifiers = (host_os, hostname, share_type, mssql_host, mssql_instance)
+
+        cached_id = cache.get(object_type, object_name, *qualifiers)
+        if cached_id is not None:
+            served_types.add(object_type)
+            return cached_id
+
+        resolved_id = object_id(object_name, object_type, host_os, hostname, share_type, mssql_host, mssql_instance, timeout)
+        cache.put(object_type, object_name, resolved_id, *qualifiers)
+
+        return resolved_id
+
+    def _common_api(call_type, api_version, api_endpoint, *args, **kwargs):
+        try:
+            response = common_api(call_type, api_version, api_endpoint, *args, **kwargs)
+        except Exception:
+            for object_type in served_types:
+                cache.invalidate(object_type)
+            served_types.clear()
+            raise
+
+        if call_type in ("POST", "DELETE") and api_endpoint:
+            path = api_endpoint.split("?")[0].rstrip("/")
+            for object_type, collection in iteritems(RESOLUTION_ENDPOINTS):
+                if (call_type == "POST" and path == collection) or (call_type == "DELETE" and path.rsplit("/", 1)[0] == collection):
+                    cache.invalidate(object_type)
+
+        return response
+
+    rubrik.object_id = _object_id
+    rubrik._common_api = _common_api
+
+
+def _field_path(field):
+    """Split a field selector such as data[].links[0].href into its keys and list selectors."""
+
+    return re.findall(r"[^.\[\]]+|\[\*?\]|\[\d+\]", field)
+
+
+def _project(value, path):
+    """Return the part of value selected by the path, keeping its structure, or None when nothing is selected."""
+
+    if not path:
+        return value
+
+    step, rest = path[0], path[1:]
+
+    if step.startswith("["):
+        if not isinstance(value, list):
+            return None
+        if step in ("[]", "[*]"):
+            projected = [_project(item, rest) for item in value]
+            return projected if any(item is not None for item in projected) else None
+        index = int(step[1:-1])
+        if index >= len(value):
+            return None
+        projected = _project(value[index], rest)
+        return None if projected is None else [projected]
+
+    if not isinstance(value, dict) or step not in value:
+        return None
+
+    projected = _project(value[step], rest)
+    return None if projected is None else {step: projected}
+
+
+def _merge(first, second):
+    """Combine two projections of the same response."""
+
+    if first is None:
+        return second
+    if second is None:
+        return first
+    if isinstance(first, dict) and isinstance(second, dict):
+        merged = dict(first)
+        for key, value in iteritems(second):
+            merged[key] = _merge(merged.get(key), value)
+        return merged
+    if isinstance(first, list) and isinstance(second, list) and len(first) == len(second):
+        return [_merge(item, other) for item, other in zip(first, second)]
+    return second
+
+
+def project_fields(response, fields):
+    """Reduce an API response to the selected fields. A field is a dotted path of keys where [] selects every element
+    of a list and [n] a single one (ex. data[].name). The structure of the response is kept, so multiple fields under
+    the same list are merged element by element. A response that is not a dictionary, such as a message or a list, is
+    returned unchanged.
+    Arguments:
+        response {dict} -- The API response.
+        fields {list} -- The field selectors.
+    Returns:
+        dict -- The selected fields of the response.
+    """
+
+    if not isinstance(response, dict):
+        return response
+
+    projected = None
+    for field in fields:
+        projected = _merge(projected, _project(response, _field_path(field)))
+
+    return {} if projected is None else projected
+
+
+def _cache_capabilities(rubrik, cache):
+    """Serve the version of the Rubrik cluster from the CapabilityCache. minimum_installed_cdm_version() is called by the
+    SDK before every request whose endpoint or payload depends on the release, so all of them reuse the cached version.
+    The release is compared as a tuple of integers instead of the first three characters of the version, so that 5.10
+    is later than 5.2. The capabilities() method is added to the connection for the modules.
+    """
+
+    cluster_version = rubrik.cluster_version
+
+    def _cluster_version(timeout=15):
+        return cache.capabilities(cluster_version, timeout).version
+
+    def _minimum_installed_cdm_version(version, timeout=15):
+        return cache.capabilities(cluster_version, timeout).minimum_version(version)
+
+    def _capabilities(timeout=15):
+        return cache.capabilities(cluster_version, timeout)
+
+    rubrik.cluster_version = _cluster_version
+    rubrik.minimum_installed_cdm_version = _minimum_installed_cdm_version
+    rubrik.capabilities = _capabilities
+
+
+def _measure_lookups(rubrik, metrics):
+    """Record the time spent resolving object names. A lookup that did not send any request was served from the cache."""
+
+    object_id = rubrik.object_id
+
+    def _object_id(*args, **kwargs):
+        start = time.time()
+        calls = len(metrics.calls)
+        try:
+            return object_id(*args, **kwargs)
+        finally:
+            metrics.record_lookup(time.time() - start, len(metrics.calls) == calls)
+
+    rubrik.object_id = _object_id
+
+
+def _report_metrics(module, metrics):
+    """Add rubrik_metrics to the result of the module, whether it exits or fails."""
+
+    exit_json = module.exit_json
+    fail_json = module.fail_json
+
+    def _exit_json(*args, **kwargs):
+        kwargs["rubrik_metrics"] = metrics.report()
+        exit_json(*args, **kwargs)
+
+    def _fail_json(*args, **kwargs):
+        kwargs["rubrik_metrics"] = metrics.report()
+        fail_json(*args, **kwargs)
+
+    module.exit_json = _exit_json
+    module.fail_json = _fail_json
+
+
+def _module_name(module):
+    """Return the name of the running module, as set by Ansible, without the file extension."""
+
+    return re.sub(r"\.py$", "", module._name or "")
+
+
+def _export_metrics(module, metrics, textfile, cluster):
+    """Export the requests sent by the module to the Prometheus textfile when it exits or fails."""
+
+    exit_json = module.exit_json
+    fail_json = module.fail_json
+    module_name = _module_name(module)
+
+    def _export():
+        try:
+            textfile.export(metrics, cluster, module_name)
+        except (IOError, OSError) as error:
+            module.warn("Unable to export the Rubrik API metrics to {}: {}".format(textfile.path, error))
+
+    def _exit_json(*args, **kwargs):
+        _export()
+        exit_json(*args, **kwargs)
+
+    def _fail_json(*args, **kwargs):
+        _export()
+        fail_json(*args, **kwargs)
+
+    module.exit_json = _exit_json
+    module.fail_json = _fail_json
+
+
+def _slim_results(module, fields):
+    """Reduce the response returned by the module to the selected fields before it is handed to Ansible."""
+
+    exit_json = module.exit_json
+
+    def _exit_json(*args, **kwargs):
+        if kwargs.get("response") is not None:
+            kwargs["response"] = project_fields(kwargs["response"], fields)
+        exit_json(*args, **kwargs)
+
+    module.exit_json = _exit_json
+
+
+def _cluster_name(cluster):
+    node_ip = cluster.get("node_ip")
+    return cluster.get("name") or (",".join(node_ip) if isinstance(node_ip, list) else node_ip)
+
+
+def _use_cluster(module, cluster):
+    """Point the connection settings of the module at one of its clusters, on top of the settings of the provider and the
+    top level parameters, which carry the environment variables.
+    """
+
+    provider = dict((key, None) for key in rubrik_provider_spec)
+    for settings in (module.params, module.params.get("provider") or {}, cluster):
+        provider.update((key, value) for key, value in iteritems(settings) if key in provider and value is not None)
+
+    module.params["provider"] = provider
+    module.params.update((key, value) for key, value in iteritems(provider) if value is not None)
+    module.params["clusters"] = None
+
+
+def _messages(module):
+    """Return the lists the warnings and deprecations of the module run are collected in."""
+
+    if warnings is None:
+        return module._warnings, module._deprecations
+
+    return warnings._global_warnings, warnings._global_deprecations
+
+
+def _report_to_parent(module, fd):
+    """Send the result of the module run for one cluster to the parent process instead of printing it. The warnings and
+    deprecations raised for the cluster are sent along with it, the ones the parent raised before forking are its own.
+    """
+
+    for messages in _messages(module):
+        del messages[:]
+
+    def _finish(result):
+        module_warnings, module_deprecations = _messages(module)
+        result = dict(result, warnings=list(result.get("warnings") or []) + list(module_warnings),
+                      deprecations=list(result.get("deprecations") or []) + list(module_deprecations))
+        data = to_bytes(json.dumps(result, default=to_text))
+        while data:
+            data = data[os.write(fd, data):]
+        os._exit(0)
+
+    def _excepthook(error_type, error, error_traceback):
+        _finish({"failed": True, "msg": str(error) or error_type.__name__,
+                 "exception": "".join(traceback.format_exception(error_type, error, error_traceback))})
+
+    module.exit_json = lambda **kwargs: _finish(kwargs)
+    module.fail_json = lambda **kwargs: _finish(dict(kwargs, failed=True))
+    sys.excepthook = _excepthook
+
+
+def _fan_out_clusters(module):
+    """Run the module against every Rubrik cluster of the clusters option at the same time. The module process forks a
+    child for each cluster, up to cluster_forks at once, and the child returns to the module with the connection settings
+    of its cluster so that the rest of the module runs unchanged. The parent collects the result of every child and exits
+    with them keyed by cluster name, so this function only returns in the children.
+    """
+
+    clusters = module.params["clusters"]
+    if module._socket_path:
+        module.fail_json(msg="The clusters option can not be used over the rubrikinc.cdm.rubrik httpapi connection.")
+
+    names = [_cluster_name(cluster) for cluster in clusters]
+    if None in names or len(set(names)) != len(names):
+        module.fail_json(msg="Each of the clusters must have a unique name or node_ip.")
+
+    forks = max(module.params.get("cluster_forks") or DEFAULT_CLUSTER_FORKS, 1)
+    pending = list(enumerate(clusters))
+    running = {}
+    results = [None] * len(clusters)
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    while pending or running:
+        while pending and len(running) < forks:
+            index, cluster = pending.pop(0)
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                for fd in [read_fd] + list(running):
+                    os.close(fd)
+                _use_cluster(module, cluster)
+                _report_to_parent(module, write_fd)
+                return
+            os.close(write_fd)
+            running[read_fd] = (index, pid, [])
+
+        ready, _, _ = select.select(list(running), [], [])
+        for fd in ready:
+            chunk = os.read(fd, 65536)
+            if chunk:
+                running[fd][2].append(chunk)
+                continue
+
+            index, pid, chunks = running.pop(fd)
+            os.close(fd)
+            _, status = os.waitpid(pid, 0)
+            try:
+                results[index] = json.loads(to_text(b"".join(chunks)))
+            except ValueError:
+                results[index] = {"failed": True, "msg": "The module exited with status {} without a result.".format(status)}
+
+    for name, result in zip(names, results):
+        for warning in result.pop("warnings", []):
+            module.warn("{}: {}".format(name, warning))
+        for deprecation in result.pop("deprecations", []):
+            if not isinstance(deprecation, dict):
+                deprecation = {"msg": deprecation}
+            module.deprecate(**dict(deprecation, msg="{}: {}".format(name, deprecation.get("msg"))))
+
+    failed = [name for name, result in zip(names, results) if result.get("failed")]
+    outcome = {"changed": any(result.get("changed", False) for result in results), "clusters": dict(zip(names, results))}
+    if failed:
+        module.fail_json(msg="The task failed on {} of the {} Rubrik clusters: {}.".format(len(failed), len(clusters), ", ".join(failed)),
+                         **outcome)
+    module.exit_json(**outcome)
+
+
+def connect(module, sdk=True, enable_logging=False):
+    """Create the connection used by a module to talk to the Rubrik cluster. All requests are sent through a RubrikClient
+    which reuses one keep-alive connection for the whole module run. When a username and password are used for
+    authentication, the session token is minted once per node_ip and username and then reused from the on-disk cache by
+    every later module invocation until it expires or the Rubrik cluster rejects it. The IDs the SDK connection resolves
+    from object names are cached the same way for resolution_cache_ttl seconds, and the version of the Rubrik cluster
+    for capability_cache_ttl seconds. When the task runs over the rubrikinc.cdm.rubrik httpapi connection, the requests
+    are sent through that persistent connection instead. When collect_metrics is set, the timing of every request is
+    returned in the module result as rubrik_metrics, and it is added to the rubrik_cdm.prom file of the
+    prometheus_textfile_dir when that is set. Every request, login and retry is appended to the trace_file as a JSON line
+    when it is set. The response returned by the module is reduced to the return_fields, or to the object IDs when
+    response is none. When the clusters option is set, the rest of the module runs against each of the clusters at the
+    same time and the module returns their results keyed by cluster name. The rest of the module run is profiled when the
+    rubrik_cdm_profile environment variable is set.
+    Arguments:
+        module {class} -- Ansible module helper class.
+    Keyword Arguments:
+        sdk {bool} -- Flag that determines if a Rubrik SDK connection or a RubrikClient is returned. (default: {True})
+        enable_logging {bool} -- Flag to determine if logging will be enabled for the SDK. (default: {False})
+    Returns:
+        [rubrik_cdm.Connect or RubrikClient] -- The connection to the Rubrik cluster.
+    """
+
+    if module.params.get("clusters"):
+        _fan_out_clusters(module)
+
+    _profile(module)
+
+    if provider_option(module, "response", "full") == "none":
+        _slim_results(module, ID_FIELDS)
+    elif provider_option(module, "return_fields"):
+        _slim_results(module, provider_option(module, "return_fields"))
+
+    metrics = None
+    if provider_option(module, "collect_metrics", False):
+        metrics = ApiMetrics()
+        _report_metrics(module, metrics)
+
+    textfile_dir = provider_option(module, "prometheus_textfile_dir")
+    if textfile_dir:
+        metrics = metrics or ApiMetrics()
+
+    trace = None
+    if provider_option(module, "trace_file"):
+        trace = HttpTrace(os.path.expanduser(provider_option(module, "trace_file")), _module_name(module))
+
+    client = _client(module, metrics, trace)
+
+    if textfile_dir:
+        textfile = PrometheusTextfile(os.path.join(os.path.expanduser(textfile_dir), "rubrik_cdm.prom"), cache_dir(module))
+        _export_metrics(module, metrics, textfile, client.node_ip)
+
+    capability_cache = CapabilityCache(cache_dir(module), client.node_ip,
+                                       provider_option(module, "capability_cache_ttl", DEFAULT_CAPABILITY_TTL))
+    client.capability_cache = capability_cache
+
+    if not sdk:
+        return client
+
+    rubrik = _sdk_connect(client, enable_logging)
+    _cache_capabilities(rubrik, capability_cache)
+
+    resolution_ttl = provider_option(module, "resolution_cache_ttl", DEFAULT_RESOLUTION_TTL)
+    if resolution_ttl > 0:
+        _cache_object_ids(rubrik, ResolutionCache(cache_dir(module), client.node_ip, resolution_ttl))
+
+    if metrics is not None:
+        _measure_lookups(rubrik, metrics)
+
+    return rubrik
+
+
 rubrik_provider_spec = {
-    'node_ip': dict(fallback=(env_fallback, ['rubrik_cdm_node_ip'])),
+    'node_ip': dict(type='raw', fallback=(env_fallback, ['rubrik_cdm_node_ip'])),
     'username': dict(fallback=(env_fallback, ['rubrik_cdm_username'])),
     'password': dict(fallback=(env_fallback, ['rubrik_cdm_password']), no_log=True),
     'api_token': dict(fallback=(env_fallback, ['rubrik_cdm_token']), no_log=True),
+    'cache_dir': dict(type='path', fallback=(env_fallback, ['rubrik_cdm_cache_dir'])),
+    'session_cache': dict(type='bool'),
+    'session_ttl': dict(type='int'),
+    'resolution_cache_ttl': dict(type='int'),
+    'capability_cache_ttl': dict(type='int'),
+    'retries': dict(type='int'),
+    'backoff_max': dict(type='int'),
+    'circuit_breaker_threshold': dict(type='int'),
+    'collect_metrics': dict(type='bool'),
+    'node_selection': dict(type='str', choices=['round_robin', 'least_latency']),
+    'node_cooldown': dict(type='int'),
+    'return_fields': dict(type='list', elements='str'),
+    'response': dict(type='str', choices=['full', 'none']),
+    'max_concurrent_requests': dict(type='int'),
+    'rate_limit_rps': dict(type='float'),
+    'rate_limit_burst': dict(type='int'),
+    'coalesce_ttl': dict(type='float'),
+    'prometheus_textfile_dir': dict(type='path'),
+    'trace_file': dict(type='path'),
+    'compression': dict(type='bool'),
+    'request_compression_threshold': dict(type='int'),
+    'pool_size': dict(type='int'),
 }
 
 rubrik_manual_spec = {
-    'node_ip': dict(fallback=(env_fallback, ['rubrik_cdm_node_ip'])),
+    'node_ip': dict(type='raw', fallback=(env_fallback, ['rubrik_cdm_node_ip'])),
     'username': dict(fallback=(env_fallback, ['rubrik_cdm_username'])),
     'password': dict(fallback=(env_fallback, ['rubrik_cdm_password']), no_log=True),
     'api_token': dict(fallback=(env_fallback, ['rubrik_cdm_token']), no_log=True),
+    'cache_dir': dict(type='path', fallback=(env_fallback, ['rubrik_cdm_cache_dir'])),
+    'session_cache': dict(type='bool'),
+    'session_ttl': dict(type='int'),
+    'resolution_cache_ttl': dict(type='int'),
+    'capability_cache_ttl': dict(type='int'),
+    'retries': dict(type='int'),
+    'backoff_max': dict(type='int'),
+    'circuit_breaker_threshold': dict(type='int'),
+    'collect_metrics': dict(type='bool'),
+    'node_selection': dict(type='str', choices=['round_robin', 'least_latency']),
+    'node_cooldown': dict(type='int'),
+    'return_fields': dict(type='list', elements='str'),
+    'response': dict(type='str', choices=['full', 'none']),
+    'max_concurrent_requests': dict(type='int'),
+    'rate_limit_rps': dict(type='float'),
+    'rate_limit_burst': dict(type='int'),
+    'coalesce_ttl': dict(type='float'),
+    'prometheus_textfile_dir': dict(type='path'),
+    'trace_file': dict(type='path'),
+    'compression': dict(type='bool'),
+    'request_compression_threshold': dict(type='int'),
+    'pool_size': dict(type='int'),
 }
 
 rubrik_argument_spec = {
     'provider': dict(type='dict', options=rubrik_provider_spec),
+    # The settings of a cluster take precedence over the provider, so they do not fall back to the environment variables
+    'clusters': dict(type='list', elements='dict', options=dict(
+        dict((key, dict((name, value) for name, value in iteritems(spec) if name != 'fallback'))
+             for key, spec in iteritems(rubrik_provider_spec)),
+        name=dict(type='str'))),
+    'cluster_forks': dict(type='int'),
 }
 
 rubrik_argument_spec.update(rubrik_manual_spec)
@@ -35,7 +35,9 @@ options:
     type: int
     default: 15
 
-extends_documentation_fragment: rubrikinc.cdm.credentials
+extends_documentation_fragment:
+  - rubrikinc.cdm.credentials
+  - rubrikinc.cdm.credentials.clusters
 requirements: [rubrik_cdm]
 '''
 
@@ -60,7 +62,7 @@ idempotent_response:
     sample: No change required. The MSSQL host `mssql_host` is already assigned to the `organization_name` organization.
 '''
 
-from ansible.module_utils.rubrik_cdm import credentials, load_provider_variables, rubrik_argument_spec
+from ansible.module_utils.rubrik_cdm import connect, load_provider_variables, rubrik_argument_spec
 from ansible.module_utils.basic import AnsibleModule
 
 try:
@@ -97,10 +99,8 @@ def main():
     if not HAS_RUBRIK_SDK:
         module.fail_json(msg='The Rubrik Python SDK is required for this module (pip install rubrik_cdm).')
 
-    node_ip, username, password, api_token = credentials(module)
-
     try:
-        rubrik = rubrik_cdm.Connect(node_ip, username, password, api_token)
+        rubrik = connect(module)
     except Exception as error:
         module.fail_json(msg=str(error))
 
@@ -65,7 +65,9 @@ options:
     default: 30
     type: int
 
-extends_documentation_fragment: rubrikinc.cdm.credentials
+extends_documentation_fragment:
+  - rubrikinc.cdm.credentials
+  - rubrikinc.cdm.credentials.clusters
 
 requirements: [rubrik_cdm]
 '''
@@ -84,7 +86,7 @@ EXAMPLES = '''
     copy_only: false
 '''
 
-from ansible.module_utils.rubrik_cdm import credentials, load_provider_variables, rubrik_argument_spec
+from ansible.module_utils.rubrik_cdm import connect, load_provider_variables, rubrik_argument_spec
 from ansible.module_utils.basic import AnsibleModule
 
 RETURN = '''
@@ -163,10 +165,8 @@ def main():
         if windows_host is None:
             module.fail_json(msg="When the object_type is 'volume_group', 'windows_host' must also be populated.")
 
-    node_ip, username, password, api_token = credentials(module)
-
     try:
-        rubrik = rubrik_cdm.Connect(node_ip, username, password, api_token)
+        rubrik = connect(module)
     except Exception as error:
         module.fail_json(msg=str(error))
 
@@ -147,6 +147,9 @@ def main():
     )
 
     argument_spec.update(rubrik_argument_spec)
+    # The cluster is bootstrapped through one of its nodes before it can be managed as a cluster
+    del argument_spec["clusters"]
+    del argument_spec["cluster_forks"]
 
     module = AnsibleModule(argument_spec=argument_spec, supports_check_mode=False)
 
@@ -159,6 +162,9 @@ def main():
 
     node_ip, username, password, api_token = credentials(module)
 
+    if isinstance(node_ip, list) or "," in str(node_ip):
+        module.fail_json(msg="The Rubrik cluster is bootstrapped through a single node, so only one node_ip can be provided.")
+
     try:
         rubrik = rubrik_cdm.Bootstrap(node_ip)
     except Exception as error:
@@ -31,8 +31,13 @@ options:
     type: int
     default: 15
 
-extends_documentation_fragment: rubrikinc.cdm.credentials
+extends_documentation_fragment:
+  - rubrikinc.cdm.credentials
+  - rubrikinc.cdm.credentials.clusters
 requirements: [rubrik_cdm]
+notes:
+    - Supports check mode and diff mode. A request is only sent to the Rubrik cluster when its current configuration differs,
+      and only with the settings that changed.
 '''
 
 EXAMPLES = '''
@@ -54,7 +59,7 @@ idempotent_response:
     sample: No change required. The NTP server(s) I(ntp_server) has already been added to the Rubrik cluster.
 '''
 
-from ansible.module_utils.rubrik_cdm import credentials, load_provider_variables, rubrik_argument_spec
+from ansible.module_utils.rubrik_cdm import DesiredState, connect, load_provider_variables, rubrik_argument_spec
 from ansible.module_utils.basic import AnsibleModule
 
 try:
@@ -78,7 +83,7 @@ def main():
 
     argument_spec.update(rubrik_argument_spec)
 
-    module = AnsibleModule(argument_spec=argument_spec, supports_check_mode=False)
+    module = AnsibleModule(argument_spec=argument_spec, supports_check_mode=True)
 
     ansible = module.params
 
@@ -87,25 +92,30 @@ def main():
     if not HAS_RUBRIK_SDK:
         module.fail_json(msg='The Rubrik Python SDK is required for this module (pip install rubrik_cdm).')
 
-    node_ip, username, password, api_token = credentials(module)
-
     try:
-        rubrik = rubrik_cdm.Connect(node_ip, username, password, api_token)
+        rubrik = connect(module)
     except Exception as error:
         module.fail_json(msg=str(error))
 
+    state = DesiredState(rubrik, "internal", "/cluster/me/ntp_server", ansible["timeout"])
+
+    def current_ntp_servers(current):
+        # Since CDM 5.0 each NTP server is an object that can carry a symmetric key
+        return {"ntp_servers": sorted(ntp["server"] if isinstance(ntp, dict) else ntp for ntp in current["data"])}
+
+    def add_ntp_servers(changes, current):
+        config = ansible["ntp_servers"]
+        if rubrik.capabilities(ansible["timeout"]).supports("ntp_server_objects"):
+            config = [{"server": ntp} for ntp in ansible["ntp_servers"]]
+        return rubrik.post("internal", "/cluster/me/ntp_server", config, ansible["timeout"])
+
     try:
-        api_request = rubrik.configure_ntp(ansible["ntp_servers"], ansible["timeout"])
+        results.update(state.apply(
+            module, {"ntp_servers": sorted(ansible["ntp_servers"])}, current_ntp_servers, add_ntp_servers,
+            "No change required. The NTP server(s) {} has already been added to the Rubrik cluster.".format(ansible["ntp_servers"])))
     except Exception as error:
         module.fail_json(msg=str(error))
 
-    if "No change required" in api_request:
-        results["changed"] = False
-    else:
-        results["changed"] = True
-
-    results["response"] = api_request
-
     module.exit_json(**results)
 
 
@@ -64,8 +64,13 @@ options:
     type: int
     default: 15
 
-extends_documentation_fragment: rubrikinc.cdm.credentials
+extends_documentation_fragment:
+  - rubrikinc.cdm.credentials
+  - rubrikinc.cdm.credentials.clusters
 requirements: [rubrik_cdm]
+notes:
+    - Supports check mode and diff mode. A request is only sent to the Rubrik cluster when its current configuration differs,
+      and only with the settings that changed.
 '''
 
 EXAMPLES = '''
@@ -87,7 +92,7 @@ idempotent_response:
     sample: No change required. The Rubrik cluster is already configured with I(timezone) as it's timezone.
 '''
 
-from ansible.module_utils.rubrik_cdm import credentials, load_provider_variables, rubrik_argument_spec
+from ansible.module_utils.rubrik_cdm import DesiredState, connect, load_provider_variables, rubrik_argument_spec
 from ansible.module_utils.basic import AnsibleModule
 
 try:
@@ -116,7 +121,7 @@ def main():
 
     argument_spec.update(rubrik_argument_spec)
 
-    module = AnsibleModule(argument_spec=argument_spec, supports_check_mode=False)
+    module = AnsibleModule(argument_spec=argument_spec, supports_check_mode=True)
 
     ansible = module.params
 
@@ -133,26 +138,39 @@ def main():
     if not HAS_RUBRIK_SDK:
         module.fail_json(msg='The Rubrik Python SDK is required for this module (pip install rubrik_cdm).')
 
-    node_ip, username, password, api_token = credentials(module)
-
     try:
-        rubrik = rubrik_cdm.Connect(node_ip, username, password, api_token)
+        rubrik = connect(module)
     except Exception as error:
         module.fail_json(msg=str(error))
 
+    state = DesiredState(rubrik, "internal", "/smtp_instance", timeout)
+
+    # The password is never returned by the Rubrik cluster so it is only sent when the SMTP settings are created
+    config = {
+        "smtpHostname": hostname,
+        "smtpPort": int(port),
+        "smtpSecurity": encryption,
+        "smtpUsername": smtp_username,
+        "fromEmailId": from_email,
+    }
+
+    def current_smtp_settings(current):
+        if current["total"] == 0:
+            return {}
+        return dict((key, current["data"][0].get(key)) for key in config)
+
+    def configure_smtp_settings(changes, current):
+        if current["total"] == 0:
+            return rubrik.post("internal", "/smtp_instance", dict(config, smtpPassword=smtp_password), timeout)
+        return rubrik.patch("internal", "/smtp_instance/{}".format(current["data"][0]["id"]), changes, timeout)
+
     try:
-        api_request = rubrik.configure_smtp_settings(
-            hostname, port, from_email, smtp_username, smtp_password, encryption, timeout)
+        results.update(state.apply(
+            module, config, current_smtp_settings, configure_smtp_settings,
+            "No change required. The Rubrik cluster is already configured with the provided SMTP settings."))
     except Exception as error:
         module.fail_json(msg=str(error))
 
-    if "No change required" in api_request:
-        results["changed"] = False
-    else:
-        results["changed"] = True
-
-    results["response"] = api_request
-
     module.exit_json(**results)
 
 
@@ -64,8 +64,13 @@ options:
     type: int
     default: 15
 
-extends_documentation_fragment: rubrikinc.cdm.credentials
+extends_documentation_fragment:
+  - rubrikinc.cdm.credentials
+  - rubrikinc.cdm.credentials.clusters
 requirements: [rubrik_cdm]
+notes:
+    - Supports check mode and diff mode. A request is only sent to the Rubrik cluster when its current configuration differs,
+      and only with the settings that changed.
 '''
 
 EXAMPLES = '''
@@ -87,7 +92,7 @@ idempotent_response:
     sample: No change required. The Rubrik cluster is already configured with I(timezone) as it's timezone.
 '''
 
-from ansible.module_utils.rubrik_cdm import credentials, load_provider_variables, rubrik_argument_spec
+from ansible.module_utils.rubrik_cdm import DesiredState, connect, load_provider_variables, rubrik_argument_spec
 from ansible.module_utils.basic import AnsibleModule
 
 try:
@@ -143,7 +148,7 @@ def main():
 
     argument_spec.update(rubrik_argument_spec)
 
-    module = AnsibleModule(argument_spec=argument_spec, supports_check_mode=False)
+    module = AnsibleModule(argument_spec=argument_spec, supports_check_mode=True)
 
     ansible = module.params
 
@@ -152,25 +157,24 @@ def main():
     if not HAS_RUBRIK_SDK:
         module.fail_json(msg='The Rubrik Python SDK is required for this module (pip install rubrik_cdm).')
 
-    node_ip, username, password, api_token = credentials(module)
-
     try:
-        rubrik = rubrik_cdm.Connect(node_ip, username, password, api_token)
+        rubrik = connect(module)
     except Exception as error:
         module.fail_json(msg=str(error))
 
+    state = DesiredState(rubrik, "v1", "/cluster/me", ansible["timeout"])
+
+    def current_timezone(current):
+        return {"timezone": {"timezone": (current.get("timezone") or {}).get("timezone")}}
+
     try:
-        api_request = rubrik.configure_timezone(ansible["timezone"], ansible["timeout"])
+        results.update(state.apply(
+            module, {"timezone": {"timezone": ansible["timezone"]}}, current_timezone,
+            lambda changes, current: rubrik.patch("v1", "/cluster/me", changes, ansible["timeout"]),
+            "No change required. The Rubrik cluster is already configured with '{}' as its timezone.".format(ansible["timezone"])))
     except Exception as error:
         module.fail_json(msg=str(error))
 
-    if "No change required" in api_request:
-        results["changed"] = False
-    else:
-        results["changed"] = True
-
-    results["response"] = api_request
-
     module.exit_json(**results)
 
 
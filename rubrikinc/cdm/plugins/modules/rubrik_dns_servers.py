@@ -31,8 +31,13 @@ options:
     type: int
     default: 15
 
-extends_documentation_fragment: rubrikinc.cdm.credentials
+extends_documentation_fragment:
+  - rubrikinc.cdm.credentials
+  - rubrikinc.cdm.credentials.clusters
 requirements: [rubrik_cdm]
+notes:
+    - Supports check mode and diff mode. A request is only sent to the Rubrik cluster when its current configuration differs,
+      and only with the settings that changed.
 '''
 
 EXAMPLES = '''
@@ -55,7 +60,7 @@ idempotent_response:
     sample: No change required. The Rubrik cluster is already configured with the provided DNS servers.
 '''
 
-from ansible.module_utils.rubrik_cdm import credentials, load_provider_variables, rubrik_argument_spec
+from ansible.module_utils.rubrik_cdm import DesiredState, connect, load_provider_variables, rubrik_argument_spec
 from ansible.module_utils.basic import AnsibleModule
 
 try:
@@ -79,7 +84,7 @@ def main():
 
     argument_spec.update(rubrik_argument_spec)
 
-    module = AnsibleModule(argument_spec=argument_spec, supports_check_mode=False)
+    module = AnsibleModule(argument_spec=argument_spec, supports_check_mode=True)
 
     ansible = module.params
 
@@ -88,25 +93,23 @@ def main():
     if not HAS_RUBRIK_SDK:
         module.fail_json(msg='The Rubrik Python SDK is required for this module (pip install rubrik_cdm).')
 
-    node_ip, username, password, api_token = credentials(module)
-
     try:
-        rubrik = rubrik_cdm.Connect(node_ip, username, password, api_token)
+        rubrik = connect(module)
     except Exception as error:
         module.fail_json(msg=str(error))
 
+    state = DesiredState(rubrik, "internal", "/cluster/me/dns_nameserver", ansible["timeout"])
+
+    def add_dns_servers(changes, current):
+        return rubrik.post("internal", "/cluster/me/dns_nameserver", ansible["server_ip"], ansible["timeout"])
+
     try:
-        api_request = rubrik.configure_dns_servers(ansible["server_ip"], ansible["timeout"])
+        results.update(state.apply(
+            module, {"server_ip": sorted(ansible["server_ip"])}, lambda current: {"server_ip": sorted(current)}, add_dns_servers,
+            "No change required. The Rubrik cluster is already configured with the provided DNS servers."))
     except Exception as error:
         module.fail_json(msg=str(error))
 
-    if "No change required" in api_request:
-        results["changed"] = False
-    else:
-        results["changed"] = True
-
-    results["response"] = api_request
-
     module.exit_json(**results)
 
 
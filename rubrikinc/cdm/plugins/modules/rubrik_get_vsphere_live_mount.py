@@ -50,7 +50,7 @@ version:
     type: dict
 '''
 
-from ansible.module_utils.rubrik_cdm import credentials, load_provider_variables, rubrik_argument_spec
+from ansible.module_utils.rubrik_cdm import collect_items, connect, load_provider_variables, paginate, rubrik_argument_spec
 from ansible.module_utils.basic import AnsibleModule
 
 try:
@@ -83,20 +83,19 @@ def main():
     if not HAS_RUBRIK_SDK:
         module.fail_json(msg='The Rubrik Python SDK is required for this module (pip install rubrik_cdm).')
 
-    node_ip, username, password, api_token = credentials(module)
-
     try:
-        rubrik = rubrik_cdm.Connect(node_ip, username, password, api_token)
+        rubrik = connect(module)
     except Exception as error:
         module.fail_json(msg=str(error))
 
     try:
-        api_request = rubrik.get_vsphere_live_mount(
-            ansible["vm_name"],
-            ansible["timeout"])
+        vm_id = rubrik.object_id(ansible["vm_name"], "vmware", timeout=ansible["timeout"])
+        live_mounts, total = collect_items(module, paginate(rubrik, "v1", "/vmware/vm/snapshot/mount", {"vm_id": vm_id}, timeout=ansible["timeout"]))
     except Exception as error:
         module.fail_json(msg=str(error))
 
+    api_request = {"data": live_mounts, "hasMore": False, "total": total}
+
     results["response"] = api_request
 
     module.exit_json(**results)
@@ -48,8 +48,9 @@ options:
     type: int
     default: 15
 
-extends_documentation_fragment: rubrikinc.cdm.credentials
-requirements: [rubrik_cdm]
+extends_documentation_fragment:
+  - rubrikinc.cdm.credentials
+  - rubrikinc.cdm.credentials.clusters
 '''
 
 EXAMPLES = '''
@@ -68,15 +69,9 @@ response:
     sample: {"acceptedEulaVersion": "1.1", "name": "DEVOPS-1"}
 '''
 
-from ansible.module_utils.rubrik_cdm import credentials, load_provider_variables, rubrik_argument_spec
+from ansible.module_utils.rubrik_cdm import connect, load_provider_variables, rubrik_argument_spec
 from ansible.module_utils.basic import AnsibleModule
 
-try:
-    import rubrik_cdm
-    HAS_RUBRIK_SDK = True
-except ImportError:
-    HAS_RUBRIK_SDK = False
-
 
 def main():
     """ Main entry point for Ansible module execution.
@@ -100,13 +95,8 @@ def main():
 
     load_provider_variables(module)
 
-    if not HAS_RUBRIK_SDK:
-        module.fail_json(msg='The Rubrik Python SDK is required for this module (pip install rubrik_cdm).')
-
-    node_ip, username, password, api_token = credentials(module)
-
     try:
-        rubrik = rubrik_cdm.Connect(node_ip, username, password, api_token, enable_logging=True)
+        rubrik = connect(module, sdk=False)
     except Exception as error:
         module.fail_json(msg=str(error))
 
@@ -80,7 +80,7 @@ full_response:
     type: dict
 '''
 
-from ansible.module_utils.rubrik_cdm import credentials, load_provider_variables, rubrik_argument_spec
+from ansible.module_utils.rubrik_cdm import connect, load_provider_variables, rubrik_argument_spec
 from ansible.module_utils.basic import AnsibleModule
 
 try:
@@ -118,22 +118,20 @@ def main():
     if not HAS_RUBRIK_SDK:
         module.fail_json(msg='The Rubrik Python SDK is required for this module (pip install rubrik_cdm).')
 
-    node_ip, username, password, api_token = credentials(module)
-
     try:
-        rubrik = rubrik_cdm.Connect(node_ip, username, password, api_token)
+        rubrik = connect(module)
     except Exception as error:
         module.fail_json(msg=str(error))
 
     try:
         api_request = rubrik.sql_live_mount(
             ansible["db_name"],
-            ansible["date"],
-            ansible["time"],
             ansible["sql_instance"],
             ansible["sql_host"],
             ansible["mount_name"],
-            ansible["timeout"])
+            date=ansible["date"],
+            time=ansible["time"],
+            timeout=ansible["timeout"])
     except Exception as error:
         module.fail_json(msg=str(error))
 
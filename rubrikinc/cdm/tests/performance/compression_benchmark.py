@@ -0,0 +1,102 @@
+"""Measure the bytes sent over the wire, and the time taken, by large requests to the mock Rubrik cluster with and without
+gzip compression.
+
+Each case is sent --runs times over one keep-alive connection, first with compression turned off and then with the
+responses gzip encoded and the request bodies over --threshold bytes compressed. The transfer time over a constrained
+WAN link is estimated from the bytes on the wire and --bandwidth-mbps.
+
+    python tests/performance/compression_benchmark.py [--objects 5000] [--runs 5] [--threshold 1024] [--bandwidth-mbps 10]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_cdm import Inventory, start_server  # noqa: E402
+
+MODULE_UTILS = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'plugins', 'module_utils', 'rubrik_cdm.py'))
+
+
+def load_module_utils():
+    spec = importlib.util.spec_from_file_location('rubrik_cdm_utils', MODULE_UTILS)
+    module_utils = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module_utils)
+    return module_utils
+
+
+def cases(inventory):
+    """Return the name, method, path and body of the requests that are measured."""
+
+    vms = inventory.collections['/vmware/vm']
+    sla_id = inventory.collections['/sla_domain'][0]['id']
+    assign = {'managedIds': [vm['id'] for vm in vms], 'existingSnapshotRetention': 'RetainSnapshots'}
+
+    return [
+        ('list every VM', 'GET', '/api/v1/vmware/vm?limit={}'.format(len(vms)), None),
+        ('list every host', 'GET', '/api/v1/host', None),
+        ('list VM snapshots', 'GET', '/api/v1/vmware/vm/{}/snapshot'.format(vms[0]['id']), None),
+        ('assign SLA to every VM', 'POST', '/api/internal/sla_domain/{}/assign'.format(sla_id), json.dumps(assign)),
+    ]
+
+
+def measure(module_utils, node_ip, method, path, body, runs, compression, threshold):
+    """Send the request runs times and return the wire bytes of one request and the median time it took."""
+
+    transport = module_utils.HttpTransport(node_ip, compression=compression, compress_threshold=threshold)
+    client = module_utils.RubrikClient(transport, api_token='benchmark-token')
+
+    timings = []
+    for _ in range(runs):
+        start = time.time()
+        status_code, _ = client.request(method, path, body)
+        timings.append(time.time() - start)
+        if status_code >= 400:
+            raise RuntimeError('{} {} returned {}'.format(method, path, status_code))
+    client.close()
+
+    return (transport.sent_bytes + transport.received_bytes) // runs, statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--objects', type=int, default=5000, help='The number of virtual machines in the mock inventory.')
+    parser.add_argument('--runs', type=int, default=5, help='The number of times each request is sent.')
+    parser.add_argument('--threshold', type=int, default=1024, help='The size from which request bodies are compressed.')
+    parser.add_argument('--bandwidth-mbps', type=float, default=10, help='The bandwidth of the WAN link to estimate the transfer time for.')
+    args = parser.parse_args()
+
+    module_utils = load_module_utils()
+    inventory = Inventory(args.objects)
+    bytes_per_ms = args.bandwidth_mbps * 1000 / 8
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        server = start_server(work_dir, inventory)
+        node_ip = '127.0.0.1:{}'.format(server.server_address[1])
+
+        print('{:<24} {:>12} {:>12} {:>8} {:>10} {:>10} {:>12} {:>12}'.format(
+            'request', 'plain bytes', 'gzip bytes', 'saved', 'plain ms', 'gzip ms', 'plain WAN ms', 'gzip WAN ms'))
+        for name, method, path, body in cases(inventory):
+            plain_bytes, plain_ms = measure(module_utils, node_ip, method, path, body, args.runs, False, None)
+            gzip_bytes, gzip_ms = measure(module_utils, node_ip, method, path, body, args.runs, True, args.threshold)
+            print('{:<24} {:>12} {:>12} {:>7.1f}% {:>10.1f} {:>10.1f} {:>12.0f} {:>12.0f}'.format(
+                name, plain_bytes, gzip_bytes, 100.0 * (plain_bytes - gzip_bytes) / plain_bytes, plain_ms, gzip_ms,
+                plain_bytes / bytes_per_ms, gzip_bytes / bytes_per_ms))
+
+        server.shutdown()
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Compare the time taken to read many objects from the mock Rubrik cluster one after another with RubrikClient against
+sending the requests at the same time with AsyncRubrikClient.
+
+Each VM of the first --requests VMs of the mock inventory is read with GET /v1/vmware/vm/{id}, first in sequence and then
+with a concurrency window of each --window, with the mock cluster taking --latency-ms to answer every request.
+
+    python tests/performance/fanout_benchmark.py [--requests 500] [--window 8] [--window 32] [--latency-ms 20]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_cdm import Inventory, start_server  # noqa: E402
+
+MODULE_UTILS = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'plugins', 'module_utils', 'rubrik_cdm.py'))
+
+
+def load_module_utils():
+    spec = importlib.util.spec_from_file_location('rubrik_cdm_utils', MODULE_UTILS)
+    module_utils = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module_utils)
+    return module_utils
+
+
+def measure(module_utils, node_ip, calls, window):
+    """Send the calls, in sequence when window is None, and return the time taken and the connections opened."""
+
+    metrics = module_utils.ApiMetrics()
+    transport = module_utils.HttpTransport(node_ip, metrics=metrics)
+    client = module_utils.RubrikClient(transport, api_token='benchmark-token', metrics=metrics)
+
+    start = time.time()
+    if window is None:
+        for method, args in calls:
+            getattr(client, method)(*args)
+    else:
+        module_utils.AsyncRubrikClient(client, window).gather(calls)
+    elapsed = time.time() - start
+    client.close()
+
+    return elapsed, metrics.connections['opened']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500, help='The number of objects read.')
+    parser.add_argument('--window', type=int, action='append', help='The number of requests in flight. Can be repeated.')
+    parser.add_argument('--latency-ms', type=float, default=20, help='The mean time taken by the mock cluster to answer.')
+    args = parser.parse_args()
+
+    module_utils = load_module_utils()
+    inventory = Inventory(args.requests)
+    calls = [('get', ('v1', '/vmware/vm/{}'.format(vm['id']))) for vm in inventory.collections['/vmware/vm'][:args.requests]]
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        server = start_server(work_dir, inventory, args.latency_ms / 1000)
+        node_ip = '127.0.0.1:{}'.format(server.server_address[1])
+
+        print('{:<22} {:>10} {:>12} {:>12}'.format('client', 'total s', 'requests/s', 'connections'))
+        sequential = None
+        for window in [None] + (args.window or [8, 32]):
+            elapsed, connections = measure(module_utils, node_ip, calls, window)
+            sequential = sequential or elapsed
+            name = 'sequential' if window is None else 'window {} ({:.1f}x)'.format(window, sequential / elapsed)
+            print('{:<22} {:>10.2f} {:>12.1f} {:>12}'.format(name, elapsed, len(calls) / elapsed, connections))
+
+        server.shutdown()
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
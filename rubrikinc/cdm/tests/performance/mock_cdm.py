@@ -0,0 +1,425 @@
+"""A local stand-in for the Rubrik CDM REST API, used to benchmark the modules without a Rubrik cluster.
+
+The server holds a synthetic inventory of SLA Domains, vSphere VMs, hosts, filesets, live mounts, SQL Server objects and
+more, scaled by the number of virtual machines. Every list endpoint supports the name filters and limit/offset paging of
+the real API, and every action answers with an asynchronous request whose job status is immediately SUCCEEDED. Writes
+are answered the way the real API does but are not applied, so that every run of a task sends the same requests.
+Latency and errors can be injected to reproduce a busy cluster. Responses of at least 1 KiB are gzip encoded when the
+client accepts it, and gzip encoded request bodies are decompressed.
+
+    python tests/performance/mock_cdm.py [--port 8443] [--objects 1000] [--latency-ms 20] [--error-rate 0.01]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import copy
+import gzip
+import json
+import os
+import random
+import re
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl, urlparse
+
+# The smallest response body that is gzip encoded
+COMPRESS_MIN_BYTES = 1024
+
+CLUSTER_ID = '8b4fe6f6-cc87-4354-a125-b65e23cf8c90'
+VERSION = '5.0.1-1280'
+
+# The query parameters of the list endpoints that filter on a field of the objects
+FILTERS = {
+    'name': 'name',
+    'hostname': 'hostname',
+    'operating_system_type': 'operatingSystemType',
+    'share_type': 'shareType',
+    'vm_id': 'vmId',
+    'host_id': 'hostId',
+    'template_id': 'templateId',
+    'instance_id': 'instanceId',
+    'object_type': 'objectType',
+    'mounted_database_name': 'mountedDatabaseName',
+    'username': 'username',
+}
+
+# The collections whose objects are created by an asynchronous request
+ASYNC_COLLECTIONS = ('/vmware/vcenter', )
+
+# The request whose status is always available, for the benchmark of the job status module
+SEEDED_REQUEST = 'CREATE_VMWARE_SNAPSHOT_mock-vm-00000:::0'
+
+
+def _id(prefix, index):
+    return '{}:::{}'.format(prefix, uuid.UUID(int=index + 1))
+
+
+class Inventory(object):
+    """The objects held by the mock Rubrik cluster, keyed by the path of the endpoint that lists them."""
+
+    def __init__(self, objects=1000, seed=0):
+        rng = random.Random(seed)
+        self.requests = {}
+        self.collections = {}
+
+        sla_count = max(3, objects // 100)
+        host_count = max(2, objects // 10)
+
+        slas = [self._sla(index, name) for index, name in enumerate(['Gold', 'Silver', 'Bronze'])]
+        slas += [self._sla(index, 'SLA-{:04d}'.format(index)) for index in range(3, sla_count)]
+        self.collections['/sla_domain'] = slas
+
+        self.collections['/vmware/vcenter'] = [{
+            'id': _id('vCenter', 0), 'name': 'vcenter.example.com', 'hostname': 'vcenter.example.com',
+            'primaryClusterId': CLUSTER_ID, 'configuredSlaDomainId': 'UNPROTECTED',
+        }]
+        self.collections['/vmware/host'] = [{
+            'id': _id('VmwareHost', index), 'name': 'esxi-{:03d}.example.com'.format(index), 'primaryClusterId': CLUSTER_ID,
+            'datastores': [{'id': _id('DataStore', index), 'name': 'datastore-{:03d}'.format(index)}],
+        } for index in range(max(2, objects // 50))]
+
+        vms = []
+        for index in range(objects):
+            sla = rng.choice(slas)
+            vms.append({
+                'id': _id('VirtualMachine', index), 'name': 'vm-{:05d}'.format(index), 'moid': 'vm-{}'.format(index),
+                'primaryClusterId': CLUSTER_ID, 'isRelic': False, 'powerStatus': 'poweredOn',
+                'hostId': rng.choice(self.collections['/vmware/host'])['id'],
+                'configuredSlaDomainId': sla['id'], 'configuredSlaDomainName': sla['name'],
+                'effectiveSlaDomainId': sla['id'], 'effectiveSlaDomainName': sla['name'],
+                'ipAddress': '10.{}.{}.{}'.format(index // 65536 % 256, index // 256 % 256, index % 256),
+                'snapshotCount': 3, 'guestOsType': 'Linux', 'vmwareToolsInstalled': True,
+            })
+        self.collections['/vmware/vm'] = vms
+
+        self.collections['/host'] = [{
+            'id': _id('Host', index), 'name': 'host-{:04d}.example.com'.format(index),
+            'hostname': 'host-{:04d}.example.com'.format(index), 'primaryClusterId': CLUSTER_ID,
+            'operatingSystemType': 'Windows' if index % 2 else 'Linux', 'status': 'Connected',
+        } for index in range(host_count)]
+        self.collections['/fileset_template'] = [{
+            'id': _id('FilesetTemplate', index), 'name': 'template-{}'.format(os_type.lower()),
+            'operatingSystemType': os_type, 'shareType': None, 'includes': ['/'], 'excludes': [], 'exceptions': [],
+            'allowBackupNetworkMounts': False, 'allowBackupHiddenFoldersInNetworkMounts': False,
+            'primaryClusterId': CLUSTER_ID,
+        } for index, os_type in enumerate(['Linux', 'Windows'])]
+        self.collections['/fileset'] = [{
+            'id': _id('Fileset', index), 'name': 'template-linux', 'hostId': host['id'], 'hostName': host['hostname'],
+            'templateId': self.collections['/fileset_template'][0]['id'], 'configuredSlaDomainId': slas[0]['id'],
+            'isRelic': False, 'primaryClusterId': CLUSTER_ID,
+        } for index, host in enumerate(self.collections['/host'])]
+        self.collections['/host/share'] = [{
+            'id': _id('HostShare', index), 'hostId': host['id'], 'hostname': host['hostname'], 'shareType': 'NFS',
+            'exportPoint': '/export/share-{}'.format(index),
+        } for index, host in enumerate(self.collections['/host'][:10])]
+        self.collections['/managed_volume'] = [{
+            'id': _id('ManagedVolume', index), 'name': 'mv-{:03d}'.format(index), 'isWritable': False, 'isRelic': False,
+            'primaryClusterId': CLUSTER_ID, 'configuredSlaDomainId': slas[0]['id'],
+        } for index in range(max(1, objects // 100))]
+        self.collections['/nutanix/vm'] = []
+        self.collections['/volume_group'] = []
+        self.collections['/aws/account'] = []
+        self.collections['/oracle/db'] = []
+        self.collections['/archive/location'] = [{
+            'id': _id('ArchivalLocation', 0), 'name': 'archive', 'locationType': 'S3', 'bucket': 'archive',
+        }]
+        self.collections['/organization'] = [{
+            'id': _id('Organization', 0), 'name': 'Engineering', 'isGlobal': False, 'roleId': _id('Role', 0),
+        }]
+        self.collections['/user'] = [{'id': _id('User', 0), 'username': 'admin', 'authDomainId': 'local'}]
+        self.collections['/organization/{}/mssql'.format(_id('Organization', 0))] = []
+        self.collections['/vmware/vm/snapshot/mount'] = [{
+            'id': _id('Mount', index), 'vmId': vm['id'], 'mountedVmId': _id('VirtualMachine', objects + index),
+            'snapshotDate': '2019-05-14T18:00:00.000Z', 'isReady': True, 'powerStatus': 'poweredOn',
+        } for index, vm in enumerate(vms[:max(1, objects // 100)])]
+        self.collections['/vmware/vm'] += [{
+            'id': mount['mountedVmId'], 'name': '{} 05-14 18:00 0'.format(vms[index]['name']), 'isRelic': False,
+            'primaryClusterId': CLUSTER_ID, 'configuredSlaDomainId': 'UNPROTECTED', 'effectiveSlaDomainId': 'UNPROTECTED',
+            'effectiveSlaDomainName': 'Unprotected', 'hostId': vms[index]['hostId'],
+        } for index, mount in enumerate(self.collections['/vmware/vm/snapshot/mount'])]
+
+        instance = {
+            'id': _id('MssqlInstance', 0), 'name': 'MSSQLSERVER', 'rootId': self.collections['/host'][0]['id'],
+            'rootName': self.collections['/host'][0]['hostname'], 'primaryClusterId': CLUSTER_ID,
+        }
+        self.collections['/mssql/instance'] = [instance]
+        self.collections['/mssql/db'] = [{
+            'id': _id('MssqlDatabase', index), 'name': 'db-{:03d}'.format(index), 'instanceId': instance['id'],
+            'instanceName': instance['name'], 'rootProperties': {'rootName': instance['rootName']},
+            'isRelic': False, 'isLiveMount': False, 'primaryClusterId': CLUSTER_ID, 'configuredSlaDomainId': slas[0]['id'],
+            'recoveryModel': 'FULL', 'copyOnly': False, 'logBackupFrequencyInSeconds': 3600, 'logRetentionHours': 168,
+        } for index in range(max(1, objects // 100))]
+        databases = self.collections['/mssql/db']
+        self.collections['/mssql/db/mount'] = [{
+            'id': _id('MssqlMount', index), 'sourceDatabaseId': database['id'], 'mountedDatabaseId': _id('MssqlDatabase', 100000 + index),
+            'mountedDatabaseName': '{}-mount'.format(database['name']), 'isReady': True,
+        } for index, database in enumerate(databases)]
+        self.collections['/mssql/db'] += [dict(
+            database, id=mount['mountedDatabaseId'], name=mount['mountedDatabaseName'], isLiveMount=True,
+            configuredSlaDomainId='UNPROTECTED') for database, mount in zip(databases, self.collections['/mssql/db/mount'])]
+        self.collections['/mssql/hierarchy/root/children'] = [{
+            'id': _id('MssqlAvailabilityGroup', 0), 'name': 'ag-001', 'objectType': 'MssqlAvailabilityGroup',
+        }]
+
+        self.job('/vmware/vm/snapshot', SEEDED_REQUEST)
+
+        # Endpoints that describe an object of a collection rather than list one
+        self.routes = [
+            (r'^/role/([^/]+)/authorization$', self._authorization),
+            (r'^/[a-z_/]+/([^/]+)/snapshot$', self._snapshots),
+            (r'^/mssql/db/([^/]+)/recoverable_range$', self._recoverable_range),
+        ]
+
+        self.singletons = {
+            '/cluster/me': {'id': CLUSTER_ID, 'name': 'mock-cdm', 'version': VERSION, 'timezone': {'timezone': 'America/Chicago'},
+                            'geolocation': {'address': 'Palo Alto, CA'}, 'apiVersion': '1'},
+            '/cluster/me/version': {'version': VERSION},
+            '/cluster/me/ntp_server': {'data': [{'server': 'pool.ntp.org', 'symmetricKey': None}], 'total': 1, 'hasMore': False},
+            '/cluster/me/dns_nameserver': ['8.8.8.8'],
+            '/cluster/me/dns_search_domain': ['example.com'],
+            '/cluster/me/login_banner': {'loginBanner': ''},
+            '/smtp_instance': {'data': [], 'total': 0, 'hasMore': False},
+            '/authorization/role/end_user': {'data': [{'principal': _id('User', 0), 'privileges': {'restore': []}}], 'total': 1,
+                                             'hasMore': False},
+            '/cluster/me/node': {'data': [{'id': 'RVM000000000001', 'ipAddress': '127.0.0.1', 'status': 'OK'}], 'total': 1,
+                                 'hasMore': False},
+        }
+
+    @staticmethod
+    def _sla(index, name):
+        return {
+            'id': str(uuid.UUID(int=index + 1)), 'name': name, 'primaryClusterId': CLUSTER_ID,
+            'frequencies': [{'timeUnit': 'Daily', 'frequency': 1, 'retention': 30}],
+            'allowedBackupWindows': [], 'firstFullAllowedBackupWindows': [], 'archivalSpecs': [], 'replicationSpecs': [],
+            'localRetentionLimit': 2592000, 'showAdvancedUi': False, 'advancedUiConfig': [],
+        }
+
+    def collection(self, path):
+        """Return the collection listed at the path and the ID of the object when the path points at a single object."""
+
+        if path in self.collections:
+            return self.collections[path], None
+
+        parent, _, object_id = path.rpartition('/')
+        if parent in self.collections:
+            return self.collections[parent], object_id
+
+        return None, None
+
+    @staticmethod
+    def _authorization(method, role_id, body):
+        authorization = {'roleId': role_id, 'authorizationSpecifications': []}
+        if method == 'POST' and isinstance(body, dict):
+            authorization.update(body)
+        return 200, authorization
+
+    def _snapshots(self, method, object_id, body):
+        if method != 'GET':
+            return self.job('/snapshot')
+        snapshots = [{
+            'id': '{}-snapshot-{}'.format(object_id, index), 'date': '2019-05-1{}T18:00:00.000Z'.format(4 - index),
+            'isOnDemandSnapshot': False,
+        } for index in range(3)]
+        return 200, {'data': snapshots, 'total': len(snapshots), 'hasMore': False}
+
+    @staticmethod
+    def _recoverable_range(method, object_id, body):
+        return 200, {'data': [{'beginTime': '2019-05-01T00:00:00.000Z', 'endTime': '2019-05-31T23:59:00.000Z'}], 'total': 1,
+                     'hasMore': False}
+
+    def job(self, path, request_id=None):
+        """Start an asynchronous request and return the response of the action that started it."""
+
+        request_id = request_id or '{}_{}:::0'.format(path.strip('/').replace('/', '_').upper(), uuid.uuid4())
+        self.requests[request_id] = {
+            'id': request_id, 'status': 'SUCCEEDED', 'progress': 100,
+            'startTime': '2019-05-14T18:00:00.000Z', 'endTime': '2019-05-14T18:00:05.000Z', 'nodeId': 'cluster:::RVM000000000001',
+        }
+        return 202, {
+            'id': request_id, 'status': 'QUEUED',
+            'links': [{'href': 'https://127.0.0.1/api/v1/request/{}'.format(request_id), 'rel': 'self'}],
+        }
+
+    def list(self, objects, query):
+        for parameter, field in FILTERS.items():
+            if parameter in query:
+                value = query[parameter].lower()
+                objects = [item for item in objects if value in str(item.get(field) or '').lower()]
+
+        offset = int(query.get('offset', 0))
+        limit = int(query.get('limit', len(objects) or 1))
+        page = objects[offset:offset + limit]
+
+        return 200, {'data': page, 'total': len(objects), 'hasMore': offset + len(page) < len(objects)}
+
+    def handle(self, method, path, query, body):
+        """Return the status code and body of the response to a request."""
+
+        if path == '/api/v1/session' and method == 'POST':
+            return 200, {'id': str(uuid.uuid4()), 'userId': str(uuid.uuid4()), 'token': str(uuid.uuid4())}
+
+        parts = path.split('/', 3)
+        if len(parts) < 4 or parts[1] != 'api':
+            return 404, {'message': 'Not Found'}
+        path = '/' + parts[3]
+
+        if method == 'GET' and '/request/' in path:
+            request = self.requests.get(path.rpartition('/')[2])
+            return (200, request) if request else (404, {'message': 'The request was not found.'})
+
+        for pattern, route in self.routes:
+            match = re.match(pattern, path)
+            if match:
+                return route(method, match.group(1), body)
+
+        if path == '/user':
+            return 200, self.list(self.collections['/user'], query)[1]['data']
+
+        if path in self.singletons:
+            if method == 'GET':
+                return 200, self.singletons[path]
+            if isinstance(self.singletons[path], dict) and isinstance(body, dict):
+                return 200, dict(self.singletons[path], **body)
+            return 200, body
+
+        objects, object_id = self.collection(path)
+
+        if objects is None:
+            if method == 'GET':
+                return 200, {'data': [], 'total': 0, 'hasMore': False}
+            return self.job(path)
+
+        if object_id is None:
+            if method == 'GET':
+                return self.list(objects, query)
+            if method == 'POST' and path not in ASYNC_COLLECTIONS:
+                return 201, dict(body if isinstance(body, dict) else {}, id=_id('Object', len(objects) + 1000000))
+            return self.job(path)
+
+        matches = [item for item in objects if item['id'] == object_id]
+        if not matches:
+            if method in ('POST', 'PUT'):
+                return self.job(path)
+            return 404, {'message': 'The object {} was not found.'.format(object_id)}
+
+        if method == 'GET':
+            return 200, dict(matches[0], snapshots=self._snapshots(method, object_id, None)[1]['data'])
+        if method == 'DELETE':
+            return 204, None
+        if method == 'PATCH':
+            return 200, dict(matches[0], **(body if isinstance(body, dict) else {}))
+        return self.job(path)
+
+
+class MockCdmHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+
+        server = self.server
+        if server.latency:
+            time.sleep(max(random.gauss(server.latency, server.latency / 4), 0))
+
+        url = urlparse(self.path)
+        if server.error_rate and random.random() < server.error_rate:
+            status_code, response = 503, {'message': 'The service is temporarily unavailable.'}
+        else:
+            try:
+                data = json.loads(body) if body else None
+            except ValueError:
+                data = None
+            status_code, response = server.inventory.handle(self.command, url.path, dict(parse_qsl(url.query)), copy.deepcopy(data))
+
+        payload = b'' if response is None else json.dumps(response).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        if len(payload) >= COMPRESS_MIN_BYTES and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            payload = gzip.compress(payload, 6)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockCdmServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    # Room for the connections a fanned out module opens at once
+    request_queue_size = 128
+
+    def __init__(self, address, inventory, latency=0, error_rate=0):
+        HTTPServer.__init__(self, address, MockCdmHandler)
+        self.inventory = inventory
+        self.latency = latency
+        self.error_rate = error_rate
+
+
+def start_server(work_dir, inventory=None, latency=0, error_rate=0, port=0):
+    """Start the mock Rubrik cluster over HTTPS with a self-signed certificate in a background thread and return it.
+    Arguments:
+        work_dir {str} -- The directory the certificate is written to.
+    Keyword Arguments:
+        inventory {Inventory} -- The objects held by the mock Rubrik cluster. (default: {1000 virtual machines})
+        latency {float} -- The mean number of seconds taken to answer a request. (default: {0})
+        error_rate {float} -- The fraction of the requests answered with 503 Service Unavailable. (default: {0})
+        port {int} -- The port to listen on, picked by the operating system when 0. (default: {0})
+    """
+
+    cert = os.path.join(work_dir, 'cert.pem')
+    key = os.path.join(work_dir, 'key.pem')
+    subprocess.check_call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+                           '-keyout', key, '-out', cert], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+
+    server = MockCdmServer(('127.0.0.1', port), inventory or Inventory(), latency, error_rate)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8443, help='The port to listen on.')
+    parser.add_argument('--objects', type=int, default=1000, help='The number of virtual machines in the inventory.')
+    parser.add_argument('--latency-ms', type=float, default=0, help='The mean time taken to answer a request.')
+    parser.add_argument('--error-rate', type=float, default=0, help='The fraction of requests answered with 503.')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        server = start_server(work_dir, Inventory(args.objects), args.latency_ms / 1000, args.error_rate, args.port)
+        print('Mock Rubrik cluster listening on 127.0.0.1:{}'.format(server.server_address[1]))
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
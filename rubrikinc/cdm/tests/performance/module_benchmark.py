@@ -0,0 +1,226 @@
+"""Run every module in plugins/modules against the mock Rubrik cluster and report how long a task takes, how many requests
+it sends and how many bytes it transfers.
+
+Each task runs in a new Python process, as it does under Ansible, with collect_metrics set so that the requests it sends
+are reported by the module itself. The session token and the other controller side caches are shared by all of the
+tasks, as they are in a play. Use --json to save the results and --baseline to fail when a module got slower or sends
+more requests than in a saved run.
+
+    python tests/performance/module_benchmark.py [--objects 1000] [--runs 5] [--forks 1] [--latency-ms 0] [--error-rate 0]
+                                                [--module rubrik_get] [--json results.json] [--baseline results.json]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_cdm import SEEDED_REQUEST, Inventory, start_server  # noqa: E402
+
+COLLECTION = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+MODULE_UTILS = os.path.join(COLLECTION, 'plugins', 'module_utils', 'rubrik_cdm.py')
+
+# Run a module file the way Ansible does, with the collection module_utils standing in for ansible.module_utils.rubrik_cdm
+RUNNER = '''
+import importlib.util
+import json
+import runpy
+import sys
+import ansible.module_utils
+from ansible.module_utils import basic
+spec = importlib.util.spec_from_file_location("ansible.module_utils.rubrik_cdm", sys.argv[2])
+module_utils = importlib.util.module_from_spec(spec)
+sys.modules["ansible.module_utils.rubrik_cdm"] = module_utils
+spec.loader.exec_module(module_utils)
+basic._ANSIBLE_ARGS = json.dumps({"ANSIBLE_MODULE_ARGS": json.loads(sys.argv[3])}).encode("utf-8")
+runpy.run_path(sys.argv[1], run_name="__main__")
+'''
+
+# The arguments each module is run with, on top of the connection settings. The objects exist in the mock inventory.
+# rubrik_bootstrap has no scenario since it talks to the unconfigured nodes on the default HTTPS port.
+SCENARIOS = {
+    'rubrik_add_organization_protectable_object_mssql_server_host': {
+        'organization_name': 'Engineering', 'mssql_host': 'host-0000.example.com'},
+    'rubrik_add_organization_protectable_object_sql_server_availability_group': {
+        'organization_name': 'Engineering', 'mssql_availability_group': 'ag-001'},
+    'rubrik_add_organization_protectable_object_sql_server_db': {
+        'organization_name': 'Engineering', 'mssql_db': 'db-000', 'mssql_host': 'host-0000.example.com',
+        'mssql_instance': 'MSSQLSERVER'},
+    'rubrik_add_vcenter': {
+        'vcenter_ip': 'vcenter-2.example.com', 'vcenter_username': 'administrator@vsphere.local', 'vcenter_password': 'secret'},
+    'rubrik_assign_physical_host_fileset': {
+        'hostname': 'host-0000.example.com', 'fileset_name': 'template-linux', 'operating_system': 'Linux', 'sla_name': 'Gold'},
+    'rubrik_assign_sla': {'object_name': 'vm-00001', 'sla_name': 'Gold'},
+    'rubrik_aws_s3_cloudout': {
+        'aws_bucket_name': 'rubrik-archive', 'aws_region': 'us-east-1', 'aws_access_key': 'AKIAEXAMPLE',
+        'aws_secret_key': 'secret', 'kms_master_key_id': 'kms-key'},
+    'rubrik_cluster_version': {},
+    'rubrik_configure_cluster_location': {'location': 'San Francisco, CA'},
+    'rubrik_configure_ntp': {'ntp_servers': ['0.pool.ntp.org', '1.pool.ntp.org']},
+    'rubrik_configure_smtp_settings': {
+        'hostname': 'smtp.example.com', 'port': 25, 'from_email': 'rubrik@example.com', 'smtp_username': 'rubrik',
+        'smtp_password': 'secret'},
+    'rubrik_configure_timezone': {'timezone': 'America/Los_Angeles'},
+    'rubrik_create_sla': {'name': 'Platinum', 'daily_frequency': 1, 'daily_retention': 30},
+    'rubrik_dns_servers': {'server_ip': ['192.168.100.5', '192.168.100.6']},
+    'rubrik_end_user_authorization': {'object_name': 'vm-00001', 'end_user': 'admin'},
+    'rubrik_get': {'api_version': 'v1', 'api_endpoint': '/vmware/vm', 'params': {'limit': 100}},
+    'rubrik_get_sql_live_mount': {'db_name': 'db-000', 'sql_instance': 'MSSQLSERVER', 'sql_host': 'host-0000.example.com'},
+    'rubrik_get_vsphere_live_mount': {'vm_name': 'vm-00000'},
+    'rubrik_get_vsphere_live_mount_names': {'vm_name': 'vm-00000'},
+    'rubrik_job_status': {'url': 'https://127.0.0.1/api/v1/vmware/vm/request/' + SEEDED_REQUEST, 'wait_for_completion': False},
+    'rubrik_login_banner': {'banner_text': 'Authorized use only.'},
+    'rubrik_managed_volume': {'managed_volume_name': 'mv-000', 'action': 'begin'},
+    'rubrik_nas_fileset': {'fileset_name': 'nas-fileset', 'share_type': 'NFS', 'include': ['/']},
+    'rubrik_on_demand_snapshot': {'object_name': 'vm-00001'},
+    'rubrik_physical_fileset': {'fileset_name': 'linux-fileset', 'operating_system': 'Linux', 'include': ['/etc']},
+    'rubrik_physical_host': {'hostname': 'host-9999.example.com', 'action': 'add'},
+    'rubrik_post': {'api_version': 'v1', 'api_endpoint': '/vmware/vm/snapshot/mount', 'config': {'vmId': 'VirtualMachine:::1'}},
+    'rubrik_refresh_vcenter': {'vcenter_ip': 'vcenter.example.com', 'wait_for_completion': False},
+    'rubrik_sql_live_mount': {
+        'db_name': 'db-000', 'date': '05-14-2019', 'time': '6:00 PM', 'sql_instance': 'MSSQLSERVER',
+        'sql_host': 'host-0000.example.com', 'mount_name': 'db-000-mount'},
+    'rubrik_sql_live_unmount': {
+        'mounted_db_name': 'db-000-mount', 'sql_instance': 'MSSQLSERVER', 'sql_host': 'host-0000.example.com'},
+    'rubrik_vsphere_instant_recovery': {'vm_name': 'vm-00002'},
+    'rubrik_vsphere_live_mount': {'vm_name': 'vm-00002'},
+    'rubrik_vsphere_live_unmount': {'mounted_vm_name': 'vm-00000 05-14 18:00 0'},
+}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(round(fraction * (len(values) - 1))), len(values) - 1)]
+
+
+def run_task(module_path, args):
+    """Run a module in a new Python process and return its wall clock time and result."""
+
+    start = time.time()
+    process = subprocess.run([sys.executable, '-W', 'ignore', '-c', RUNNER, module_path, MODULE_UTILS, json.dumps(args)],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    elapsed = time.time() - start
+
+    try:
+        result = json.loads(process.stdout.decode('utf-8').strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        result = {'failed': True, 'msg': process.stderr.decode('utf-8').strip().splitlines()[-1:]}
+
+    return elapsed, result
+
+
+def benchmark(module_path, args, runs, forks):
+    """Run a module runs times, forks at a time, and summarize the timing and metrics of the tasks."""
+
+    with ThreadPoolExecutor(max_workers=forks) as executor:
+        start = time.time()
+        tasks = list(executor.map(lambda _: run_task(module_path, args), range(runs)))
+        wall = time.time() - start
+
+    latencies = [elapsed * 1000 for elapsed, _ in tasks]
+    totals = [result.get('rubrik_metrics', {}).get('totals', {}) for _, result in tasks]
+    failures = [result for _, result in tasks if result.get('failed')]
+
+    return {
+        'runs': runs,
+        'failed': len(failures),
+        'error': str(failures[0].get('msg'))[:200] if failures else None,
+        'p50_ms': round(percentile(latencies, 0.5), 1),
+        'p95_ms': round(percentile(latencies, 0.95), 1),
+        'tasks_per_second': round(runs / wall, 2),
+        'requests_per_task': round(sum(total.get('requests', 0) for total in totals) / runs, 2),
+        'retries_per_task': round(sum(total.get('retries', 0) for total in totals) / runs, 2),
+        'bytes_per_task': int(sum(total.get('request_bytes', 0) + total.get('response_bytes', 0) for total in totals) / runs),
+    }
+
+
+def regressions(results, baseline, threshold):
+    """Return the modules that got slower or send more requests than in the baseline run."""
+
+    found = []
+    for name, result in sorted(results.items()):
+        previous = baseline.get(name)
+        if not previous or result['failed'] or previous['failed']:
+            continue
+        if result['p50_ms'] > previous['p50_ms'] * (1 + threshold):
+            found.append('{}: p50 {} ms, was {} ms'.format(name, result['p50_ms'], previous['p50_ms']))
+        if result['requests_per_task'] > previous['requests_per_task']:
+            found.append('{}: {} requests per task, was {}'.format(name, result['requests_per_task'], previous['requests_per_task']))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--objects', type=int, default=1000, help='The number of virtual machines in the mock inventory.')
+    parser.add_argument('--runs', type=int, default=5, help='The number of tasks run for each module.')
+    parser.add_argument('--forks', type=int, default=1, help='The number of tasks of a module run at the same time.')
+    parser.add_argument('--latency-ms', type=float, default=0, help='The mean time taken by the mock cluster to answer.')
+    parser.add_argument('--error-rate', type=float, default=0, help='The fraction of requests answered with 503.')
+    parser.add_argument('--module', action='append', help='Only benchmark this module. Can be repeated.')
+    parser.add_argument('--json', help='Write the results to this file.')
+    parser.add_argument('--baseline', help='Fail when a module is slower or sends more requests than in these results.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='The tolerated p50 slowdown against the baseline.')
+    args = parser.parse_args()
+
+    modules = sorted(glob.glob(os.path.join(COLLECTION, 'plugins', 'modules', 'rubrik_*.py')))
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        server = start_server(work_dir, Inventory(args.objects), args.latency_ms / 1000, args.error_rate)
+        connection = {
+            'node_ip': '127.0.0.1:{}'.format(server.server_address[1]),
+            'username': 'admin',
+            'password': 'secret',
+            'cache_dir': os.path.join(work_dir, 'cache'),
+            'collect_metrics': True,
+        }
+
+        results = {}
+        print('{:<72} {:>6} {:>9} {:>9} {:>8} {:>8} {:>10}'.format(
+            'module', 'failed', 'p50 ms', 'p95 ms', 'tasks/s', 'req/task', 'bytes/task'))
+        for module_path in modules:
+            name = os.path.splitext(os.path.basename(module_path))[0]
+            if args.module and name not in args.module:
+                continue
+            if name not in SCENARIOS:
+                print('{:<72} no scenario'.format(name))
+                continue
+
+            module_args = dict(SCENARIOS[name], provider=connection)
+            result = results[name] = benchmark(module_path, module_args, args.runs, args.forks)
+            print('{:<72} {:>6} {:>9.1f} {:>9.1f} {:>8.2f} {:>8.2f} {:>10}'.format(
+                name, result['failed'], result['p50_ms'], result['p95_ms'], result['tasks_per_second'],
+                result['requests_per_task'], result['bytes_per_task']))
+            if result['error']:
+                print('    {}'.format(result['error']))
+
+        server.shutdown()
+    finally:
+        shutil.rmtree(work_dir)
+
+    if args.json:
+        with open(args.json, 'w') as results_file:
+            json.dump(results, results_file, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            found = regressions(results, json.load(baseline_file), args.threshold)
+        for regression in found:
+            print('REGRESSION {}'.format(regression))
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
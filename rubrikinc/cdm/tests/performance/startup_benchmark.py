@@ -0,0 +1,102 @@
+"""Compare the time a module spends importing its dependencies and sending its first request to the Rubrik cluster when
+it uses the Rubrik SDK against the built-in RubrikClient.
+
+Each sample is measured in a new Python process so that the import cost is included, along with the import of
+ansible.module_utils.basic that every module pays for either way. By default the requests are sent to
+the local mock Rubrik cluster of mock_cdm.py, which answers every request immediately, which isolates the client side
+overhead. Set the
+rubrik_cdm_node_ip and rubrik_cdm_token environment variables to benchmark against a real Rubrik cluster instead.
+
+    python tests/performance/startup_benchmark.py [--runs 10] [--requests 20]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_cdm import start_server  # noqa: E402
+
+MODULE_UTILS = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'plugins', 'module_utils', 'rubrik_cdm.py'))
+
+SDK = '''
+import time
+start = time.time()
+import ansible.module_utils.basic
+import rubrik_cdm
+rubrik = rubrik_cdm.Connect(NODE_IP, api_token=API_TOKEN)
+rubrik.cluster_version()
+first = time.time()
+for _ in range(REQUESTS):
+    rubrik.cluster_version()
+print(first - start, (time.time() - first) / max(REQUESTS, 1))
+'''
+
+CLIENT = '''
+import time
+start = time.time()
+import ansible.module_utils.basic
+import importlib.util
+spec = importlib.util.spec_from_file_location("rubrik_cdm_utils", MODULE_UTILS)
+module_utils = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module_utils)
+rubrik = module_utils.RubrikClient(module_utils.HttpTransport(NODE_IP), api_token=API_TOKEN)
+rubrik.cluster_version()
+first = time.time()
+for _ in range(REQUESTS):
+    rubrik.cluster_version()
+print(first - start, (time.time() - first) / max(REQUESTS, 1))
+'''
+
+
+def sample(script, node_ip, api_token, requests):
+    """Run the script in a new Python process and return the startup time and the mean time of the following requests."""
+
+    source = script.replace('NODE_IP', repr(node_ip)).replace('API_TOKEN', repr(api_token))
+    source = source.replace('MODULE_UTILS', repr(MODULE_UTILS)).replace('REQUESTS', str(requests))
+
+    output = subprocess.check_output([sys.executable, '-W', 'ignore', '-c', source])
+
+    startup, request = output.split()
+
+    return float(startup), float(request)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='The number of processes started for each client.')
+    parser.add_argument('--requests', type=int, default=20, help='The number of requests sent after the first one.')
+    args = parser.parse_args()
+
+    node_ip = os.environ.get('rubrik_cdm_node_ip')
+    api_token = os.environ.get('rubrik_cdm_token', 'benchmark-token')
+
+    work_dir = tempfile.mkdtemp()
+    server = None
+    try:
+        if node_ip is None:
+            server = start_server(work_dir)
+            node_ip = '127.0.0.1:{}'.format(server.server_address[1])
+
+        print('{:<14} {:>22} {:>22}'.format('client', 'import + first (ms)', 'next request (ms)'))
+        for name, script in (('rubrik_cdm SDK', SDK), ('RubrikClient', CLIENT)):
+            samples = [sample(script, node_ip, api_token, args.requests) for _ in range(args.runs)]
+            print('{:<14} {:>22.1f} {:>22.2f}'.format(
+                name,
+                statistics.median(startup for startup, _ in samples) * 1000,
+                statistics.median(request for _, request in samples) * 1000))
+    finally:
+        if server is not None:
+            server.shutdown()
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
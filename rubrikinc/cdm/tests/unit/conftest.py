@@ -0,0 +1,11 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def rubrik_cdm_cache_dir(tmp_path, monkeypatch):
+    """give every test its own controller side cache so cached session tokens and object IDs never leak between tests"""
+    monkeypatch.setenv('rubrik_cdm_cache_dir', str(tmp_path))
+    return tmp_path
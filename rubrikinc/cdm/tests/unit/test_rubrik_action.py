@@ -0,0 +1,69 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import sys
+import unittest
+from unittest.mock import Mock, patch
+import ansible_collections.rubrikinc.cdm.plugins.module_utils.rubrik_cdm as module_utils
+from ansible_collections.rubrikinc.cdm.plugins.action.rubrik import ActionModule
+
+
+class TestRubrikAction(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(setattr, module_utils, 'SHARED_TRANSPORTS', None)
+        self.addCleanup(sys.modules.pop, 'ansible.module_utils.rubrik_cdm', None)
+
+    def build_action(self, args=None, transport='local', become=False, async_val=0):
+        task = Mock(action='rubrikinc.cdm.rubrik_cluster_version', args=args or {}, async_val=async_val, check_mode=False,
+                    diff=False, no_log=False, environment=[])
+        connection = Mock(transport=transport, socket_path=None, become=None)
+        connection._shell.tmpdir = None
+        play_context = Mock(become=become, check_mode=False, executable='/bin/sh')
+        templar = Mock()
+        templar.template.side_effect = lambda value: value
+
+        action = ActionModule(task, connection, play_context, Mock(), templar, Mock())
+        action.get_shell_option = Mock(return_value='~/.ansible/tmp')
+        action._compute_environment_string = Mock(
+            side_effect=lambda environment: environment.update(rubrik_cdm_cache_dir=os.environ['rubrik_cdm_cache_dir']))
+        return action
+
+    def test_in_process_only_for_local_tasks(self):
+        self.assertTrue(self.build_action()._in_process({}))
+        self.assertTrue(self.build_action()._in_process({'ansible_python_interpreter': sys.executable}))
+
+        self.assertFalse(self.build_action(transport='ssh')._in_process({}))
+        self.assertFalse(self.build_action(become=True)._in_process({}))
+        self.assertFalse(self.build_action(async_val=60)._in_process({}))
+        self.assertFalse(self.build_action({'clusters': [{'node_ip': '1.1.1.1'}]})._in_process({}))
+        self.assertFalse(self.build_action()._in_process({'ansible_python_interpreter': '/usr/libexec/platform-python'}))
+        with patch.dict(os.environ, {'rubrik_cdm_in_process': 'false'}):
+            self.assertFalse(self.build_action()._in_process({}))
+
+    @patch.object(module_utils.http_client, 'HTTPSConnection', autospec=True)
+    def test_module_run_in_process(self, mock_connection):
+        mock_connection.return_value.sock = None
+        mock_connection.return_value.getresponse.return_value.status = 200
+        mock_connection.return_value.getresponse.return_value.getheaders.return_value = []
+        mock_connection.return_value.getresponse.return_value.read.return_value = b'{"version": "5.0.1-1280"}'
+        args = {'provider': {'node_ip': '1.1.1.1', 'api_token': 'token', 'collect_metrics': True, 'capability_cache_ttl': 0}}
+
+        first = self.build_action(args)._run_in_process({})
+        second = self.build_action(args)._run_in_process({})
+
+        self.assertEqual(first['version'], '5.0.1-1280')
+        self.assertEqual(first['rubrik_metrics']['totals']['connections'], {'opened': 1, 'reused': 0, 'resumed': 0})
+        self.assertEqual(second['rubrik_metrics']['totals']['connections'], {'opened': 1, 'reused': 0, 'resumed': 0})
+        # The connections are closed after every module run, only the transport and its TLS session are shared
+        self.assertEqual(mock_connection.call_count, 2)
+        self.assertEqual(mock_connection.return_value.close.call_count, 2)
+        self.assertEqual(len(module_utils.SHARED_TRANSPORTS), 1)
+        self.assertEqual(first['invocation']['module_args']['provider']['api_token'], 'VALUE_SPECIFIED_IN_NO_LOG_PARAMETER')
+
+    def test_module_failure_in_process(self):
+        result = self.build_action({'provider': {'node_ip': [], 'api_token': 'token'}})._run_in_process({})
+
+        self.assertTrue(result['failed'])
+        self.assertIn('at least one node', result['msg'])
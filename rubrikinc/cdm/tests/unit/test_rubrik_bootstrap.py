@@ -341,3 +341,32 @@ class TestRubrikBootstrap(unittest.TestCase):
         self.assertEqual(
             result.exception.args[0]['msg'],
             "argument node_config is of type <class 'str'> and we were unable to convert to dict: dictionary requested, could not parse JSON or key=value")
+
+    def test_module_fail_with_several_nodes(self):
+        args = {
+            'cluster_name': 'cluster_name',
+            'admin_email': 'admin@noreply.com',
+            'admin_password': 'adminpassword',
+            'node_ip': ['10.255.1.10', '10.255.1.11'],
+            'node_config': {'1': '10.255.1.10'},
+            'management_gateway': '10.255.1.1',
+            'management_subnet_mask': '255.255.255.0',
+            'api_token': 'vkys219gn2jziReqdPJH0asGM3PKEQHP'
+        }
+        set_module_args(args)
+
+        with self.assertRaises(AnsibleFailJson) as result:
+            rubrik_bootstrap.main()
+
+        self.assertEqual(
+            result.exception.args[0]['msg'],
+            'The Rubrik cluster is bootstrapped through a single node, so only one node_ip can be provided.')
+
+        args['node_ip'] = '10.255.1.10'
+        args['clusters'] = [{'node_ip': '10.255.1.20'}]
+        set_module_args(args)
+
+        with self.assertRaises(AnsibleFailJson) as result:
+            rubrik_bootstrap.main()
+
+        self.assertIn('clusters', result.exception.args[0]['msg'])
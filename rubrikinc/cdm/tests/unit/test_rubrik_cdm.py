@@ -0,0 +1,1637 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import functools
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import zlib
+from unittest.mock import Mock, PropertyMock, patch
+from ansible.module_utils import basic
+from ansible.module_utils._text import to_bytes
+import rubrik_cdm
+import ansible_collections.rubrikinc.cdm.plugins.module_utils.rubrik_cdm as module_utils
+
+
+def set_module_args(args):
+    """prepare arguments so that they will be picked up during module creation"""
+    args = json.dumps({'ANSIBLE_MODULE_ARGS': args})
+    basic._ANSIBLE_ARGS = to_bytes(args)
+
+
+def build_module(args):
+    """create an AnsibleModule that uses the common Rubrik argument spec"""
+    set_module_args(args)
+    module = basic.AnsibleModule(argument_spec=dict(module_utils.rubrik_argument_spec))
+    module_utils.load_provider_variables(module)
+    return module
+
+
+class TestTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    @patch.object(module_utils, 'session_login', autospec=True, spec_set=True)
+    def test_token_minted_once(self, mock_login):
+        mock_login.return_value = 'token-1'
+
+        cache = module_utils.TokenCache(self.cache_dir)
+
+        self.assertEqual(cache.token('1.1.1.1', 'admin', 'secret'), 'token-1')
+        self.assertEqual(module_utils.TokenCache(self.cache_dir).token('1.1.1.1', 'admin', 'secret'), 'token-1')
+        self.assertEqual(mock_login.call_count, 1)
+
+    @patch.object(module_utils, 'session_login', autospec=True, spec_set=True)
+    def test_token_not_reused_with_different_password(self, mock_login):
+        mock_login.side_effect = ['token-1', 'token-2']
+
+        cache = module_utils.TokenCache(self.cache_dir)
+
+        self.assertEqual(cache.token('1.1.1.1', 'admin', 'secret'), 'token-1')
+        self.assertEqual(cache.token('1.1.1.1', 'admin', 'changed'), 'token-2')
+
+    @patch.object(module_utils, 'session_login', autospec=True, spec_set=True)
+    def test_token_expires(self, mock_login):
+        mock_login.side_effect = ['token-1', 'token-2']
+
+        cache = module_utils.TokenCache(self.cache_dir, ttl=60)
+        cache.token('1.1.1.1', 'admin', 'secret')
+
+        with patch.object(module_utils.time, 'time', return_value=time.time() + 61):
+            self.assertEqual(cache.token('1.1.1.1', 'admin', 'secret'), 'token-2')
+
+    @patch.object(module_utils, 'session_login', autospec=True, spec_set=True)
+    def test_invalidate_keeps_newer_token(self, mock_login):
+        mock_login.return_value = 'token-2'
+
+        cache = module_utils.TokenCache(self.cache_dir)
+        cache.put('1.1.1.1', 'admin', 'secret', 'token-2')
+
+        cache.invalidate('1.1.1.1', 'admin', 'token-1')
+        self.assertEqual(cache.get('1.1.1.1', 'admin', 'secret'), 'token-2')
+
+        cache.invalidate('1.1.1.1', 'admin', 'token-2')
+        self.assertIsNone(cache.get('1.1.1.1', 'admin', 'secret'))
+
+
+class TestResolutionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def test_object_id_cached_per_cluster(self):
+        module_utils.ResolutionCache(self.cache_dir, '1.1.1.1').put('sla', 'Gold', 'SLA_1')
+
+        self.assertEqual(module_utils.ResolutionCache(self.cache_dir, '1.1.1.1').get('sla', 'Gold'), 'SLA_1')
+        self.assertIsNone(module_utils.ResolutionCache(self.cache_dir, '2.2.2.2').get('sla', 'Gold'))
+        self.assertIsNone(module_utils.ResolutionCache(self.cache_dir, '1.1.1.1').get('vmware', 'Gold'))
+
+    def test_object_id_qualifiers(self):
+        cache = module_utils.ResolutionCache(self.cache_dir, '1.1.1.1')
+        cache.put('fileset_template', 'Logs', 'FT_LINUX', 'Linux')
+
+        self.assertEqual(cache.get('fileset_template', 'Logs', 'Linux'), 'FT_LINUX')
+        self.assertIsNone(cache.get('fileset_template', 'Logs', 'Windows'))
+
+    def test_object_id_expires(self):
+        cache = module_utils.ResolutionCache(self.cache_dir, '1.1.1.1', ttl=60)
+        cache.put('sla', 'Gold', 'SLA_1')
+
+        with patch.object(module_utils.time, 'time', return_value=time.time() + 61):
+            self.assertIsNone(cache.get('sla', 'Gold'))
+
+    def test_invalidate(self):
+        cache = module_utils.ResolutionCache(self.cache_dir, '1.1.1.1')
+        cache.put('sla', 'Gold', 'SLA_1')
+        cache.put('vmware', 'vm-1', 'VM_1')
+
+        cache.invalidate('sla')
+
+        self.assertIsNone(cache.get('sla', 'Gold'))
+        self.assertEqual(cache.get('vmware', 'vm-1'), 'VM_1')
+
+
+class TestCapabilityCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def test_version_cached_per_cluster(self):
+        cluster_version = Mock(return_value='5.0.1-1280')
+
+        first = module_utils.CapabilityCache(self.cache_dir, '1.1.1.1').capabilities(cluster_version)
+        second = module_utils.CapabilityCache(self.cache_dir, '1.1.1.1').capabilities(cluster_version)
+
+        self.assertEqual((first.version, second.version), ('5.0.1-1280', '5.0.1-1280'))
+        cluster_version.assert_called_once_with(15)
+        self.assertIsNone(module_utils.CapabilityCache(self.cache_dir, '2.2.2.2').get())
+
+    def test_version_expires(self):
+        module_utils.CapabilityCache(self.cache_dir, '1.1.1.1', ttl=60).capabilities(Mock(return_value='5.0.1-1280'))
+
+        with patch.object(module_utils.time, 'time', return_value=time.time() + 61):
+            self.assertIsNone(module_utils.CapabilityCache(self.cache_dir, '1.1.1.1', ttl=60).get())
+
+    def test_disabled_cache_reused_within_run(self):
+        cluster_version = Mock(return_value='5.0.1-1280')
+        cache = module_utils.CapabilityCache(self.cache_dir, '1.1.1.1', ttl=0)
+
+        cache.capabilities(cluster_version)
+        cache.capabilities(cluster_version)
+
+        cluster_version.assert_called_once_with(15)
+        self.assertFalse(os.listdir(self.cache_dir))
+
+    def test_capabilities(self):
+        capabilities = module_utils.ClusterCapabilities('5.10.0-p1-1234')
+
+        self.assertTrue(capabilities.minimum_version(5.0))
+        self.assertTrue(capabilities.minimum_version('5.2'))
+        self.assertFalse(capabilities.minimum_version('6.0'))
+        self.assertTrue(capabilities.supports('ntp_server_objects'))
+        self.assertFalse(module_utils.ClusterCapabilities('4.1.2-100').supports('ntp_server_objects'))
+
+    @patch.object(module_utils.HttpTransport, 'send', autospec=True, spec_set=True)
+    def test_sdk_version_checks_share_one_request(self, mock_send):
+        mock_send.return_value = (200, {}, b'{"version": "5.0.1-1280"}')
+
+        for _ in range(2):
+            rubrik = module_utils.connect(build_module({'node_ip': '1.1.1.1', 'api_token': 'token'}))
+            self.assertTrue(rubrik.minimum_installed_cdm_version(5.0))
+            self.assertFalse(rubrik.minimum_installed_cdm_version('5.1'))
+            self.assertEqual(rubrik.cluster_version(), '5.0.1-1280')
+            self.assertTrue(rubrik.capabilities().supports('ntp_server_objects'))
+
+        self.assertEqual(mock_send.call_count, 1)
+        self.assertEqual(mock_send.call_args[0][2], '/api/v1/cluster/me/version')
+
+
+class TestSessionLogin(unittest.TestCase):
+
+    @patch.object(module_utils.HttpTransport, 'send', autospec=True, spec_set=True)
+    def test_session_login(self, mock_send):
+        mock_send.return_value = (200, {}, b'{"id": "1", "token": "token-1"}')
+
+        self.assertEqual(module_utils.session_login('1.1.1.1', 'admin', 'secret'), 'token-1')
+
+        transport, method, path, body, headers, timeout = mock_send.call_args[0]
+        self.assertEqual((method, path, body), ('POST', '/api/v1/session', '{}'))
+        self.assertEqual(headers['Authorization'], 'Basic YWRtaW46c2VjcmV0')
+
+    @patch.object(module_utils.HttpTransport, 'send', autospec=True, spec_set=True)
+    def test_session_login_rejected(self, mock_send):
+        mock_send.return_value = (401, {}, b'{"message": "Incorrect username/password"}')
+
+        with self.assertRaises(module_utils.RubrikSessionError):
+            module_utils.session_login('1.1.1.1', 'admin', 'wrong')
+
+
+class TestConnect(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def test_connect_with_api_token_skips_cache(self):
+        module = build_module({'node_ip': '1.1.1.1', 'api_token': 'token', 'cache_dir': self.cache_dir})
+
+        rubrik = module_utils.connect(module)
+
+        self.assertEqual(rubrik.api_token, 'token')
+        self.assertIsNone(module_utils.connect(module, sdk=False).token_cache)
+
+    @patch.object(module_utils, 'session_login', autospec=True, spec_set=True)
+    def test_connect_uses_cached_token(self, mock_login):
+        mock_login.return_value = 'token-1'
+
+        module = build_module({'provider': {'node_ip': '1.1.1.1', 'username': 'admin', 'password': 'secret', 'cache_dir': self.cache_dir}})
+
+        self.assertEqual(module_utils.connect(module).api_token, 'token-1')
+        self.assertEqual(module_utils.connect(module).api_token, 'token-1')
+        self.assertEqual(mock_login.call_count, 1)
+
+    @patch.object(module_utils, 'session_login', autospec=True, spec_set=True)
+    def test_connect_with_session_cache_disabled(self, mock_login):
+        module = build_module({'node_ip': '1.1.1.1', 'username': 'admin', 'password': 'secret', 'session_cache': False})
+
+        rubrik = module_utils.connect(module)
+
+        self.assertIsNone(rubrik.api_token)
+        self.assertEqual(rubrik.username, 'admin')
+        mock_login.assert_not_called()
+
+    @patch.object(module_utils, 'session_login', autospec=True, spec_set=True)
+    def test_connect_relogin_when_token_rejected(self, mock_login):
+        tokens_used = []
+
+        def send(method, path, body=None, headers=None, timeout=15):
+            tokens_used.append(headers['Authorization'])
+            if headers['Authorization'] == 'Bearer expired':
+                return 401, {}, b'{"message": "Unauthorized"}'
+            return 200, {}, b'{"version": "5.0.1-1280"}'
+
+        mock_login.side_effect = ['expired', 'token-2']
+
+        module = build_module({'node_ip': '1.1.1.1', 'username': 'admin', 'password': 'secret', 'cache_dir': self.cache_dir})
+
+        with patch.object(module_utils.HttpTransport, 'send', side_effect=send):
+            rubrik = module_utils.connect(module)
+            self.assertEqual(rubrik.get('v1', '/cluster/me'), {'version': '5.0.1-1280'})
+
+        self.assertEqual(tokens_used, ['Bearer expired', 'Bearer token-2'])
+        self.assertEqual(module_utils.TokenCache(self.cache_dir).get('1.1.1.1', 'admin', 'secret'), 'token-2')
+
+    @patch.object(rubrik_cdm.rubrik_cdm.Connect, 'object_id', autospec=True, spec_set=True)
+    def test_connect_reuses_resolved_object_ids(self, mock_object_id):
+        mock_object_id.return_value = 'SLA_1'
+
+        module = build_module({'node_ip': '1.1.1.1', 'api_token': 'token', 'cache_dir': self.cache_dir})
+
+        self.assertEqual(module_utils.connect(module).object_id('Gold', 'sla'), 'SLA_1')
+        self.assertEqual(module_utils.connect(module).object_id('Gold', 'sla'), 'SLA_1')
+        self.assertEqual(mock_object_id.call_count, 1)
+
+    @patch.object(rubrik_cdm.rubrik_cdm.Connect, 'object_id', autospec=True, spec_set=True)
+    def test_connect_resolution_cache_disabled(self, mock_object_id):
+        mock_object_id.return_value = 'SLA_1'
+
+        module = build_module({'node_ip': '1.1.1.1', 'api_token': 'token', 'cache_dir': self.cache_dir, 'resolution_cache_ttl': 0})
+
+        module_utils.connect(module).object_id('Gold', 'sla')
+        module_utils.connect(module).object_id('Gold', 'sla')
+        self.assertEqual(mock_object_id.call_count, 2)
+
+    @patch.object(module_utils.HttpTransport, 'send', autospec=True, spec_set=True)
+    def test_connect_create_invalidates_object_ids(self, mock_send):
+        mock_send.return_value = (201, {}, b'{"id": "SLA_2"}')
+
+        module = build_module({'node_ip': '1.1.1.1', 'api_token': 'token', 'cache_dir': self.cache_dir})
+        module_utils.ResolutionCache(self.cache_dir, '1.1.1.1').put('sla', 'Gold', 'SLA_1')
+
+        module_utils.connect(module).post('v1', '/sla_domain', {'name': 'Gold'})
+
+        self.assertIsNone(module_utils.ResolutionCache(self.cache_dir, '1.1.1.1').get('sla', 'Gold'))
+
+    @patch.object(module_utils.HttpTransport, 'send', autospec=True, spec_set=True)
+    def test_connect_failed_request_invalidates_served_object_ids(self, mock_send):
+        mock_send.return_value = (404, {}, b'{"message": "Not Found"}')
+
+        module = build_module({'node_ip': '1.1.1.1', 'api_token': 'token', 'cache_dir': self.cache_dir})
+        module_utils.ResolutionCache(self.cache_dir, '1.1.1.1').put('sla', 'Gold', 'SLA_1')
+
+        rubrik = module_utils.connect(module)
+        sla_id = rubrik.object_id('Gold', 'sla')
+        with self.assertRaises(rubrik_cdm.exceptions.APICallException):
+            rubrik.get('v1', '/sla_domain/{}'.format(sla_id))
+
+        self.assertIsNone(module_utils.ResolutionCache(self.cache_dir, '1.1.1.1').get('sla', 'Gold'))
+
+
+class TestClusters(unittest.TestCase):
+
+    def build_module(self, clusters):
+        module = build_module({
+            'provider': {'node_ip': '9.9.9.9', 'username': 'admin', 'password': 'secret'},
+            'clusters': clusters,
+            'cluster_forks': 2,
+        })
+        module.exit_json = Mock(side_effect=SystemExit)
+        module.fail_json = Mock(side_effect=SystemExit)
+        return module
+
+    def fan_out(self, module, run):
+        parent = os.getpid()
+        try:
+            module_utils._fan_out_clusters(module)
+            # Only the forked children get here, and must never return to the test runner
+            try:
+                run(module)
+            finally:
+                os._exit(1)
+        except SystemExit:
+            pass
+        self.assertEqual(os.getpid(), parent)
+
+    def test_task_run_against_every_cluster(self):
+        module = self.build_module([
+            {'node_ip': '1.1.1.1'}, {'node_ip': '2.2.2.2', 'name': 'dr', 'username': 'dr-admin'}, {'node_ip': ['3.3.3.3', '3.3.3.4']}])
+
+        def run(module):
+            node_ip, username, password, _ = module_utils.credentials(module)
+            module.exit_json(changed=username == 'dr-admin', node_ip=node_ip, username=username, password=password,
+                             clusters=module.params['clusters'])
+
+        self.fan_out(module, run)
+
+        module.exit_json.assert_called_once_with(changed=True, clusters={
+            '1.1.1.1': {'changed': False, 'node_ip': '1.1.1.1', 'username': 'admin', 'password': 'secret', 'clusters': None},
+            'dr': {'changed': True, 'node_ip': '2.2.2.2', 'username': 'dr-admin', 'password': 'secret', 'clusters': None},
+            '3.3.3.3,3.3.3.4': {'changed': False, 'node_ip': ['3.3.3.3', '3.3.3.4'], 'username': 'admin', 'password': 'secret',
+                                'clusters': None},
+        })
+
+    def test_top_level_and_environment_credentials(self):
+        def run(module):
+            _, username, password, api_token = module_utils.credentials(module)
+            module.exit_json(changed=False, username=username, password=password, api_token=api_token)
+
+        clusters = [{'node_ip': '1.1.1.1'}, {'node_ip': '2.2.2.2', 'api_token': 'dr-token'}]
+        with patch.dict(os.environ, {'rubrik_cdm_username': 'env-admin', 'rubrik_cdm_password': 'env-secret'}):
+            for args, username, password in (({'username': 'admin', 'password': 'secret'}, 'admin', 'secret'),
+                                             ({}, 'env-admin', 'env-secret')):
+                module = build_module(dict(args, clusters=clusters, cluster_forks=2))
+                module.exit_json = Mock(side_effect=SystemExit)
+                module.fail_json = Mock(side_effect=SystemExit)
+
+                self.fan_out(module, run)
+
+                module.fail_json.assert_not_called()
+                module.exit_json.assert_called_once_with(changed=False, clusters={
+                    '1.1.1.1': {'changed': False, 'username': username, 'password': password, 'api_token': None},
+                    '2.2.2.2': {'changed': False, 'username': username, 'password': password, 'api_token': 'dr-token'},
+                })
+
+    def test_failures_reported_per_cluster(self):
+        module = self.build_module([{'node_ip': '1.1.1.1'}, {'node_ip': '2.2.2.2'}, {'node_ip': '3.3.3.3'}])
+
+        def run(module):
+            if module.params['node_ip'] == '2.2.2.2':
+                module.fail_json(msg='Unable to establish a connection to the Rubrik cluster.')
+            if module.params['node_ip'] == '3.3.3.3':
+                # An uncaught exception is handed to sys.excepthook by the interpreter
+                try:
+                    module.params['missing']
+                except KeyError:
+                    sys.excepthook(*sys.exc_info())
+            module.exit_json(changed=True)
+
+        self.fan_out(module, run)
+
+        kwargs = module.fail_json.call_args[1]
+        self.assertEqual(kwargs['msg'], 'The task failed on 2 of the 3 Rubrik clusters: 2.2.2.2, 3.3.3.3.')
+        self.assertTrue(kwargs['changed'])
+        self.assertEqual(kwargs['clusters']['1.1.1.1'], {'changed': True})
+        self.assertEqual(kwargs['clusters']['2.2.2.2'], {'failed': True, 'msg': 'Unable to establish a connection to the Rubrik cluster.'})
+        self.assertEqual(kwargs['clusters']['3.3.3.3']['msg'], "'missing'")
+        self.assertIn('KeyError', kwargs['clusters']['3.3.3.3']['exception'])
+
+    def test_warnings_returned_per_cluster(self):
+        module = self.build_module([{'node_ip': '1.1.1.1'}, {'node_ip': '2.2.2.2'}])
+        module.warn('Raised before the fan out.')
+        module.warn = Mock(wraps=module.warn)
+        module.deprecate = Mock(wraps=module.deprecate)
+
+        def run(module):
+            module.warn('The cluster runs {}.'.format(module.params['node_ip']))
+            if module.params['node_ip'] == '2.2.2.2':
+                module.deprecate('The option is deprecated.', version='2.0.0', collection_name='rubrikinc.cdm')
+            module.exit_json(changed=False)
+
+        self.fan_out(module, run)
+
+        self.assertEqual([call[0][0] for call in module.warn.call_args_list],
+                         ['1.1.1.1: The cluster runs 1.1.1.1.', '2.2.2.2: The cluster runs 2.2.2.2.'])
+        module.deprecate.assert_called_once_with(msg='2.2.2.2: The option is deprecated.', version='2.0.0',
+                                                 collection_name='rubrikinc.cdm')
+        self.assertEqual(module.exit_json.call_args[1]['clusters']['1.1.1.1'], {'changed': False})
+
+    def test_unique_names(self):
+        module = self.build_module([{'node_ip': '1.1.1.1'}, {'node_ip': '1.1.1.1'}])
+
+        self.assertRaises(SystemExit, module_utils._fan_out_clusters, module)
+        self.assertIn('unique name', module.fail_json.call_args[1]['msg'])
+
+
+class TestRubrikClient(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = Mock(node_ip='1.1.1.1')
+
+    def test_basic_authentication(self):
+        self.transport.send.return_value = (200, {}, b'{"version": "5.0.1-1280"}')
+
+        client = module_utils.RubrikClient(self.transport, 'admin', 'secret')
+
+        self.assertEqual(client.cluster_version(), '5.0.1-1280')
+        method, path, body, headers, timeout = self.transport.send.call_args[0]
+        self.assertEqual((method, path, body, timeout), ('GET', '/api/v1/cluster/me/version', None, 15))
+        self.assertEqual(headers['Authorization'], 'Basic YWRtaW46c2VjcmV0')
+
+    def test_error_message(self):
+        self.transport.send.return_value = (404, {}, b'{"errorType": "user_error", "message": "Not Found"}')
+
+        client = module_utils.RubrikClient(self.transport, api_token='token')
+
+        with self.assertRaises(module_utils.ApiCallError) as error:
+            client.delete('v1', '/sla_domain/1')
+
+        self.assertEqual(str(error.exception), 'Not Found')
+        self.assertEqual(error.exception.status_code, 404)
+
+    def test_timeout(self):
+        self.transport.send.side_effect = module_utils.socket.timeout()
+
+        client = module_utils.RubrikClient(self.transport, api_token='token')
+
+        with self.assertRaises(module_utils.ApiCallError) as error:
+            client.get('v1', '/cluster/me')
+
+        self.assertIn('allotted amount of time', str(error.exception))
+
+    @patch.object(module_utils.time, 'sleep', autospec=True, spec_set=True)
+    def test_job_status_waits_for_completion(self, mock_sleep):
+        self.transport.send.side_effect = [(200, {}, b'{"status": "RUNNING"}'), (200, {}, b'{"status": "SUCCEEDED"}')]
+
+        client = module_utils.RubrikClient(self.transport, api_token='token')
+
+        self.assertEqual(client.job_status('https://1.1.1.1/api/v1/vmware/vm/request/JOB_1'), {'status': 'SUCCEEDED'})
+        self.assertEqual(mock_sleep.call_count, 1)
+
+    def test_job_status_failed(self):
+        self.transport.send.return_value = (200, {}, b'{"status": "FAILED"}')
+
+        client = module_utils.RubrikClient(self.transport, api_token='token')
+
+        with self.assertRaises(module_utils.ApiCallError):
+            client.job_status('https://1.1.1.1/api/v1/vmware/vm/request/JOB_1')
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = Mock(node_ip='1.1.1.1')
+        self.mock_sleep = patch.object(module_utils.time, 'sleep', autospec=True, spec_set=True).start()
+        self.addCleanup(patch.stopall)
+
+    def build_client(self, **kwargs):
+        return module_utils.RubrikClient(self.transport, api_token='token', retry_policy=module_utils.RetryPolicy(**kwargs))
+
+    def test_get_retried_when_busy(self):
+        self.transport.send.side_effect = [(503, {}, b''), (200, {}, b'{"version": "5.0.1-1280"}')]
+
+        self.assertEqual(self.build_client().cluster_version(), '5.0.1-1280')
+        self.assertEqual(self.transport.send.call_count, 2)
+        self.assertEqual(self.mock_sleep.call_count, 1)
+
+    def test_get_retried_after_connection_error(self):
+        self.transport.send.side_effect = [module_utils.socket.error(), (200, {}, b'{"version": "5.0.1-1280"}')]
+
+        self.assertEqual(self.build_client().cluster_version(), '5.0.1-1280')
+
+    def test_post_not_retried_after_server_error(self):
+        self.transport.send.return_value = (503, {}, b'{"message": "Service Unavailable"}')
+
+        with self.assertRaises(module_utils.ApiCallError):
+            self.build_client().post('v1', '/sla_domain', {'name': 'Gold'})
+
+        self.assertEqual(self.transport.send.call_count, 1)
+
+    def test_post_retried_when_throttled(self):
+        self.transport.send.side_effect = [(429, {'retry-after': '2'}, b''), (201, {}, b'{"id": "SLA_1"}')]
+
+        self.assertEqual(self.build_client().post('v1', '/sla_domain', {'name': 'Gold'}), {'id': 'SLA_1'})
+        self.mock_sleep.assert_called_once_with(2.0)
+
+    def test_retries_exhausted(self):
+        self.transport.send.return_value = (503, {}, b'{"message": "Service Unavailable"}')
+
+        with self.assertRaises(module_utils.ApiCallError):
+            self.build_client(retries=2).get('v1', '/cluster/me')
+
+        self.assertEqual(self.transport.send.call_count, 3)
+
+    def test_backoff_capped(self):
+        policy = module_utils.RetryPolicy(backoff_max=5)
+
+        self.assertTrue(0.5 <= policy.delay(0) <= 1)
+        self.assertTrue(all(2.5 <= policy.delay(attempt) <= 5 for attempt in range(3, 10)))
+        self.assertEqual(policy.delay(0, '120'), 5)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.transport = Mock(node_ip='1.1.1.1')
+
+    def build_client(self):
+        breaker = module_utils.CircuitBreaker(self.cache_dir, '1.1.1.1', threshold=2)
+        return module_utils.RubrikClient(self.transport, api_token='token', circuit_breaker=breaker)
+
+    def test_breaker_opens(self):
+        self.transport.send.side_effect = module_utils.socket.error()
+
+        for _ in range(2):
+            with self.assertRaises(module_utils.ApiCallError):
+                self.build_client().get('v1', '/cluster/me')
+
+        with self.assertRaises(module_utils.ApiCallError) as error:
+            self.build_client().get('v1', '/cluster/me')
+
+        self.assertIn('failed 2 consecutive requests', str(error.exception))
+        self.assertEqual(self.transport.send.call_count, 2)
+
+    def test_breaker_closes_after_cooldown(self):
+        self.transport.send.side_effect = module_utils.socket.error()
+        for _ in range(2):
+            with self.assertRaises(module_utils.ApiCallError):
+                self.build_client().get('v1', '/cluster/me')
+
+        self.transport.send.side_effect = None
+        self.transport.send.return_value = (200, {}, b'{"version": "5.0.1-1280"}')
+        with patch.object(module_utils.time, 'time', return_value=time.time() + 61):
+            self.assertEqual(self.build_client().cluster_version(), '5.0.1-1280')
+
+        self.assertEqual(self.build_client().cluster_version(), '5.0.1-1280')
+
+    def test_client_errors_do_not_open_breaker(self):
+        self.transport.send.return_value = (404, {}, b'{"message": "Not Found"}')
+
+        for _ in range(3):
+            with self.assertRaises(module_utils.ApiCallError):
+                self.build_client().get('v1', '/sla_domain/SLA_1')
+
+        self.assertEqual(self.transport.send.call_count, 3)
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def build_client(self, username='admin'):
+        transport = Mock(node_ip='1.1.1.1')
+        transport.send.return_value = (200, {}, b'{"data": [], "total": 0}')
+        single_flight = module_utils.SingleFlight(self.cache_dir, '1.1.1.1', 5)
+        return module_utils.RubrikClient(transport, username, 'secret', single_flight=single_flight)
+
+    def test_concurrent_identical_gets_coalesced(self):
+        first, second = self.build_client(), self.build_client()
+        sent, release = threading.Event(), threading.Event()
+
+        def send(*args):
+            sent.set()
+            release.wait(5)
+            return 200, {}, b'{"data": [{"id": "SLA_1"}], "total": 1}'
+
+        first.transport.send.side_effect = send
+        results = {}
+        threads = [threading.Thread(target=lambda: results.setdefault('first', first.get('v1', '/sla_domain')))]
+        threads[0].start()
+        sent.wait(5)
+        threads.append(threading.Thread(target=lambda: results.setdefault('second', second.get('v1', '/sla_domain'))))
+        threads[1].start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(results['first'], {'data': [{'id': 'SLA_1'}], 'total': 1})
+        self.assertEqual(results['second'], results['first'])
+        second.transport.send.assert_not_called()
+
+    def test_responses_not_shared(self):
+        self.build_client().get('v1', '/sla_domain')
+
+        other_user = self.build_client('auditor')
+        other_user.get('v1', '/sla_domain')
+        self.assertEqual(other_user.transport.send.call_count, 1)
+
+        other_path = self.build_client()
+        other_path.get('v1', '/sla_domain', params={'name': 'Gold'})
+        self.assertEqual(other_path.transport.send.call_count, 1)
+
+        with patch.object(module_utils.time, 'time', return_value=time.time() + 6):
+            expired = self.build_client()
+            expired.get('v1', '/sla_domain')
+        self.assertEqual(expired.transport.send.call_count, 1)
+
+    def test_module_reads_own_changes(self):
+        self.build_client().get('v1', '/sla_domain')
+
+        rubrik = self.build_client()
+        rubrik.get('v1', '/sla_domain')
+        rubrik.transport.send.assert_not_called()
+
+        rubrik.post('internal', '/sla_domain', {'name': 'Gold'})
+        rubrik.get('v1', '/sla_domain')
+        self.assertEqual(rubrik.transport.send.call_count, 2)
+
+    def test_errors_not_shared(self):
+        failed = self.build_client()
+        failed.transport.send.return_value = (503, {}, b'')
+        with self.assertRaises(module_utils.ApiCallError):
+            failed.get('v1', '/sla_domain')
+
+        rubrik = self.build_client()
+        rubrik.get('v1', '/sla_domain')
+        self.assertEqual(rubrik.transport.send.call_count, 1)
+
+    @patch.object(module_utils.time, 'sleep', autospec=True, spec_set=True)
+    def test_job_status_polls_not_shared(self, mock_sleep):
+        rubrik = self.build_client()
+        rubrik.transport.send.side_effect = [(200, {}, b'{"status": "RUNNING"}'), (200, {}, b'{"status": "SUCCEEDED"}')]
+
+        self.assertEqual(rubrik.job_status('https://1.1.1.1/api/v1/vmware/vm/request/JOB_1'), {'status': 'SUCCEEDED'})
+        self.assertEqual(rubrik.transport.send.call_count, 2)
+        self.assertFalse(os.listdir(self.cache_dir))
+
+    def test_expired_responses_removed(self):
+        self.build_client().get('v1', '/sla_domain')
+        self.build_client('auditor').get('v1', '/sla_domain')
+        self.assertEqual(len(os.listdir(self.cache_dir)), 4)
+
+        with patch.object(module_utils.time, 'time', return_value=time.time() + 6):
+            rubrik = self.build_client()
+            rubrik.get('v1', '/host')
+
+        self.assertEqual(rubrik.transport.send.call_count, 1)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    @patch.object(module_utils.time, 'time', autospec=True, spec_set=True)
+    def test_bucket_shared_across_limiters(self, mock_time):
+        mock_time.return_value = 1000.0
+
+        delays = [module_utils.RateLimiter(self.cache_dir, '1.1.1.1', 2, burst=2).reserve() for _ in range(4)]
+        self.assertEqual(delays, [0, 0, 0.5, 1.0])
+
+        # Only the reserved tokens are paid back after the wait
+        mock_time.return_value = 1002.0
+        self.assertEqual(module_utils.RateLimiter(self.cache_dir, '1.1.1.1', 2, burst=2).reserve(), 0)
+        self.assertEqual(module_utils.RateLimiter(self.cache_dir, '2.2.2.2', 2, burst=2).reserve(), 0)
+
+    def test_default_burst(self):
+        self.assertEqual(module_utils.RateLimiter(self.cache_dir, '1.1.1.1', 2.5).burst, 3)
+        self.assertEqual(module_utils.RateLimiter(self.cache_dir, '1.1.1.1', 0.2).burst, 1)
+
+    @patch.object(module_utils.time, 'sleep', autospec=True, spec_set=True)
+    def test_requests_wait_for_token(self, mock_sleep):
+        module = build_module({'node_ip': '1.1.1.1', 'api_token': 'token', 'rate_limit_rps': 4, 'rate_limit_burst': 1})
+        rubrik = module_utils.connect(module, sdk=False)
+        rubrik.transport = Mock(node_ip='1.1.1.1')
+        rubrik.transport.send.return_value = (200, {}, b'{"version": "5.0.1-1280"}')
+
+        rubrik.get('v1', '/cluster/me/version')
+        mock_sleep.assert_not_called()
+
+        rubrik.get('v1', '/cluster/me/version')
+        self.assertAlmostEqual(mock_sleep.call_args[0][0], 0.25, places=2)
+
+
+class TestConcurrencyLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def limiter(self, slots=2, wait=0):
+        return module_utils.ConcurrencyLimiter(self.cache_dir, '1.1.1.1', slots, wait=wait)
+
+    def test_slots_shared_across_limiters(self):
+        with self.limiter(), self.limiter():
+            with self.assertRaises(module_utils.ApiCallError) as error:
+                with self.limiter():
+                    pass
+            self.assertIn('2 concurrent request slots', str(error.exception))
+
+            with module_utils.ConcurrencyLimiter(self.cache_dir, '2.2.2.2', 1, wait=0):
+                pass
+
+        with self.limiter(), self.limiter():
+            pass
+
+    def test_request_holds_slot(self):
+        def send(*args):
+            with self.assertRaises(module_utils.ApiCallError):
+                with self.limiter(slots=1):
+                    pass
+            return 200, {}, b'{"version": "5.0.1-1280"}'
+
+        transport = Mock(node_ip='1.1.1.1')
+        transport.send.side_effect = send
+        rubrik = module_utils.RubrikClient(transport, api_token='token', concurrency_limiter=self.limiter(slots=1))
+
+        self.assertEqual(rubrik.cluster_version(), '5.0.1-1280')
+        with self.limiter(slots=1):
+            pass
+
+    def test_connect_max_concurrent_requests(self):
+        module = build_module({'node_ip': '1.1.1.1', 'api_token': 'token', 'max_concurrent_requests': 4})
+
+        rubrik = module_utils.connect(module, sdk=False)
+
+        self.assertEqual(rubrik.concurrency_limiter.slots, 4)
+        self.assertIsNone(module_utils.connect(build_module({'node_ip': '1.1.1.1', 'api_token': 'token'}), sdk=False).concurrency_limiter)
+
+
+class TestApiMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def test_endpoint_template(self):
+        self.assertEqual(
+            module_utils.ApiMetrics.endpoint_template('/api/v1/vmware/vm/VirtualMachine:::a1b2-vm-42/snapshot?limit=1'),
+            '/api/v1/vmware/vm/{id}/snapshot')
+        self.assertEqual(module_utils.ApiMetrics.endpoint_template('/api/internal/sla_domain'), '/api/internal/sla_domain')
+
+    @patch.object(module_utils.time, 'sleep', autospec=True, spec_set=True)
+    def test_retries_recorded(self, mock_sleep):
+        transport = Mock(node_ip='1.1.1.1')
+        transport.send.side_effect = [(503, {}, b''), (200, {}, b'{"version": "5.0.1-1280"}')]
+        metrics = module_utils.ApiMetrics()
+
+        module_utils.RubrikClient(transport, api_token='token', retry_policy=module_utils.RetryPolicy(), metrics=metrics).cluster_version()
+
+        self.assertEqual(metrics.report()['totals']['retries'], 1)
+        self.assertEqual(metrics.calls[0]['status'], 200)
+
+    @patch.object(basic.AnsibleModule, 'exit_json', autospec=True, spec_set=True)
+    @patch.object(module_utils.HttpTransport, 'send', autospec=True, spec_set=True)
+    @patch.object(module_utils, 'session_login', autospec=True, spec_set=True)
+    def test_auth_and_lookups_recorded(self, mock_login, mock_send, mock_exit_json):
+        mock_login.return_value = 'token-1'
+        mock_send.return_value = (200, {}, b'{"data": [{"id": "SLA_1", "name": "Gold"}], "total": 1}')
+
+        module = build_module({'provider': {'node_ip': '1.1.1.1', 'username': 'admin', 'password': 'secret', 'cache_dir': self.cache_dir,
+                                            'collect_metrics': True}})
+
+        rubrik = module_utils.connect(module)
+        self.assertEqual(rubrik.object_id('Gold', 'sla'), 'SLA_1')
+        self.assertEqual(rubrik.object_id('Gold', 'sla'), 'SLA_1')
+        module.exit_json(changed=False)
+
+        metrics = mock_exit_json.call_args[1]['rubrik_metrics']
+        self.assertEqual(metrics['calls'][0]['endpoint'], '/api/v1/sla_domain')
+        self.assertEqual(metrics['totals']['requests'], 1)
+        self.assertEqual(metrics['totals']['auth']['count'], 1)
+        self.assertEqual(metrics['totals']['lookups']['count'], 2)
+        self.assertEqual(metrics['totals']['lookups']['cache_hits'], 1)
+
+    @patch.object(basic.AnsibleModule, 'exit_json', autospec=True, spec_set=True)
+    @patch.object(module_utils.HttpTransport, 'send', autospec=True, spec_set=True)
+    @patch.object(module_utils, 'session_login', autospec=True, spec_set=True)
+    def test_cached_token_not_recorded_as_login(self, mock_login, mock_send, mock_exit_json):
+        mock_login.return_value = 'token-1'
+        mock_send.return_value = (200, {}, b'{"version": "5.0.1-1280"}')
+
+        for _ in range(3):
+            module = build_module({'provider': {'node_ip': '1.1.1.1', 'username': 'admin', 'password': 'secret', 'cache_dir': self.cache_dir,
+                                                'collect_metrics': True}})
+            module_utils.connect(module, sdk=False)
+            module.exit_json(changed=False)
+
+        auth = [call[1]['rubrik_metrics']['totals']['auth'] for call in mock_exit_json.call_args_list]
+        self.assertEqual(mock_login.call_count, 1)
+        self.assertEqual([(run['count'], run['cached']) for run in auth], [(1, 0), (0, 1), (0, 1)])
+        self.assertEqual([run['latency_ms'] for run in auth[1:]], [0.0, 0.0])
+
+
+class TestPrometheusTextfile(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.path = os.path.join(self.cache_dir, 'rubrik_cdm.prom')
+
+    def metrics(self):
+        metrics = module_utils.ApiMetrics()
+        metrics.record_call('GET', '/api/v1/vmware/vm/VirtualMachine:::1', 200, 0.2, 0, 100, 0)
+        metrics.record_call('POST', '/api/v1/vmware/vm/VirtualMachine:::1/snapshot', 503, 3, 10, 0, 2)
+        metrics.record_auth(0.5)
+        metrics.record_cached_token()
+        return metrics
+
+    def test_counters_merged_across_runs(self):
+        module_utils.PrometheusTextfile(self.path, self.cache_dir).export(self.metrics(), '1.1.1.1', 'rubrik_get')
+        module_utils.PrometheusTextfile(self.path, self.cache_dir).export(self.metrics(), '1.1.1.1', 'rubrik_get')
+
+        with open(self.path) as textfile:
+            lines = textfile.read().splitlines()
+
+        labels = 'cluster="1.1.1.1",endpoint="/api/v1/vmware/vm/{id}",method="GET",module="rubrik_get"'
+        self.assertIn('rubrik_cdm_api_requests_total{{{},status="200"}} 2'.format(labels), lines)
+        self.assertIn('rubrik_cdm_api_request_duration_seconds_bucket{{{},le="0.1"}} 0'.format(labels), lines)
+        self.assertIn('rubrik_cdm_api_request_duration_seconds_bucket{{{},le="0.25"}} 2'.format(labels), lines)
+        self.assertIn('rubrik_cdm_api_request_duration_seconds_bucket{{{},le="+Inf"}} 2'.format(labels), lines)
+        self.assertIn('rubrik_cdm_api_request_duration_seconds_count{{{}}} 2'.format(labels), lines)
+
+        labels = 'cluster="1.1.1.1",endpoint="/api/v1/vmware/vm/{id}/snapshot",method="POST",module="rubrik_get"'
+        self.assertIn('rubrik_cdm_api_retries_total{{{}}} 4'.format(labels), lines)
+        self.assertIn('rubrik_cdm_api_failures_total{{{}}} 2'.format(labels), lines)
+        self.assertIn('rubrik_cdm_auth_total{cluster="1.1.1.1",module="rubrik_get"} 2', lines)
+        self.assertIn('rubrik_cdm_auth_cached_total{cluster="1.1.1.1",module="rubrik_get"} 2', lines)
+        self.assertIn('# TYPE rubrik_cdm_api_request_duration_seconds histogram', lines)
+        self.assertEqual(os.listdir(self.cache_dir).count('rubrik_cdm.prom'), 1)
+        self.assertFalse([name for name in os.listdir(self.cache_dir) if name.endswith('.tmp')])
+
+    def test_label_values_escaped(self):
+        metrics = module_utils.ApiMetrics()
+        metrics.record_auth(0.1)
+
+        module_utils.PrometheusTextfile(self.path, self.cache_dir).export(metrics, 'rubrik"\\1', 'rubrik_get')
+
+        with open(self.path) as textfile:
+            self.assertIn('rubrik_cdm_auth_total{cluster="rubrik\\"\\\\1",module="rubrik_get"} 1', textfile.read())
+
+    @patch.object(basic.AnsibleModule, 'exit_json', autospec=True, spec_set=True)
+    def test_exported_on_exit(self, mock_exit_json):
+        module = build_module({'node_ip': '1.1.1.1', 'api_token': 'token', 'prometheus_textfile_dir': self.cache_dir})
+        rubrik = module_utils.connect(module, sdk=False)
+        rubrik.transport = Mock(node_ip='1.1.1.1')
+        rubrik.transport.send.return_value = (200, {}, b'{"version": "5.0.1-1280"}')
+
+        rubrik.cluster_version()
+        module.exit_json(changed=False)
+
+        self.assertNotIn('rubrik_metrics', mock_exit_json.call_args[1])
+        with open(self.path) as textfile:
+            self.assertIn('rubrik_cdm_api_requests_total{cluster="1.1.1.1",endpoint="/api/v1/cluster/me/version",method="GET",'
+                          'module="basic",status="200"} 1', textfile.read())
+
+
+class TestHttpTrace(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.path = os.path.join(self.cache_dir, 'trace.jsonl')
+
+    def read_trace(self):
+        with open(self.path) as trace_file:
+            return [json.loads(line) for line in trace_file]
+
+    @patch.object(module_utils.time, 'sleep', autospec=True, spec_set=True)
+    def test_exchanges_and_retries_traced(self, mock_sleep):
+        transport = Mock(node_ip='1.1.1.1')
+        transport.send.side_effect = [(503, {'retry-after': '2'}, b''), (200, {}, b'{"version": "5.0.1-1280"}')]
+        trace = module_utils.HttpTrace(self.path, 'rubrik_cluster_version', task_id='task-1')
+
+        module_utils.RubrikClient(transport, api_token='token', retry_policy=module_utils.RetryPolicy(), trace=trace).cluster_version()
+
+        busy, retry, success = self.read_trace()
+        self.assertEqual((busy['event'], busy['status'], busy['endpoint']), ('request', 503, '/api/v1/cluster/me/version'))
+        self.assertEqual((retry['event'], retry['attempt'], retry['delay_s'], retry['status']), ('retry', 1, 2.0, 503))
+        self.assertEqual((success['event'], success['status'], success['response_bytes']), ('request', 200, 25))
+        self.assertEqual({entry['task_id'] for entry in (busy, retry, success)}, {'task-1'})
+        self.assertEqual(success['module'], 'rubrik_cluster_version')
+        self.assertEqual(success['cluster'], '1.1.1.1')
+
+    def test_secrets_redacted(self):
+        transport = Mock(node_ip='1.1.1.1')
+        transport.send.return_value = (200, {}, b'{}')
+        trace = module_utils.HttpTrace(self.path, 'rubrik_get')
+
+        module_utils.RubrikClient(transport, api_token='token', trace=trace).request('GET', '/api/v1/host?name=a&api_token=secret')
+
+        entry = self.read_trace()[0]
+        self.assertEqual(entry['path'], '/api/v1/host?name=a&api_token=REDACTED')
+        self.assertNotIn('secret', json.dumps(entry))
+        self.assertNotIn('token', json.dumps({key: value for key, value in entry.items() if key != 'path'}))
+
+    @patch.object(module_utils, 'session_login', autospec=True, spec_set=True)
+    @patch.object(module_utils.HttpTransport, 'send', autospec=True, spec_set=True)
+    def test_login_traced(self, mock_send, mock_login):
+        mock_login.return_value = 'token-1'
+        mock_send.return_value = (200, {}, b'{"version": "5.0.1-1280"}')
+
+        module = build_module({'node_ip': '1.1.1.1', 'username': 'admin', 'password': 'secret', 'trace_file': self.path})
+        module_utils.connect(module, sdk=False).get('v1', '/cluster/me/version')
+        module = build_module({'node_ip': '1.1.1.1', 'username': 'admin', 'password': 'secret', 'trace_file': self.path})
+        module_utils.connect(module, sdk=False).get('v1', '/cluster/me/version')
+
+        events = self.read_trace()
+        self.assertEqual([(entry['event'], entry.get('cached')) for entry in events],
+                         [('login', False), ('request', None), ('login', True), ('request', None)])
+        self.assertNotEqual(events[0]['task_id'], events[2]['task_id'])
+        self.assertNotIn('token-1', json.dumps(events))
+
+
+class TestModuleProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def test_cpu_profile(self):
+        import pstats
+
+        profiler = module_utils.ModuleProfiler('cpu', os.path.join(self.cache_dir, 'profiles'), 'rubrik_get')
+        profiler.start()
+        module_utils.project_fields({'data': [{'id': 1}]}, ['data[].id'])
+        path = profiler.stop()
+
+        self.assertEqual(path, os.path.join(self.cache_dir, 'profiles', 'rubrik_get-{}.prof'.format(os.getpid())))
+        self.assertTrue(any(function[2] == 'project_fields' for function in pstats.Stats(path).stats))
+
+    def test_mem_profile(self):
+        import tracemalloc
+
+        profiler = module_utils.ModuleProfiler('mem', self.cache_dir, 'rubrik_get')
+        profiler.start()
+        allocated = [str(number) for number in range(10000)]
+        path = profiler.stop()
+
+        self.assertTrue(allocated)
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertTrue(tracemalloc.Snapshot.load(path).statistics('lineno'))
+        with open(os.path.join(self.cache_dir, 'rubrik_get-{}.txt'.format(os.getpid()))) as summary:
+            self.assertIn('MiB peak', summary.read())
+
+    def test_profiles_numbered_per_run(self):
+        for run in range(2):
+            profiler = module_utils.ModuleProfiler('cpu', self.cache_dir, 'rubrik_get')
+            profiler.start()
+            path = profiler.stop()
+
+        self.assertEqual(path, os.path.join(self.cache_dir, 'rubrik_get-{}-2.prof'.format(os.getpid())))
+
+    def test_started_from_environment(self):
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(module_utils._profile(build_module({'node_ip': '1.1.1.1', 'api_token': 'token'})))
+
+        module = build_module({'node_ip': '1.1.1.1', 'api_token': 'token'})
+        module._name = 'rubrik_get'
+        module.exit_json = Mock()
+        with patch.dict(os.environ, {'rubrik_cdm_profile': 'cpu', 'rubrik_cdm_profile_dir': self.cache_dir}):
+            profiler = module_utils._profile(module)
+        self.assertEqual((profiler.mode, profiler.path, profiler.name), ('cpu', self.cache_dir, 'rubrik_get'))
+
+        # The profile is written when the module exits, before the result is handed to Ansible
+        module.exit_json(changed=False)
+        self.assertEqual(os.listdir(self.cache_dir), ['rubrik_get-{}.prof'.format(os.getpid())])
+
+
+class TestProjectFields(unittest.TestCase):
+
+    RESPONSE = {
+        'hasMore': False,
+        'total': 2,
+        'data': [
+            {'id': 'VM_1', 'name': 'vm-1', 'effectiveSlaDomainName': 'Gold', 'links': [{'href': 'https://1.1.1.1/vm/1'}]},
+            {'id': 'VM_2', 'name': 'vm-2', 'effectiveSlaDomainName': 'Silver', 'links': []},
+        ],
+    }
+
+    def test_project_fields(self):
+        self.assertEqual(module_utils.project_fields(self.RESPONSE, ['total', 'data[].id', 'data[].name']), {
+            'total': 2,
+            'data': [{'id': 'VM_1', 'name': 'vm-1'}, {'id': 'VM_2', 'name': 'vm-2'}],
+        })
+
+    def test_project_fields_index_and_missing(self):
+        self.assertEqual(module_utils.project_fields(self.RESPONSE, ['data[*].links[0].href', 'status']), {
+            'data': [{'links': [{'href': 'https://1.1.1.1/vm/1'}]}, None],
+        })
+        self.assertEqual(module_utils.project_fields({'status': 'QUEUED'}, ['id']), {})
+
+    @patch.object(basic.AnsibleModule, 'exit_json', autospec=True, spec_set=True)
+    def test_connect_return_fields(self, mock_exit_json):
+        module = build_module({'node_ip': '1.1.1.1', 'api_token': 'token', 'return_fields': ['data[].name']})
+
+        module_utils.connect(module, sdk=False)
+        module.exit_json(changed=False, response=self.RESPONSE)
+
+        self.assertEqual(mock_exit_json.call_args[1], {'changed': False, 'response': {'data': [{'name': 'vm-1'}, {'name': 'vm-2'}]}})
+
+    @patch.object(basic.AnsibleModule, 'exit_json', autospec=True, spec_set=True)
+    def test_connect_response_none(self, mock_exit_json):
+        module = build_module({'node_ip': '1.1.1.1', 'api_token': 'token', 'response': 'none', 'return_fields': ['total']})
+
+        module_utils.connect(module, sdk=False)
+        module.exit_json(changed=True, response={'id': 'MANUAL_1', 'name': 'Manual'})
+
+        self.assertEqual(mock_exit_json.call_args[1], {'changed': True, 'response': {'id': 'MANUAL_1'}})
+
+    @patch.object(basic.AnsibleModule, 'exit_json', autospec=True, spec_set=True)
+    def test_connect_message_and_list_responses_unchanged(self, mock_exit_json):
+        for args in ({'response': 'none'}, {'return_fields': ['data[].name']}):
+            module = build_module(dict(args, node_ip='1.1.1.1', api_token='token'))
+            module_utils.connect(module, sdk=False)
+
+            module.exit_json(changed=False, response='No change required.')
+            self.assertEqual(mock_exit_json.call_args[1]['response'], 'No change required.')
+
+            module.exit_json(changed=True, response=[{'id': 'VM_1', 'name': 'vm-1'}])
+            self.assertEqual(mock_exit_json.call_args[1]['response'], [{'id': 'VM_1', 'name': 'vm-1'}])
+
+
+class TestNodePool(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def build_pool(self, strategy='round_robin'):
+        return module_utils.NodePool(self.cache_dir, '10.0.0.1,10.0.0.2', ['10.0.0.1', '10.0.0.2'], strategy)
+
+    def test_node_addresses(self):
+        self.assertEqual(module_utils.node_addresses('10.0.0.1'), (['10.0.0.1'], False))
+        self.assertEqual(module_utils.node_addresses('10.0.0.1, 10.0.0.2'), (['10.0.0.1', '10.0.0.2'], False))
+        self.assertEqual(module_utils.node_addresses(['10.0.0.1', 'auto']), (['10.0.0.1'], True))
+
+    def test_round_robin_across_module_runs(self):
+        self.assertEqual(self.build_pool().candidates(), ['10.0.0.1', '10.0.0.2'])
+        self.assertEqual(self.build_pool().candidates(), ['10.0.0.2', '10.0.0.1'])
+        self.assertEqual(self.build_pool().candidates(), ['10.0.0.1', '10.0.0.2'])
+
+    def test_node_down_tried_last(self):
+        self.build_pool().mark_down('10.0.0.1')
+
+        self.assertEqual(self.build_pool().candidates(), ['10.0.0.2', '10.0.0.1'])
+        self.assertEqual(self.build_pool().candidates(), ['10.0.0.2', '10.0.0.1'])
+
+        with patch.object(module_utils.time, 'time', return_value=time.time() + 61):
+            self.assertEqual(sorted(self.build_pool().candidates()), ['10.0.0.1', '10.0.0.2'])
+
+    def test_least_latency(self):
+        self.build_pool().record_latency({'10.0.0.1': 0.5, '10.0.0.2': 0.1})
+
+        self.assertEqual(self.build_pool('least_latency').candidates(), ['10.0.0.2', '10.0.0.1'])
+
+    @patch.object(module_utils.HttpTransport, 'send', autospec=True, spec_set=True)
+    def test_failover(self, mock_send):
+        def send(transport, method, path, body=None, headers=None, timeout=15):
+            if transport.node_ip == '10.0.0.1':
+                raise module_utils.socket.error('Connection refused')
+            return 200, {}, b'{"version": "5.0.1-1280"}'
+
+        mock_send.side_effect = send
+
+        client = module_utils.RubrikClient(module_utils.MultiNodeTransport(self.build_pool()), api_token='token')
+
+        self.assertEqual(client.cluster_version(), '5.0.1-1280')
+        self.assertEqual(client.cluster_version(), '5.0.1-1280')
+        self.assertEqual(mock_send.call_count, 3)
+        self.assertEqual(self.build_pool().candidates()[-1], '10.0.0.1')
+
+    def test_threads_share_node_transport(self):
+        created = []
+
+        def build_transport(node, *args):
+            # Widen the window between the lookup and the creation of the transport
+            time.sleep(0.01)
+            transport = Mock(node_ip=node)
+            transport.send.return_value = (200, {}, b'{}')
+            created.append(transport)
+            return transport
+
+        transport = module_utils.MultiNodeTransport(self.build_pool())
+        with patch.object(module_utils, 'HttpTransport', side_effect=build_transport):
+            transport.send('GET', '/api/v1/cluster/me')
+            threads = [threading.Thread(target=transport._send, args=('10.0.0.2', 'GET', '/api/v1/host', None, None, 15))
+                       for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(sorted(t.node_ip for t in created), ['10.0.0.1', '10.0.0.2'])
+        self.assertEqual(created[1].send.call_count, 8)
+
+    @patch.object(module_utils.HttpTransport, 'send', autospec=True, spec_set=True)
+    def test_connect_discovers_nodes(self, mock_send):
+        mock_send.return_value = (200, {}, json.dumps({'data': [
+            {'id': 'RVM1', 'ipAddress': '10.0.0.1', 'status': 'OK'},
+            {'id': 'RVM2', 'ipAddress': '10.0.0.2', 'status': 'OK'},
+            {'id': 'RVM3', 'ipAddress': '10.0.0.3', 'status': 'BAD'}]}).encode('utf-8'))
+
+        module = build_module({'node_ip': ['10.0.0.1', 'auto'], 'api_token': 'token', 'cache_dir': self.cache_dir})
+
+        client = module_utils.connect(module, sdk=False)
+        pool = client.transport.pool
+
+        self.assertEqual(client.node_ip, '10.0.0.1,auto')
+        self.assertEqual(pool.discovered(), ['10.0.0.1', '10.0.0.2'])
+        self.assertEqual(sorted(pool.candidates()), ['10.0.0.1', '10.0.0.2'])
+
+        module_utils.connect(module, sdk=False)
+        self.assertEqual(mock_send.call_count, 1)
+
+
+class TestPaginate(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = Mock(node_ip='1.1.1.1')
+        self.client = module_utils.RubrikClient(self.transport, api_token='token')
+
+    def page(self, data, has_more, **kwargs):
+        body = dict(data=data, hasMore=has_more, total=5, **kwargs)
+        return 200, {}, json.dumps(body).encode('utf-8')
+
+    def requested_paths(self):
+        return [call[0][1] for call in self.transport.send.call_args_list]
+
+    def test_paginate_by_offset(self):
+        self.transport.send.side_effect = [self.page([1, 2], True), self.page([3, 4], True), self.page([5], False)]
+
+        self.assertEqual(list(module_utils.paginate(self.client, 'v1', '/host', page_size=2)), [1, 2, 3, 4, 5])
+        self.assertEqual(self.requested_paths(), [
+            '/api/v1/host?limit=2',
+            '/api/v1/host?limit=2&offset=2',
+            '/api/v1/host?limit=2&offset=4'])
+
+    def test_paginate_by_cursor(self):
+        self.transport.send.side_effect = [self.page([1, 2], True, nextCursor='c2'), self.page([3], False)]
+
+        self.assertEqual(list(module_utils.paginate(self.client, 'v1', '/event', page_size=2)), [1, 2, 3])
+        self.assertEqual(self.requested_paths()[1], '/api/v1/event?limit=2&cursor=c2')
+
+    def test_paginate_is_lazy(self):
+        self.transport.send.side_effect = [self.page([1, 2], True), self.page([3], False)]
+
+        objects = module_utils.paginate(self.client, 'v1', '/host', page_size=2)
+
+        self.assertEqual(next(objects), 1)
+        self.assertEqual(self.transport.send.call_count, 1)
+
+    def test_paginate_prefetch(self):
+        self.transport.send.side_effect = [self.page([1, 2], True), self.page([3], False)]
+
+        objects = module_utils.paginate(self.client, 'v1', '/vmware/vm/snapshot/mount', {'vm_id': 'VM_1'}, page_size=2, prefetch=True)
+
+        self.assertEqual(list(objects), [1, 2, 3])
+        self.assertEqual(self.requested_paths()[1], '/api/v1/vmware/vm/snapshot/mount?vm_id=VM_1&limit=2&offset=2')
+
+    def test_paginate_endpoint_with_query(self):
+        self.transport.send.return_value = self.page([1], False)
+
+        list(module_utils.paginate(self.client, 'internal', '/managed_volume?is_relic=false', page_size=10))
+
+        self.assertEqual(self.requested_paths(), ['/api/internal/managed_volume?is_relic=false&limit=10'])
+
+    def collected(self, **provider):
+        module = Mock(params=dict(provider=provider))
+        items = iter({'id': i, 'name': 'host%d' % i, 'links': [{'href': 'h'}]} for i in range(3))
+        objects, total = module_utils.collect_items(module, items)
+        self.assertEqual(list(items), [])
+        self.assertEqual(total, 3)
+        return objects
+
+    def test_collect_items(self):
+        self.assertEqual(len(self.collected()), 3)
+        self.assertEqual(self.collected(response='none'), [{'id': 0}, {'id': 1}, {'id': 2}])
+        self.assertEqual(self.collected(return_fields=['total', 'data[].name', 'data[*].links[0].href']), [
+            {'name': 'host%d' % i, 'links': [{'href': 'h'}]} for i in range(3)])
+        self.assertEqual(self.collected(return_fields=['total']), [])
+        self.assertEqual(len(self.collected(return_fields=['data[0].name'])), 3)
+
+
+class TestDesiredState(unittest.TestCase):
+
+    def build_module(self, check_mode=False, diff=False):
+        return Mock(check_mode=check_mode, _diff=diff)
+
+    def test_state_diff(self):
+        current = {'timezone': {'timezone': 'UTC'}, 'geolocation': {'address': 'Palo Alto'}, 'servers': ['a', 'b']}
+
+        self.assertEqual(module_utils.state_diff(current, {'timezone': {'timezone': 'UTC'}}), {})
+        self.assertEqual(module_utils.state_diff(current, {'timezone': {'timezone': 'Europe/London'}, 'servers': ['a', 'b']}),
+                         {'timezone': {'timezone': 'Europe/London'}})
+        self.assertEqual(module_utils.state_diff(current, {'servers': ['a']}), {'servers': ['a']})
+        self.assertEqual(module_utils.state_diff({}, {'smtpPort': 25}), {'smtpPort': 25})
+
+    def test_only_changes_written(self):
+        rubrik = Mock()
+        rubrik.get.return_value = {'smtpHostname': 'smtp.example.com', 'smtpPort': 25}
+        write = Mock(return_value={'smtpPort': 587})
+        state = module_utils.DesiredState(rubrik, 'internal', '/smtp_instance')
+
+        results = state.apply(self.build_module(), {'smtpHostname': 'smtp.example.com', 'smtpPort': 587}, dict, write)
+
+        self.assertEqual(results, {'changed': True, 'response': {'smtpPort': 587}})
+        write.assert_called_once_with({'smtpPort': 587}, rubrik.get.return_value)
+        rubrik.get.assert_called_once_with('internal', '/smtp_instance', timeout=15)
+
+    def test_unchanged(self):
+        rubrik = Mock()
+        rubrik.get.return_value = {'loginBanner': 'Welcome'}
+        write = Mock()
+
+        results = module_utils.DesiredState(rubrik, 'internal', '/cluster/me/login_banner').apply(
+            self.build_module(diff=True), {'loginBanner': 'Welcome'}, dict, write, 'No change required.')
+
+        self.assertEqual(results, {'changed': False, 'response': 'No change required.',
+                                   'diff': {'before': {'loginBanner': 'Welcome'}, 'after': {'loginBanner': 'Welcome'}}})
+        write.assert_not_called()
+
+    def test_check_mode(self):
+        rubrik = Mock()
+        rubrik.get.return_value = {'loginBanner': 'Welcome'}
+        write = Mock()
+
+        results = module_utils.DesiredState(rubrik, 'internal', '/cluster/me/login_banner').apply(
+            self.build_module(check_mode=True), {'loginBanner': 'Authorized use only'}, dict, write)
+
+        self.assertEqual(results, {'changed': True, 'response': {'loginBanner': 'Authorized use only'}})
+        write.assert_not_called()
+
+
+class TestRunParallel(unittest.TestCase):
+
+    @staticmethod
+    def assign_sla(object_name, sla_name):
+        time.sleep(0.01)
+        if object_name == 'vm-missing':
+            raise rubrik_cdm.exceptions.InvalidParameterException('The vSphere VM object vm-missing was not found on the Rubrik cluster.')
+        return {'objectName': object_name, 'slaName': sla_name}
+
+    def tasks(self, names):
+        return [functools.partial(self.assign_sla, name, 'Gold') for name in names]
+
+    def test_results_in_order(self):
+        names = ['vm-{:02d}'.format(index) for index in range(40)]
+
+        outcomes = module_utils.run_parallel(self.tasks(names), max_workers=8)
+
+        self.assertEqual([outcome['result']['objectName'] for outcome in outcomes], names)
+        self.assertFalse(any(outcome['failed'] for outcome in outcomes))
+        self.assertTrue(all(outcome['elapsed_ms'] >= 10 for outcome in outcomes))
+
+    def test_failures_collected(self):
+        outcomes = module_utils.run_parallel(self.tasks(['vm-01', 'vm-missing', 'vm-02']), max_workers=2)
+
+        self.assertEqual([outcome['failed'] for outcome in outcomes], [False, True, False])
+        self.assertEqual(outcomes[1]['msg'], 'The vSphere VM object vm-missing was not found on the Rubrik cluster.')
+        self.assertNotIn('result', outcomes[1])
+        self.assertEqual(outcomes[2]['result'], {'objectName': 'vm-02', 'slaName': 'Gold'})
+
+        self.assertEqual(module_utils.run_parallel([]), [])
+
+
+class TestAsyncRubrikClient(unittest.TestCase):
+
+    def setUp(self):
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def send(self, method, path, body, headers, timeout):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        if path.endswith('/missing'):
+            return 404, {}, b'{"message": "Not found"}'
+        return 200, {}, to_bytes(json.dumps({'path': path}))
+
+    def client(self, window):
+        transport = Mock(node_ip='1.1.1.1')
+        transport.send.side_effect = self.send
+        self.pool_sizes = []
+        type(transport).pool_size = PropertyMock(side_effect=lambda *size: self.pool_sizes.extend(size) or 4)
+        return module_utils.AsyncRubrikClient(module_utils.RubrikClient(transport, api_token='token'), window)
+
+    def test_requests_sent_concurrently_in_order(self):
+        bulk = self.client(window=20)
+        calls = [('get', ('v1', '/vmware/vm/VM_{}'.format(index))) for index in range(200)]
+
+        results = bulk.gather(calls)
+
+        self.assertEqual([result['path'] for result in results], ['/api/v1/vmware/vm/VM_{}'.format(index) for index in range(200)])
+        self.assertLessEqual(self.peak, 20)
+        self.assertGreater(self.peak, 1)
+        # The pool grows to the window while the calls are sent, and shrinks back for the tasks sharing the transport
+        self.assertEqual(self.pool_sizes, [20, 4])
+
+    def test_keyword_arguments(self):
+        results = self.client(window=5).gather([('get', ('v1', '/host/HOST_{}'.format(index)), {'timeout': 30}) for index in range(20)])
+
+        self.assertEqual(len(results), 20)
+        self.assertEqual(results[3], {'path': '/api/v1/host/HOST_3'})
+        self.assertLessEqual(self.peak, 5)
+
+    def test_errors(self):
+        bulk = self.client(window=4)
+        calls = [('get', ('v1', '/host/HOST_1')), ('get', ('v1', '/host/missing')), ('get', ('v1', '/host/HOST_2'))]
+
+        results = bulk.gather(calls, return_exceptions=True)
+        self.assertEqual(results[0], {'path': '/api/v1/host/HOST_1'})
+        self.assertIsInstance(results[1], module_utils.ApiCallError)
+        self.assertEqual(results[2], {'path': '/api/v1/host/HOST_2'})
+
+        self.assertRaises(module_utils.ApiCallError, bulk.gather, calls)
+        self.assertEqual(bulk.gather([]), [])
+
+    def test_concurrency_limiter_slot_per_thread(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        bulk = self.client(window=10)
+        bulk.rubrik.concurrency_limiter = module_utils.ConcurrencyLimiter(cache_dir, '1.1.1.1', 3)
+
+        bulk.gather([('get', ('v1', '/host/HOST_{}'.format(index))) for index in range(30)])
+
+        self.assertLessEqual(self.peak, 3)
+        self.assertGreater(self.peak, 1)
+
+
+class TestHttpTransport(unittest.TestCase):
+
+    @patch.object(module_utils.http_client, 'HTTPSConnection', autospec=True)
+    def test_connection_reused(self, mock_connection):
+        mock_connection.return_value.sock = None
+        mock_connection.return_value.getresponse.return_value.status = 200
+        mock_connection.return_value.getresponse.return_value.getheaders.return_value = [('Content-Type', 'application/json')]
+        mock_connection.return_value.getresponse.return_value.read.return_value = b'{}'
+
+        transport = module_utils.HttpTransport('1.1.1.1')
+
+        self.assertEqual(transport.send('GET', '/api/v1/cluster/me'), (200, {'content-type': 'application/json'}, b'{}'))
+        transport.send('GET', '/api/v1/cluster/me')
+
+        self.assertEqual(mock_connection.call_count, 1)
+
+    @patch.object(module_utils.http_client, 'HTTPSConnection', autospec=True)
+    def test_stale_connection_reopened(self, mock_connection):
+        mock_connection.return_value.sock = None
+        mock_connection.return_value.getresponse.return_value.status = 200
+        mock_connection.return_value.getresponse.return_value.getheaders.return_value = []
+        mock_connection.return_value.getresponse.return_value.read.return_value = b'{}'
+
+        transport = module_utils.HttpTransport('1.1.1.1')
+        transport.send('GET', '/api/v1/cluster/me')
+
+        mock_connection.return_value.request.side_effect = [module_utils.http_client.BadStatusLine(''), None]
+        self.assertEqual(transport.send('GET', '/api/v1/cluster/me')[0], 200)
+
+        self.assertEqual(mock_connection.call_count, 2)
+
+    @patch.object(module_utils.http_client, 'HTTPSConnection', autospec=True)
+    def test_gzip_response_decompressed(self, mock_connection):
+        body = json.dumps({'data': [{'id': index, 'name': 'vm-{}'.format(index)} for index in range(2000)]}).encode('utf-8')
+        compressed = io.BytesIO(module_utils.gzip_compress(body))
+        mock_connection.return_value.sock = None
+        mock_connection.return_value.getresponse.return_value.status = 200
+        mock_connection.return_value.getresponse.return_value.getheaders.return_value = [('Content-Encoding', 'gzip')]
+        mock_connection.return_value.getresponse.return_value.read.side_effect = compressed.read
+
+        transport = module_utils.HttpTransport('1.1.1.1')
+
+        self.assertEqual(transport.send('GET', '/api/v1/vmware/vm'), (200, {}, body))
+        self.assertEqual(mock_connection.return_value.request.call_args[0][3]['Accept-Encoding'], 'gzip')
+        self.assertEqual(transport.received_bytes, len(compressed.getvalue()))
+        self.assertLess(transport.received_bytes, len(body) / 4)
+
+    @patch.object(module_utils.http_client, 'HTTPSConnection', autospec=True)
+    def test_request_compressed_over_threshold(self, mock_connection):
+        mock_connection.return_value.sock = None
+        mock_connection.return_value.getresponse.return_value.status = 204
+        mock_connection.return_value.getresponse.return_value.getheaders.return_value = []
+        mock_connection.return_value.getresponse.return_value.read.return_value = b''
+
+        transport = module_utils.HttpTransport('1.1.1.1', compression=False, compress_threshold=100)
+        small, large = json.dumps({'managedIds': ['VM_1']}), json.dumps({'managedIds': ['VM_{}'.format(index) for index in range(100)]})
+
+        transport.send('POST', '/api/internal/sla_domain/SLA_1/assign', small, {})
+        method, path, body, headers = mock_connection.return_value.request.call_args[0]
+        self.assertEqual((body, headers), (small.encode('utf-8'), {}))
+
+        transport.send('POST', '/api/internal/sla_domain/SLA_1/assign', large, {})
+        method, path, body, headers = mock_connection.return_value.request.call_args[0]
+        self.assertEqual(headers, {'Content-Encoding': 'gzip'})
+        self.assertEqual(zlib.decompress(body, 16 + zlib.MAX_WBITS), large.encode('utf-8'))
+
+    @patch.object(module_utils.http_client, 'HTTPSConnection', autospec=True)
+    def test_pool_reuses_idle_connections(self, mock_connection):
+        connections = [Mock(sock=None), Mock(sock=None)]
+        for connection in connections:
+            connection.getresponse.return_value.status = 200
+            connection.getresponse.return_value.getheaders.return_value = []
+            connection.getresponse.return_value.read.return_value = b'{}'
+        mock_connection.side_effect = connections
+        metrics = module_utils.ApiMetrics()
+
+        transport = module_utils.HttpTransport('1.1.1.1', pool_size=2, metrics=metrics)
+        first, first_reused = transport._acquire(15)
+        second, second_reused = transport._acquire(15)
+        self.assertEqual((first_reused, second_reused), (False, False))
+        self.assertRaises(module_utils.socket.timeout, transport._acquire, 15, 0)
+
+        transport._release(first)
+        transport._release(second)
+        transport.send('GET', '/api/v1/cluster/me')
+        transport.send('GET', '/api/v1/cluster/me')
+
+        self.assertEqual(mock_connection.call_count, 2)
+        self.assertEqual(metrics.connections, {'opened': 0, 'reused': 2, 'resumed': 0})
+        transport.close()
+        for connection in connections:
+            connection.close.assert_called_once_with()
+
+    @patch.object(module_utils.http_client, 'HTTPSConnection', autospec=True)
+    def test_shared_transport_metrics_per_run(self, mock_connection):
+        mock_connection.return_value.sock = None
+        mock_connection.return_value.getresponse.return_value.status = 200
+        mock_connection.return_value.getresponse.return_value.getheaders.return_value = []
+        mock_connection.return_value.getresponse.return_value.read.return_value = b'{}'
+        transport = module_utils.HttpTransport('1.1.1.1')
+        first, second = module_utils.ApiMetrics(), module_utils.ApiMetrics()
+
+        module_utils.SharedTransport(transport, first).send('GET', '/api/v1/cluster/me')
+        shared = module_utils.SharedTransport(transport, second)
+        shared.send('GET', '/api/v1/cluster/me')
+        shared.close()
+
+        self.assertEqual(first.connections, {'opened': 1, 'reused': 0, 'resumed': 0})
+        self.assertEqual(second.connections, {'opened': 0, 'reused': 1, 'resumed': 0})
+        self.assertIsNone(transport.metrics)
+        mock_connection.return_value.close.assert_not_called()
+
+        with patch.object(module_utils, 'SHARED_TRANSPORTS', {'1.1.1.1': transport}):
+            module_utils.close_shared_transports()
+        mock_connection.return_value.close.assert_called_once_with()
+
+    @patch.object(module_utils.http_client, 'HTTPSConnection', autospec=True)
+    def test_pool_shrunk(self, mock_connection):
+        mock_connection.side_effect = [Mock(sock=None), Mock(sock=None)]
+        transport = module_utils.HttpTransport('1.1.1.1', pool_size=2)
+        first, _ = transport._acquire(15)
+        second, _ = transport._acquire(15)
+
+        transport.pool_size = 1
+        transport._release(first)
+        transport._release(second)
+
+        first.close.assert_called_once_with()
+        second.close.assert_not_called()
+        self.assertEqual(transport._idle, [second])
+        self.assertEqual(transport._open, 1)
+
+    @patch.object(module_utils.socket, 'create_connection')
+    @patch.object(module_utils.ssl, 'create_default_context')
+    @patch.object(module_utils.http_client, 'HTTPSConnection', autospec=True)
+    def test_tls_session_resumed(self, mock_connection, mock_context, mock_create_connection):
+        session = object()
+        mock_connection.return_value.host, mock_connection.return_value.port = '1.1.1.1', 443
+        mock_connection.return_value.sock = Mock(session=session, session_reused=False)
+        mock_connection.return_value.getresponse.return_value.status = 200
+        mock_connection.return_value.getresponse.return_value.getheaders.return_value = []
+        mock_connection.return_value.getresponse.return_value.read.return_value = b'{}'
+        mock_context.return_value.wrap_socket.return_value = Mock(session=session, session_reused=True)
+        metrics = module_utils.ApiMetrics()
+
+        transport = module_utils.HttpTransport('1.1.1.1', metrics=metrics)
+        transport.send('GET', '/api/v1/cluster/me')
+        mock_context.return_value.wrap_socket.assert_not_called()
+
+        mock_connection.return_value.request.side_effect = [module_utils.http_client.BadStatusLine(''), None]
+        transport.send('GET', '/api/v1/cluster/me')
+
+        mock_context.assert_called_once_with()
+        mock_create_connection.assert_called_once_with(('1.1.1.1', 443), 15)
+        mock_context.return_value.wrap_socket.assert_called_once_with(
+            mock_create_connection.return_value, server_hostname='1.1.1.1', session=session)
+        self.assertEqual(metrics.connections, {'opened': 2, 'reused': 0, 'resumed': 1})
+
+
+class TestHttpApiConnect(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = Mock()
+        self.connection.get_option.return_value = 'rubrik.example.com'
+        self.mock_connection = patch.object(module_utils, 'Connection', return_value=self.connection)
+        self.mock_connection.start()
+        self.addCleanup(self.mock_connection.stop)
+
+    def build_module(self):
+        module = build_module({})
+        module._socket_path = '/tmp/rubrik.sock'
+        return module
+
+    def test_connect_routes_requests_through_httpapi(self):
+        self.connection.send_request.return_value = (200, '{"version": "5.0.1-1280"}')
+
+        rubrik = module_utils.connect(self.build_module())
+
+        self.assertEqual(rubrik.cluster_version(), '5.0.1-1280')
+        self.connection.send_request.assert_called_once_with('GET', '/api/v1/cluster/me/version', None, 15)
+
+    def test_connect_httpapi_error(self):
+        self.connection.send_request.return_value = (404, '{"errorType": "user_error", "message": "Not Found"}')
+
+        rubrik = module_utils.connect(self.build_module())
+
+        with self.assertRaises(rubrik_cdm.exceptions.APICallException) as error:
+            rubrik.post('v1', '/sla_domain', {"name": "Gold"})
+
+        self.assertEqual(str(error.exception), 'Not Found')
+        self.connection.send_request.assert_called_once_with('POST', '/api/v1/sla_domain', '{"name": "Gold"}', 15)
+
+    def test_connect_httpapi_job_status(self):
+        self.connection.send_request.return_value = (200, '{"status": "SUCCEEDED"}')
+
+        rubrik = module_utils.connect(self.build_module())
+
+        self.assertEqual(rubrik.job_status('https://rubrik.example.com/api/v1/vmware/vm/request/JOB_1'), {"status": "SUCCEEDED"})
+        self.connection.send_request.assert_called_with('GET', '/api/v1/vmware/vm/request/JOB_1', None, 15)
+
+
+class TestCassetteTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.cassette = os.path.join(self.cache_dir, 'cassette.json')
+
+    def record(self, responses):
+        transport = Mock(node_ip='1.1.1.1')
+        transport.send.side_effect = responses
+        return module_utils.RubrikClient(
+            module_utils.CassetteTransport(self.cassette, 'record', transport), 'admin', 'secret',
+            token_cache=module_utils.TokenCache(self.cache_dir))
+
+    def replay(self, latency=None):
+        return module_utils.RubrikClient(
+            module_utils.CassetteTransport(self.cassette, latency=latency, node_ip='1.1.1.1'), 'admin', 'secret',
+            token_cache=module_utils.TokenCache(os.path.join(self.cache_dir, 'replay')))
+
+    def test_record_and_replay(self):
+        rubrik = self.record([
+            (200, {}, b'{"token": "secret-token"}'),
+            (201, {}, b'{"id": "SLA_1", "name": "Gold"}'),
+            (200, {}, b'{"id": "REQUEST_1", "status": "RUNNING"}'),
+            (200, {}, b'{"id": "REQUEST_1", "status": "SUCCEEDED"}'),
+        ])
+        rubrik.post('v2', '/sla_domain', {'name': 'Gold', 'frequencies': {'daily': {'frequency': 1, 'retention': 7}}})
+        rubrik.get('v1', '/vmware/vm/request/REQUEST_1')
+        rubrik.get('v1', '/vmware/vm/request/REQUEST_1')
+
+        with open(self.cassette) as cassette_file:
+            recorded = cassette_file.read()
+        self.assertNotIn('secret-token', recorded)
+        self.assertNotIn('Authorization', recorded)
+
+        os.makedirs(os.path.join(self.cache_dir, 'replay'))
+        rubrik = self.replay()
+        self.assertEqual(rubrik.api_token, 'cassette-token')
+        self.assertEqual(rubrik.post('v2', '/sla_domain', {'frequencies': {'daily': {'retention': 7, 'frequency': 1}}, 'name': 'Gold'}),
+                         {'id': 'SLA_1', 'name': 'Gold'})
+        self.assertEqual([rubrik.get('v1', '/vmware/vm/request/REQUEST_1')['status'] for _ in range(3)],
+                         ['RUNNING', 'SUCCEEDED', 'SUCCEEDED'])
+
+    def test_replay_unrecorded_request(self):
+        module_utils.write_json(self.cassette, {'interactions': []})
+
+        with self.assertRaises(module_utils.CassetteError) as error:
+            module_utils.RubrikClient(module_utils.CassetteTransport(self.cassette, node_ip='1.1.1.1'), api_token='token').get('v1', '/host')
+
+        self.assertIn('GET /api/v1/host', str(error.exception))
+
+    @patch.object(module_utils.time, 'sleep', autospec=True, spec_set=True)
+    def test_replay_latency(self, mock_sleep):
+        module_utils.write_json(self.cassette, {'interactions': [{
+            'request': {'method': 'GET', 'path': '/api/v1/cluster/me/version', 'body': None},
+            'response': {'status': 200, 'headers': {}, 'body': '{"version": "5.0.1-1280"}'},
+            'latency': 0.25,
+        }]})
+
+        transport = module_utils.CassetteTransport(self.cassette, latency='recorded', node_ip='1.1.1.1')
+        self.assertEqual(module_utils.RubrikClient(transport, api_token='token').cluster_version(), '5.0.1-1280')
+        mock_sleep.assert_called_once_with(0.25)
+
+        transport = module_utils.CassetteTransport(self.cassette, latency='0.5', node_ip='1.1.1.1')
+        module_utils.RubrikClient(transport, api_token='token').cluster_version()
+        mock_sleep.assert_called_with(0.5)
+
+
+class TestSdkTranslation(unittest.TestCase):
+
+    def test_request_for_get_params(self):
+        self.assertEqual(
+            module_utils._request_for('GET', 'v1', '/sla_domain', params={"name": "Gold SLA"}),
+            ('GET', '/api/v1/sla_domain?name=Gold%20SLA', None))
+
+    def test_request_for_quotes_endpoint(self):
+        self.assertEqual(
+            module_utils._request_for('GET', 'v1', '/vmware/vm?primary_cluster_id=local&name=web server (old)'),
+            ('GET', '/api/v1/vmware/vm?primary_cluster_id=local&name=web%20server%20(old)', None))
+        self.assertEqual(
+            module_utils._request_for('GET', 'v1', '/host?name=db%2001'), ('GET', '/api/v1/host?name=db%2001', None))
+
+    def test_parse_response_no_content(self):
+        self.assertEqual(module_utils._parse_response('DELETE', 204, ''), {'status_code': 204})
+
+
+if __name__ == '__main__':
+    unittest.main()
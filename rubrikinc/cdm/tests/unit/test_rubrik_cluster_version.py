@@ -6,6 +6,7 @@ import unittest
 from unittest.mock import Mock, patch
 from ansible.module_utils import basic
 from ansible.module_utils._text import to_bytes
+import ansible_collections.rubrikinc.cdm.plugins.module_utils.rubrik_cdm as module_utils
 import ansible_collections.rubrikinc.cdm.plugins.modules.rubrik_cluster_version as rubrik_cluster_version
 
 
@@ -52,7 +53,7 @@ class TestRubrikClusterVersion(unittest.TestCase):
             set_module_args({})
             rubrik_cluster_version.main()
 
-    @patch.object(rubrik_cluster_version.rubrik_cdm.rubrik_cdm.Connect, 'get', autospec=True, spec_set=True)
+    @patch.object(module_utils.RubrikClient, 'get', autospec=True, spec_set=True)
     def test_module_cluster_version(self, mock_get):
 
         def mock_get_v1_cluster_me_version():
@@ -70,3 +71,41 @@ class TestRubrikClusterVersion(unittest.TestCase):
 
         self.assertEqual(result.exception.args[0]['changed'], False)
         self.assertEqual(result.exception.args[0]['version'], '5.0.1-1280')
+
+    @patch.object(module_utils.RubrikClient, 'get', autospec=True, spec_set=True)
+    def test_module_cluster_version_cached(self, mock_get):
+        mock_get.return_value = {'version': '5.0.1-1280'}
+        set_module_args({
+            'node_ip': '1.1.1.1',
+            'api_token': 'vkys219gn2jziReqdPJH0asGM3PKEQHP'
+        })
+
+        for _ in range(2):
+            with self.assertRaises(AnsibleExitJson) as result:
+                rubrik_cluster_version.main()
+            self.assertEqual(result.exception.args[0]['version'], '5.0.1-1280')
+
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch.object(module_utils.HttpTransport, 'send', autospec=True, spec_set=True)
+    def test_module_cluster_version_metrics(self, mock_send):
+
+        set_module_args({
+            'provider': {
+                'node_ip': '1.1.1.1',
+                'api_token': 'vkys219gn2jziReqdPJH0asGM3PKEQHP',
+                'collect_metrics': True
+            }
+        })
+
+        mock_send.return_value = (200, {}, b'{"version": "5.0.1-1280"}')
+
+        with self.assertRaises(AnsibleExitJson) as result:
+            rubrik_cluster_version.main()
+
+        metrics = result.exception.args[0]['rubrik_metrics']
+        self.assertEqual(metrics['totals']['requests'], 1)
+        self.assertEqual(metrics['calls'][0]['method'], 'GET')
+        self.assertEqual(metrics['calls'][0]['endpoint'], '/api/v1/cluster/me/version')
+        self.assertEqual(metrics['calls'][0]['status'], 200)
+        self.assertEqual(metrics['calls'][0]['response_bytes'], 25)
@@ -78,6 +78,28 @@ class TestRubrikDNSServers(unittest.TestCase):
         self.assertEqual(result.exception.args[0]['changed'], True)
         self.assertEqual(result.exception.args[0]['response']['status_code'], '204')
 
+    @patch.object(rubrik_dns_servers.rubrik_cdm.rubrik_cdm.Connect, 'post', autospec=True, spec_set=True)
+    @patch.object(rubrik_dns_servers.rubrik_cdm.rubrik_cdm.Connect, 'get', autospec=True, spec_set=True)
+    def test_module_check_mode(self, mock_get, mock_post):
+
+        set_module_args({
+            'server_ip': ['server_2', 'server_1'],
+            'node_ip': '1.1.1.1',
+            'api_token': 'vkys219gn2jziReqdPJH0asGM3PKEQHP',
+            '_ansible_check_mode': True,
+            '_ansible_diff': True
+        })
+
+        mock_get.return_value = ['server_1']
+
+        with self.assertRaises(AnsibleExitJson) as result:
+            rubrik_dns_servers.main()
+
+        self.assertEqual(result.exception.args[0]['changed'], True)
+        self.assertEqual(result.exception.args[0]['diff'], {
+            'before': {'server_ip': ['server_1']}, 'after': {'server_ip': ['server_1', 'server_2']}})
+        mock_post.assert_not_called()
+
     @patch.object(rubrik_dns_servers.rubrik_cdm.rubrik_cdm.Connect, 'get', autospec=True, spec_set=True)
     def test_module_idempotence(self, mock_get):
 
@@ -6,6 +6,7 @@ import unittest
 from unittest.mock import Mock, patch
 from ansible.module_utils import basic
 from ansible.module_utils._text import to_bytes
+import ansible_collections.rubrikinc.cdm.plugins.module_utils.rubrik_cdm as module_utils
 import ansible_collections.rubrikinc.cdm.plugins.modules.rubrik_get as rubrik_get
 
 
@@ -52,7 +53,7 @@ class TestRubrikGet(unittest.TestCase):
             set_module_args({})
             rubrik_get.main()
 
-    @patch.object(rubrik_get.rubrik_cdm.rubrik_cdm.Connect, '_common_api', autospec=True, spec_set=True)
+    @patch.object(module_utils.RubrikClient, '_common_api', autospec=True, spec_set=True)
     def test_module_get(self, mock_get):
 
         def mock_get_get():
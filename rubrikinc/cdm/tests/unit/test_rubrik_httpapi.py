@@ -0,0 +1,53 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import unittest
+from io import BytesIO
+from unittest.mock import Mock
+from ansible_collections.rubrikinc.cdm.plugins.httpapi.rubrik import HttpApi
+
+
+def response(status_code, body):
+    """build the (response, response_data) pair returned by the httpapi connection send()"""
+    http_response = Mock()
+    http_response.getcode.return_value = status_code
+    return http_response, BytesIO(body)
+
+
+class TestRubrikHttpApi(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = Mock()
+        self.connection._auth = None
+        self.httpapi = HttpApi(self.connection)
+
+    def test_login_stores_session_token(self):
+        self.connection.send.return_value = response(200, b'{"id": "1", "token": "session-token", "userId": "2"}')
+
+        self.httpapi.login('admin', 'secret')
+
+        self.assertEqual(self.connection._auth, {'Authorization': 'Bearer session-token'})
+
+    def test_logout_only_deletes_minted_session(self):
+        self.httpapi.logout()
+        self.connection.send.assert_not_called()
+
+        self.connection.send.return_value = response(200, b'{"token": "session-token"}')
+        self.httpapi.login('admin', 'secret')
+        self.httpapi.logout()
+
+        self.assertEqual(self.connection.send.call_args[0][0], '/api/v1/session/me')
+        self.assertEqual(self.connection.send.call_args[1]['method'], 'DELETE')
+
+    def test_send_request(self):
+        self.connection.send.return_value = response(200, b'{"version": "5.0.1-1280"}')
+
+        status_code, body = self.httpapi.send_request('GET', '/api/v1/cluster/me', timeout=30)
+
+        self.assertEqual(status_code, 200)
+        self.assertEqual(body, '{"version": "5.0.1-1280"}')
+        self.assertEqual(self.connection.send.call_args[1]['timeout'], 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
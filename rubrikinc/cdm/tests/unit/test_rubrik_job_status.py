@@ -2,11 +2,13 @@ from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
 import json
+import os
 import unittest
 from unittest.mock import Mock, patch
 from ansible.module_utils import basic
 from ansible.module_utils._text import to_bytes
 from rubrik_cdm.exceptions import RubrikException, APICallException
+import ansible_collections.rubrikinc.cdm.plugins.module_utils.rubrik_cdm as module_utils
 import ansible_collections.rubrikinc.cdm.plugins.modules.rubrik_job_status as rubrik_job_status
 
 
@@ -71,7 +73,7 @@ class TestRubrikJobStatus(unittest.TestCase):
 
         self.assertEqual(result.exception.args[0]['failed'], True)
 
-    @patch.object(rubrik_job_status.rubrik_cdm.rubrik_cdm.Connect, '_common_api', autospec=True, spec_set=True)
+    @patch.object(module_utils.RubrikClient, '_common_api', autospec=True, spec_set=True)
     def test_module_get_job_status(self, mock_common_api):
 
         def mock_job_status():
@@ -107,3 +109,23 @@ class TestRubrikJobStatus(unittest.TestCase):
 
         self.assertEqual(result.exception.args[0]['changed'], False)
         self.assertEqual(result.exception.args[0]['response'], mock_job_status())
+
+    @patch.object(module_utils.time, 'sleep', autospec=True, spec_set=True)
+    def test_module_wait_for_job_replayed_from_cassette(self, mock_sleep):
+
+        cassette = os.path.join(os.path.dirname(__file__), 'cassettes', 'job_status.json')
+
+        set_module_args({
+            'url': "https://1.1.1.1/api/v1/vmware/vm/request/CREATE_VMWARE_SNAPSHOT_a1b2c3d4-vm-42_e5f6:::0",
+            'node_ip': '1.1.1.1',
+            'username': 'admin',
+            'password': 'secret'
+        })
+
+        with patch.dict(os.environ, {'rubrik_cdm_cassette': cassette}):
+            with self.assertRaises(AnsibleExitJson) as result:
+                rubrik_job_status.main()
+
+        self.assertEqual(result.exception.args[0]['response']['status'], 'SUCCEEDED')
+        self.assertEqual(result.exception.args[0]['response']['progress'], 100)
+        self.assertEqual(mock_sleep.call_count, 2)
@@ -6,6 +6,7 @@ import unittest
 from unittest.mock import Mock, patch
 from ansible.module_utils import basic
 from ansible.module_utils._text import to_bytes
+import ansible_collections.rubrikinc.cdm.plugins.module_utils.rubrik_cdm as module_utils
 import ansible_collections.rubrikinc.cdm.plugins.modules.rubrik_post as rubrik_post
 
 
@@ -52,7 +53,7 @@ class TestRubrikPost(unittest.TestCase):
             set_module_args({})
             rubrik_post.main()
 
-    @patch.object(rubrik_post.rubrik_cdm.rubrik_cdm.Connect, '_common_api', autospec=True, spec_set=True)
+    @patch.object(module_utils.RubrikClient, '_common_api', autospec=True, spec_set=True)
     def test_module_post(self, mock_common_api):
 
         def mock_get_post():